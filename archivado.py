@@ -0,0 +1,295 @@
+"""Archivo frío de solicitudes ya sincronizadas.
+
+Las solicitudes SINCRONIZADAS con más de ``dias_retencion`` días se mueven,
+junto con sus direcciones, su fila de ``sync_estado`` y su ``error_log``,
+a un archivo SQLite por mes de creación (``alta_AAAA_MM.db`` en
+``directorio``). Así la BD viva queda acotada a lo reciente y cabe en caché.
+
+El trabajo avanza en lotes pequeños, con una pausa entre uno y otro para no
+retener el lock de escritura. Cada lote se copia primero al archivo (que se
+adjunta con ATTACH solo mientras dura la copia) y luego se borra de la BD
+viva en una transacción aparte. En WAL un commit que abarca varias BD no es
+atómico entre ellas, así que una caída entre ambos pasos deja a lo sumo un
+duplicado, que el lote siguiente reemplaza; nunca se pierden filas. Tras
+cada lote ``PRAGMA incremental_vacuum`` devuelve las páginas libres al
+sistema.
+
+``archivo_rango`` guarda el rango de IDs de cada archivo, de modo que
+``leer_solicitud`` encuentra en qué archivo buscar un ID que ya no está en
+la BD viva.
+
+Puede correr como hilo dentro de la app o una vez desde cron::
+
+    python archivado.py                   # archiva todo lo pendiente
+    python archivado.py --vacuum-completo # una vez, en BD creadas sin auto_vacuum
+"""
+import fcntl
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+# Tablas que se archivan y la columna que las liga a la solicitud
+TABLAS_ARCHIVO = (
+    ('solicitud', 'id'),
+    ('direccion', 'solicitudid'),
+    ('sync_estado', 'solicitud_id'),
+    ('error_log', 'solicitud_id'),
+)
+
+INDICES_ARCHIVO = (
+    "CREATE INDEX IF NOT EXISTS archivo.idx_direccion_solicitud ON direccion(solicitudid)",
+    "CREATE INDEX IF NOT EXISTS archivo.idx_error_log_solicitud ON error_log(solicitud_id)",
+)
+
+# Recorre idx_sync_estado en orden de ID: las solicitudes antiguas aparecen primero
+SQL_CANDIDATOS = """
+    SELECT s.id, strftime('%Y_%m', s.fecha_creacion) AS mes
+    FROM sync_estado se
+    JOIN solicitud s ON s.id = se.solicitud_id
+    WHERE se.estado_sync = 'SINCRONIZADO' AND s.fecha_creacion < datetime(?, 'unixepoch', ?)
+    ORDER BY se.solicitud_id
+    LIMIT ?
+"""
+
+
+class Archivador:
+    def __init__(self, get_db: Callable[[], sqlite3.Connection], directorio: str, lock_path: str,
+                 dias_retencion: int = 90, tamano_lote: int = 500, intervalo: float = 3600,
+                 pausa_lote: float = 0.5, paginas_vacuum: int = 2000,
+                 reloj: Callable[[], float] = time.time):
+        self.get_db = get_db
+        self.directorio = directorio
+        self.lock_path = lock_path
+        self.dias_retencion = dias_retencion
+        self.tamano_lote = tamano_lote
+        self.intervalo = intervalo
+        self.pausa_lote = pausa_lote
+        self.paginas_vacuum = paginas_vacuum
+        # Hora actual (epoch) desde la que se cuenta la retención
+        self.reloj = reloj
+
+        self._hilo: Optional[threading.Thread] = None
+        self._detener = threading.Event()
+        self._lock_fd = None
+        self._esquema_listo: Set[str] = set()
+        self.ultima_ejecucion: Optional[Dict] = None
+
+    # ---------- Control del hilo ----------
+    def iniciar(self):
+        """Arranca el hilo de archivado (idempotente)."""
+        if self._hilo is not None and self._hilo.is_alive():
+            return
+        self._detener.clear()
+        self._hilo = threading.Thread(target=self._bucle, name="archivador", daemon=True)
+        self._hilo.start()
+
+    def detener(self):
+        self._detener.set()
+
+    def _tomar_lock(self) -> bool:
+        if self._lock_fd is not None:
+            return True
+        fd = open(self.lock_path, 'a')
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            fd.close()
+            return False
+        self._lock_fd = fd
+        logger.info("Archivador activo en PID %d", os.getpid())
+        return True
+
+    def _bucle(self):
+        while not self._detener.is_set():
+            if self._tomar_lock():
+                try:
+                    self.archivar_pendientes()
+                except Exception as e:
+                    logger.error("Error inesperado en archivador: %s", e, exc_info=True)
+            self._detener.wait(self.intervalo)
+
+    # ---------- Archivado ----------
+    def archivar_pendientes(self) -> int:
+        """Archiva lote tras lote hasta agotar los candidatos. Retorna el total movido."""
+        inicio = time.monotonic()
+        total = 0
+        while not self._detener.is_set():
+            movidas = self.archivar_lote()
+            total += movidas
+            if movidas < self.tamano_lote:
+                break
+            self._detener.wait(self.pausa_lote)
+
+        self.ultima_ejecucion = {"archivadas": total, "segundos": round(time.monotonic() - inicio, 2),
+                                 "fecha": time.time()}
+        if total:
+            logger.info("Archivado: %d solicitudes movidas a archivo frío en %.1fs",
+                        total, time.monotonic() - inicio)
+        return total
+
+    def archivar_lote(self) -> int:
+        """Mueve un lote de solicitudes al archivo de su mes. Retorna cuántas se movieron."""
+        db = self.get_db()
+        try:
+            cur = db.cursor()
+            cur.execute(SQL_CANDIDATOS, (self.reloj(), f"-{int(self.dias_retencion)} days", self.tamano_lote))
+            por_mes: Dict[str, List[int]] = {}
+            for solicitud_id, mes in cur.fetchall():
+                por_mes.setdefault(mes or 'sin_fecha', []).append(solicitud_id)
+
+            movidas = 0
+            for mes, ids in por_mes.items():
+                archivo = f"alta_{mes}.db"
+                self._copiar(db, archivo, ids)
+                movidas += self._borrar(db, archivo, ids)
+
+            if movidas:
+                # executescript recorre la sentencia hasta el final; execute liberaría una sola página
+                db.executescript(f"PRAGMA incremental_vacuum({int(self.paginas_vacuum)});")
+            return movidas
+        finally:
+            db.close()
+
+    def _copiar(self, db: sqlite3.Connection, archivo: str, ids: List[int]):
+        """Copia (o reemplaza) las filas de ``ids`` en el archivo, en una transacción propia."""
+        os.makedirs(self.directorio, exist_ok=True)
+        cur = db.cursor()
+        cur.execute("ATTACH DATABASE ? AS archivo", (os.path.join(self.directorio, archivo),))
+        try:
+            if archivo not in self._esquema_listo:
+                self._asegurar_esquema(cur)
+                self._esquema_listo.add(archivo)
+
+            ids_json = json.dumps(ids)
+            for tabla, columna_id in TABLAS_ARCHIVO:
+                columnas = ', '.join(r[1] for r in cur.execute(f"PRAGMA archivo.table_info({tabla})"))
+                # Todas las tablas tienen clave primaria: reintentar un lote reemplaza lo ya copiado
+                cur.execute(f"""
+                    INSERT OR REPLACE INTO archivo.{tabla} ({columnas})
+                    SELECT {columnas} FROM main.{tabla}
+                    WHERE {columna_id} IN (SELECT value FROM json_each(?))
+                """, (ids_json,))
+            db.commit()
+        except sqlite3.Error:
+            db.rollback()
+            raise
+        finally:
+            cur.execute("DETACH DATABASE archivo")
+
+    def _asegurar_esquema(self, cur: sqlite3.Cursor):
+        """Crea las tablas en el archivo con la definición de la BD viva y agrega columnas nuevas."""
+        for tabla, _ in TABLAS_ARCHIVO:
+            existe = cur.execute("SELECT 1 FROM archivo.sqlite_master WHERE type = 'table' AND name = ?",
+                                 (tabla,)).fetchone()
+            if not existe:
+                sql = cur.execute("SELECT sql FROM main.sqlite_master WHERE type = 'table' AND name = ?",
+                                  (tabla,)).fetchone()[0]
+                cur.execute(re.sub(r'^CREATE TABLE\s+"?(\w+)"?', r'CREATE TABLE archivo.\1', sql))
+                continue
+
+            en_archivo = {r[1] for r in cur.execute(f"PRAGMA archivo.table_info({tabla})")}
+            for r in cur.execute(f"PRAGMA main.table_info({tabla})").fetchall():
+                if r[1] not in en_archivo:
+                    cur.execute(f"ALTER TABLE archivo.{tabla} ADD COLUMN {r[1]} {r[2]}")
+        for sql in INDICES_ARCHIVO:
+            cur.execute(sql)
+
+    def _borrar(self, db: sqlite3.Connection, archivo: str, ids: List[int]) -> int:
+        """Borra de la BD viva las solicitudes ya copiadas que siguen SINCRONIZADAS."""
+        cur = db.cursor()
+        try:
+            cur.execute("BEGIN IMMEDIATE")
+            # Una solicitud que volvió a quedar pendiente entre la copia y el borrado se queda
+            cur.execute("""
+                SELECT solicitud_id FROM sync_estado
+                WHERE solicitud_id IN (SELECT value FROM json_each(?)) AND estado_sync = 'SINCRONIZADO'
+            """, (json.dumps(ids),))
+            vigentes = [r[0] for r in cur.fetchall()]
+            if not vigentes:
+                db.rollback()
+                return 0
+
+            ids_json = json.dumps(vigentes)
+            for tabla, columna_id in reversed(TABLAS_ARCHIVO):
+                cur.execute(f"DELETE FROM {tabla} WHERE {columna_id} IN (SELECT value FROM json_each(?))",
+                            (ids_json,))
+            cur.execute("""
+                INSERT INTO archivo_rango (archivo, min_id, max_id) VALUES (?, ?, ?)
+                ON CONFLICT(archivo) DO UPDATE SET
+                  min_id = MIN(min_id, excluded.min_id), max_id = MAX(max_id, excluded.max_id)
+            """, (archivo, min(vigentes), max(vigentes)))
+            db.commit()
+        except sqlite3.Error:
+            db.rollback()
+            raise
+        return len(vigentes)
+
+    # ---------- Lectura ----------
+    def leer_solicitud(self, solicitud_id: int) -> Optional[Dict]:
+        """Detalle de una solicitud archivada (con direcciones y sync_estado), o None."""
+        db = self.get_db()
+        try:
+            cur = db.cursor()
+            cur.execute("SELECT archivo FROM archivo_rango WHERE ? BETWEEN min_id AND max_id", (solicitud_id,))
+            archivos = [r[0] for r in cur.fetchall()]
+        finally:
+            db.close()
+
+        for archivo in archivos:
+            ruta = os.path.join(self.directorio, archivo)
+            try:
+                conn = sqlite3.connect(f"file:{ruta}?mode=ro", uri=True)
+            except sqlite3.Error as e:
+                logger.warning("No se pudo abrir el archivo %s: %s", ruta, e)
+                continue
+            try:
+                conn.row_factory = sqlite3.Row
+                row = conn.execute("SELECT * FROM solicitud WHERE id = ?", (solicitud_id,)).fetchone()
+                if row is None:
+                    continue
+                solicitud = dict(row)
+                solicitud['direcciones'] = [dict(r) for r in conn.execute(
+                    "SELECT * FROM direccion WHERE solicitudid = ? ORDER BY numero", (solicitud_id,))]
+                sync_row = conn.execute("SELECT estado_sync, fecha_sync FROM sync_estado WHERE solicitud_id = ?",
+                                        (solicitud_id,)).fetchone()
+                if sync_row:
+                    solicitud['sync_estado'] = dict(sync_row)
+                solicitud['archivada'] = True
+                return solicitud
+            finally:
+                conn.close()
+        return None
+
+
+def vacuum_completo(get_db: Callable[[], sqlite3.Connection]):
+    """Activa auto_vacuum=INCREMENTAL en una BD existente (requiere un VACUUM completo)."""
+    db = get_db()
+    modo = db.execute("PRAGMA auto_vacuum").fetchone()[0]
+    if modo == 2:
+        logger.info("La BD ya tiene auto_vacuum=INCREMENTAL")
+        return
+    logger.info("Ejecutando VACUUM para activar auto_vacuum=INCREMENTAL")
+    db.execute("PRAGMA auto_vacuum=INCREMENTAL")
+    db.execute("VACUUM")
+
+
+if __name__ == "__main__":
+    import sys
+
+    from flask_app import archivador, crear_app, get_db
+
+    crear_app()
+
+    if "--vacuum-completo" in sys.argv:
+        vacuum_completo(get_db)
+    elif archivador._tomar_lock():
+        archivador.archivar_pendientes()
+    else:
+        logger.warning("Otro proceso tiene el lock del archivador; no se hace nada")
@@ -0,0 +1,345 @@
+"""Modo de servicio asíncrono (ASGI) para las rutas dominadas por I/O.
+
+``/buscar_cliente``, ``/guardarsolicitud``, el long-poll ``/api/cambios``
+y el stream SSE ``/api/cambios/stream`` se atienden en el event loop: la
+descarga del archivo de clientes usa ``httpx.AsyncClient``, las lecturas y
+escrituras SQLite corren en un pool de hilos acotado y la espera de
+cambios no ocupa ningún hilo. Cada ruta tiene su propio límite de
+concurrencia y timeout, de modo que una descarga lenta o una BD ocupada no
+congela el worker.
+
+El resto de rutas se delega a la app Flask vía ``WsgiToAsgi``, en un pool
+de ``WSGI_HILOS`` hilos. El ``WsgiToAsgi`` estándar usa
+``thread_sensitive=True`` y correría todos esos requests de a uno en un
+mismo hilo.
+
+Uso::
+
+    gunicorn -k uvicorn.workers.UvicornWorker --bind 0.0.0.0:$PORT asgi:app
+"""
+import asyncio
+import json
+import logging
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from tempfile import SpooledTemporaryFile
+from urllib.parse import parse_qs
+
+import httpx
+from asgiref.wsgi import WsgiToAsgi, WsgiToAsgiInstance
+
+import flask_app
+from esquema_solicitud import convertir_solicitud, normalizar_rut, nrosolicitud_fila, validar_rut
+from idempotencia import ClaveReutilizada
+from metricas import LATENCIA_HTTP
+from numeracion import NumeroDuplicado
+
+logger = logging.getLogger(__name__)
+
+# Hilos para llamadas a SQLite desde el event loop
+BD_HILOS = 8
+# Hilos para las rutas delegadas a Flask (cada request ocupa uno mientras dura)
+WSGI_HILOS = 32
+# Ruta → (requests concurrentes, timeout en segundos)
+LIMITES = {
+    'buscar_cliente': (500, 15.0),
+    'guardar': (64, 10.0),
+    'cambios': (1000, flask_app.CAMBIOS_ESPERA_MAX + 15.0),
+}
+# Streams SSE abiertos a la vez por proceso; los siguientes reciben 503
+STREAMS_MAX = 1000
+CUERPO_MAX = 1024 * 1024
+ENCABEZADOS_SSE = [(b'content-type', b'text/event-stream; charset=utf-8'),
+                   (b'cache-control', b'no-cache'), (b'x-accel-buffering', b'no')]
+
+
+class RespuestaHTTP(Exception):
+    def __init__(self, status: int, cuerpo: dict):
+        self.status = status
+        self.cuerpo = cuerpo
+
+
+class _InstanciaWsgiEnPool(WsgiToAsgiInstance):
+    """Corre la app WSGI en ``executor`` en vez del hilo único de ``thread_sensitive``.
+
+    De ``WsgiToAsgiInstance`` solo usa ``build_environ`` y ``start_response``;
+    la lectura del cuerpo, el hilo y el envío de la respuesta son propios.
+    """
+
+    def __init__(self, wsgi_application, executor):
+        super().__init__(wsgi_application)
+        self.executor = executor
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            raise ValueError("WsgiEnPool solo atiende requests HTTP")
+        self.scope = scope
+        with SpooledTemporaryFile(max_size=65536) as body:
+            while True:
+                mensaje = await receive()
+                if mensaje["type"] != "http.request":
+                    # El cliente se desconectó antes de terminar de enviar el cuerpo
+                    return
+                body.write(mensaje.get("body", b""))
+                if not mensaje.get("more_body"):
+                    break
+            body.seek(0)
+            loop = asyncio.get_running_loop()
+
+            def enviar(mensaje):
+                asyncio.run_coroutine_threadsafe(send(mensaje), loop).result()
+
+            await loop.run_in_executor(self.executor, self._correr, body, enviar)
+
+    def _correr(self, body, enviar):
+        """En un hilo del pool: ejecuta la app y envía su respuesta por el event loop."""
+        environ = self.build_environ(self.scope, body)
+        iterable = self.wsgi_application(environ, self.start_response)
+        enviados = 0
+        try:
+            for trozo in iterable:
+                if not self.response_started:
+                    self.response_started = True
+                    enviar(self.response_start)
+                if self.response_content_length is not None:
+                    trozo = trozo[:self.response_content_length - enviados]
+                enviar({"type": "http.response.body", "body": trozo, "more_body": True})
+                enviados += len(trozo)
+                if enviados == self.response_content_length:
+                    break
+            if not self.response_started:
+                self.response_started = True
+                enviar(self.response_start)
+            enviar({"type": "http.response.body"})
+        finally:
+            # Como un servidor WSGI: dispara call_on_close y los teardown de Flask
+            if hasattr(iterable, 'close'):
+                iterable.close()
+
+
+class WsgiEnPool(WsgiToAsgi):
+    def __init__(self, wsgi_application, hilos: int):
+        super().__init__(wsgi_application)
+        self.executor = ThreadPoolExecutor(hilos, thread_name_prefix='asgi-wsgi')
+
+    async def __call__(self, scope, receive, send):
+        await _InstanciaWsgiEnPool(self.wsgi_application, self.executor)(scope, receive, send)
+
+
+class AppASGI:
+    def __init__(self, wsgi_app):
+        self.wsgi = WsgiEnPool(wsgi_app, WSGI_HILOS)
+        self.pool_bd = ThreadPoolExecutor(BD_HILOS, thread_name_prefix='asgi-bd')
+        self.cliente_http = None
+        self._tarea_refresco = None
+        self.rutas = {
+            ('GET', '/buscar_cliente'): ('buscar_cliente', self.buscar_cliente),
+            ('POST', '/guardarsolicitud'): ('guardar', self.guardar),
+            ('GET', '/api/cambios'): ('cambios', self.cambios),
+        }
+        self.semaforos = {nombre: asyncio.Semaphore(limite) for nombre, (limite, _) in LIMITES.items()}
+        self.streams_abiertos = 0
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+
+        if scope['type'] == 'http':
+            ruta = self.rutas.get((scope['method'], scope['path']))
+            if ruta is not None:
+                return await self.atender(ruta, scope, receive, send)
+            if scope['method'] == 'GET' and scope['path'] == '/api/cambios/stream':
+                return await self.cambios_stream(scope, receive, send)
+
+        await self.wsgi(scope, receive, send)
+
+    # ---------- Ciclo de vida ----------
+    async def lifespan(self, receive, send):
+        while True:
+            mensaje = await receive()
+            if mensaje['type'] == 'lifespan.startup':
+                self.cliente_http = httpx.AsyncClient(headers={'User-Agent': 'solicitud-alta'})
+                self._tarea_refresco = asyncio.create_task(
+                    flask_app.directorio_clientes.bucle_refresco_async(self.cliente_http))
+                if flask_app.SYNC_EN_APP:
+                    flask_app.sincronizador.iniciar()
+                if flask_app.ARCHIVO_EN_APP:
+                    flask_app.archivador.iniciar()
+                await send({'type': 'lifespan.startup.complete'})
+            elif mensaje['type'] == 'lifespan.shutdown':
+                if self._tarea_refresco is not None:
+                    self._tarea_refresco.cancel()
+                await self.cliente_http.aclose()
+                self.pool_bd.shutdown(wait=False)
+                self.wsgi.executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    # ---------- Despacho ----------
+    async def atender(self, ruta, scope, receive, send):
+        nombre, manejador = ruta
+        _, timeout = LIMITES[nombre]
+        inicio = time.perf_counter()
+        encabezados = {}
+        try:
+            status, cuerpo, *extra = await asyncio.wait_for(
+                self._con_limite(nombre, manejador, scope, receive), timeout)
+            if extra:
+                encabezados = extra[0]
+        except RespuestaHTTP as r:
+            status, cuerpo = r.status, r.cuerpo
+        except asyncio.TimeoutError:
+            logger.warning("Timeout de %.0fs en %s", timeout, nombre)
+            status, cuerpo = 504, {"status": "ERROR", "mensaje": "Tiempo de espera agotado"}
+        except Exception as e:
+            logger.error("Error en %s: %s", nombre, e, exc_info=True)
+            status, cuerpo = 500, {"status": "ERROR", "mensaje": f"Error interno del servidor: {str(e)}"}
+
+        await self._responder(send, status, cuerpo, encabezados)
+        LATENCIA_HTTP.observar(time.perf_counter() - inicio, nombre, scope['method'], status)
+
+    async def _con_limite(self, nombre, manejador, scope, receive):
+        async with self.semaforos[nombre]:
+            return await manejador(scope, receive)
+
+    @staticmethod
+    async def _responder(send, status: int, cuerpo: dict, encabezados: dict = None):
+        datos = json.dumps(cuerpo, ensure_ascii=False).encode('utf-8')
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [(b'content-type', b'application/json'),
+                        (b'content-length', str(len(datos)).encode())]
+                       + [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in (encabezados or {}).items()],
+        })
+        await send({'type': 'http.response.body', 'body': datos})
+
+    @staticmethod
+    async def _leer_cuerpo(receive) -> bytes:
+        partes, total = [], 0
+        while True:
+            mensaje = await receive()
+            parte = mensaje.get('body', b'')
+            total += len(parte)
+            if total > CUERPO_MAX:
+                raise RespuestaHTTP(413, {"status": "ERROR", "mensaje": "Cuerpo demasiado grande"})
+            partes.append(parte)
+            if not mensaje.get('more_body'):
+                return b''.join(partes)
+
+    # ---------- Rutas ----------
+    async def buscar_cliente(self, scope, receive):
+        params = parse_qs(scope.get('query_string', b'').decode('utf-8', errors='ignore'))
+        rut = normalizar_rut(params.get('rut', [''])[0])
+        if not rut or not validar_rut(rut):
+            logger.warning("RUT inválido o vacío: %s", rut)
+            return 400, flask_app.RESPUESTA_RUT_INVALIDO
+
+        try:
+            encontrado = await flask_app.directorio_clientes.buscar_async(rut, self.cliente_http)
+        except Exception as e:
+            cuerpo, status = flask_app.error_busqueda_cliente(e)
+            return status, cuerpo
+        cuerpo, status = flask_app.resultado_busqueda_cliente(rut, encontrado)
+        return status, cuerpo
+
+    async def guardar(self, scope, receive):
+        try:
+            data = json.loads(await self._leer_cuerpo(receive))
+        except ValueError:
+            return 400, {"status": "ERROR", "mensaje": "JSON inválido"}
+        if not isinstance(data, dict):
+            return 400, {"status": "ERROR", "mensaje": "Se esperaba un objeto"}
+
+        fila, direcciones, errores = convertir_solicitud(data)
+        if errores:
+            mensaje = "; ".join(errores)
+            logger.warning("Validación fallida: %s", mensaje)
+            return 400, {"status": "ERROR", "mensaje": mensaje, "errores": errores}
+
+        loop = asyncio.get_running_loop()
+        clave = next((v.decode('latin-1') for k, v in scope['headers'] if k == b'idempotency-key'), None)
+        try:
+            sqlite_id, nueva = await loop.run_in_executor(
+                self.pool_bd, flask_app.guardar_en_sqlite, fila, direcciones, clave)
+        except ClaveReutilizada:
+            return 422, flask_app.RESPUESTA_CLAVE_REUTILIZADA
+        except NumeroDuplicado as e:
+            return 409, {"status": "ERROR", "mensaje": str(e)}
+        except sqlite3.Error as e:
+            return 500, {"status": "ERROR", "mensaje": f"Error en BD local: {str(e)}"}
+
+        if not nueva:
+            return 200, flask_app.respuesta_repetida(sqlite_id, fila), {'Idempotent-Replayed': 'true'}
+        return 201, {"status": "OK", "sqlite_id": sqlite_id, "solicitudNro": nrosolicitud_fila(fila),
+                     "sql_server_sync": "PENDIENTE"}
+
+    async def cambios(self, scope, receive):
+        params = {k: v[0] for k, v in parse_qs(scope.get('query_string', b'').decode('utf-8', errors='ignore')).items()}
+        try:
+            cursor, limite, espera, estado_sync = flask_app.parametros_cambios(params)
+        except ValueError as e:
+            return 400, {"status": "ERROR", "mensaje": str(e)}
+
+        loop = asyncio.get_running_loop()
+        feed = flask_app.feed_cambios
+        fin = loop.time() + espera
+        resultado = await loop.run_in_executor(self.pool_bd, feed.leer, cursor, limite, estado_sync)
+        while not resultado["cambios"] and not resultado["reinicio"]:
+            restante = fin - loop.time()
+            if restante <= 0 or not await feed.esperar_async(resultado["cursor"], restante):
+                break
+            resultado = await loop.run_in_executor(self.pool_bd, feed.leer, resultado["cursor"], limite, estado_sync)
+        return 200, {"status": "OK", **resultado}
+
+    async def cambios_stream(self, scope, receive, send):
+        """SSE del feed (como ``flask_app.eventos_cambios``) sin ocupar un hilo mientras espera."""
+        params = {k: v[0] for k, v in parse_qs(scope.get('query_string', b'').decode('utf-8', errors='ignore')).items()}
+        ultimo_id = next((v.decode('latin-1') for k, v in scope['headers'] if k == b'last-event-id'), None)
+        try:
+            cursor, limite, _, estado_sync = flask_app.parametros_cambios(params, ultimo_id)
+        except ValueError as e:
+            return await self._responder(send, 400, {"status": "ERROR", "mensaje": str(e)})
+        if self.streams_abiertos >= STREAMS_MAX:
+            return await self._responder(send, 503, {"status": "ERROR", "mensaje": "Demasiados streams abiertos"},
+                                         {'Retry-After': '5'})
+
+        self.streams_abiertos += 1
+        desconexion = asyncio.ensure_future(self._esperar_desconexion(receive))
+        try:
+            await send({'type': 'http.response.start', 'status': 200, 'headers': ENCABEZADOS_SSE})
+            await send({'type': 'http.response.body', 'body': b"retry: 3000\n\n", 'more_body': True})
+            loop = asyncio.get_running_loop()
+            feed = flask_app.feed_cambios
+            fin = loop.time() + flask_app.CAMBIOS_SSE_DURACION
+            while not desconexion.done():
+                resultado = await loop.run_in_executor(self.pool_bd, feed.leer, cursor, limite, estado_sync)
+                texto = flask_app.texto_eventos(cursor, resultado)
+                if texto:
+                    await send({'type': 'http.response.body', 'body': texto.encode('utf-8'), 'more_body': True})
+                cursor = resultado["cursor"]
+
+                restante = fin - loop.time()
+                if restante <= 0:
+                    break
+                if resultado["cambios"]:
+                    continue
+                espera = asyncio.ensure_future(feed.esperar_async(cursor, min(restante, 15)))
+                await asyncio.wait({espera, desconexion}, return_when=asyncio.FIRST_COMPLETED)
+                if not espera.done():
+                    espera.cancel()
+                elif not espera.result():
+                    await send({'type': 'http.response.body', 'body': b": ping\n\n", 'more_body': True})
+            await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            desconexion.cancel()
+            self.streams_abiertos -= 1
+
+    @staticmethod
+    async def _esperar_desconexion(receive):
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+
+
+app = AppASGI(flask_app.crear_app())
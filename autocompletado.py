@@ -0,0 +1,235 @@
+"""Índice compacto de nombres de cliente para autocompletar.
+
+Se construye una vez por snapshot del archivo de clientes y solo guarda
+arreglos:
+
+- los clientes ordenados por nombre normalizado (sin acentos, minúsculas,
+  solo letras y dígitos), con los nombres normalizados concatenados en un
+  solo string más sus desplazamientos; "el nombre empieza con" es una
+  búsqueda binaria seguida de un recorrido;
+- el vocabulario ordenado de palabras, con la lista de clientes de cada
+  palabra (``array('I')`` contiguo), para prefijos de cualquier palabra;
+- trigramas sobre el vocabulario (no sobre cada nombre), para tolerar
+  errores de tipeo sin que la memoria crezca con la cantidad de clientes.
+
+Las sugerencias salen en ese orden de preferencia: prefijo del nombre,
+prefijo de palabras y coincidencia aproximada. Cada etapa tiene un tope
+de candidatos revisados, así el tiempo por consulta queda acotado aunque
+la consulta sea una sola letra.
+"""
+import re
+import unicodedata
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from typing import Dict, List, Optional, Set, Tuple
+
+_NO_ALFANUMERICO = re.compile(r'[^a-z0-9]+')
+
+# Candidatos revisados como máximo por etapa
+MAX_VERIFICACIONES = 1000
+# Postings de trigramas sumados como máximo en la etapa aproximada
+MAX_POSTINGS_TRIGRAMAS = 10000
+# Palabras del vocabulario aceptadas por cada palabra con error de tipeo
+PALABRAS_APROXIMADAS = 8
+SIMILITUD_MINIMA = 0.5
+
+
+def normalizar_texto(texto: str) -> str:
+    """Minúsculas sin acentos, con todo lo que no sea letra o dígito como un espacio."""
+    ascii_ = unicodedata.normalize('NFKD', texto).encode('ascii', 'ignore').decode('ascii')
+    return _NO_ALFANUMERICO.sub(' ', ascii_.lower()).strip()
+
+
+def _trigramas(palabra: str) -> Set[str]:
+    relleno = f" {palabra} "
+    return {relleno[i:i + 3] for i in range(len(relleno) - 2)}
+
+
+class IndiceClientes:
+    def __init__(self, clientes: Dict[str, str]):
+        """Indexa un dict RUT → nombre (el snapshot de DirectorioClientes)."""
+        self.origen = clientes
+        ordenados = sorted((normalizar_texto(nombre), rut, nombre) for rut, nombre in clientes.items())
+        self.ruts: List[str] = [rut for _, rut, _ in ordenados]
+        self.nombres: List[str] = [nombre for _, _, nombre in ordenados]
+        self._texto = ''.join(normalizado for normalizado, _, _ in ordenados)
+        self._inicio = array('I', [0])
+        for normalizado, _, _ in ordenados:
+            self._inicio.append(self._inicio[-1] + len(normalizado))
+
+        # Palabra → clientes (posición en el orden por nombre, creciente)
+        por_palabra: Dict[str, array] = {}
+        for posicion, (normalizado, _, _) in enumerate(ordenados):
+            for palabra in set(normalizado.split()):
+                postings = por_palabra.get(palabra)
+                if postings is None:
+                    postings = por_palabra[palabra] = array('I')
+                postings.append(posicion)
+        del ordenados
+
+        self.vocabulario: List[str] = sorted(por_palabra)
+        self.inicio_palabra = array('I', [0])
+        self.postings = array('I')
+        for palabra in self.vocabulario:
+            self.postings.extend(por_palabra.pop(palabra))
+            self.inicio_palabra.append(len(self.postings))
+
+        trigramas: Dict[str, array] = {}
+        for id_palabra, palabra in enumerate(self.vocabulario):
+            for trigrama in _trigramas(palabra):
+                postings = trigramas.get(trigrama)
+                if postings is None:
+                    postings = trigramas[trigrama] = array('I')
+                postings.append(id_palabra)
+        self.trigramas = trigramas
+
+    def __len__(self) -> int:
+        return len(self.ruts)
+
+    def _normalizado(self, posicion: int) -> str:
+        return self._texto[self._inicio[posicion]:self._inicio[posicion + 1]]
+
+    # ---------- Consulta ----------
+    def sugerir(self, consulta: str, limite: int = 10) -> List[Dict[str, str]]:
+        """Hasta ``limite`` clientes ({rut, cliente}) que coinciden con ``consulta``."""
+        texto = normalizar_texto(consulta)
+        if not texto:
+            return []
+        palabras = texto.split()
+        posiciones: List[int] = []
+        vistas: Set[int] = set()
+
+        def agregar(candidatas):
+            for posicion in candidatas:
+                if len(posiciones) >= limite:
+                    return
+                if posicion not in vistas:
+                    vistas.add(posicion)
+                    posiciones.append(posicion)
+
+        agregar(self._prefijo_nombre(texto, limite))
+        if len(posiciones) < limite:
+            agregar(self._prefijo_palabras(palabras, limite + len(posiciones)))
+        if len(posiciones) < limite:
+            agregar(self._aproximados(palabras, limite + len(posiciones)))
+        return [{"rut": self.ruts[p], "cliente": self.nombres[p]} for p in posiciones]
+
+    def _prefijo_nombre(self, texto: str, limite: int) -> List[int]:
+        """Clientes cuyo nombre normalizado empieza con ``texto``, en orden alfabético."""
+        inicio = bisect_left(range(len(self.nombres)), texto, key=self._normalizado)
+        resultado = []
+        for posicion in range(inicio, min(inicio + limite, len(self.nombres))):
+            if not self._normalizado(posicion).startswith(texto):
+                break
+            resultado.append(posicion)
+        return resultado
+
+    def _rango_prefijo(self, prefijo: str) -> Tuple[int, int]:
+        """Rango [desde, hasta) del vocabulario con palabras que empiezan con ``prefijo``."""
+        desde = bisect_left(self.vocabulario, prefijo)
+        hasta = bisect_left(self.vocabulario, prefijo + '\x7f', lo=desde)
+        return desde, hasta
+
+    def _contiene_palabras(self, posicion: int, palabras: List[str]) -> bool:
+        nombre = ' ' + self._normalizado(posicion)
+        return all((' ' + p) in nombre for p in palabras)
+
+    def _prefijo_palabras(self, palabras: List[str], limite: int) -> List[int]:
+        """Clientes con una palabra que empieza con cada palabra de la consulta.
+
+        Recorre la palabra de la consulta con menos clientes y verifica las
+        demás sobre el nombre.
+        """
+        rangos = [self._rango_prefijo(p) for p in palabras]
+        total = [self.inicio_palabra[h] - self.inicio_palabra[d] for d, h in rangos]
+        if not all(total):
+            return []
+        guia = min(range(len(palabras)), key=total.__getitem__)
+        otras = palabras[:guia] + palabras[guia + 1:]
+        desde, hasta = rangos[guia]
+
+        resultado: List[int] = []
+        revisadas = 0
+        for posicion in self.postings[self.inicio_palabra[desde]:self.inicio_palabra[hasta]]:
+            revisadas += 1
+            if revisadas > MAX_VERIFICACIONES or len(resultado) >= limite:
+                break
+            if not otras or self._contiene_palabras(posicion, otras):
+                resultado.append(posicion)
+        return resultado
+
+    def _palabras_similares(self, palabra: str) -> Dict[int, float]:
+        """Palabras del vocabulario parecidas a ``palabra`` (id → similitud de Dice)."""
+        propios = _trigramas(palabra)
+        # Trigramas más raros primero: discriminan más y cuestan menos
+        listas = sorted((self.trigramas[t] for t in propios if t in self.trigramas), key=len)
+        conteo: Counter = Counter()
+        sumados = 0
+        for postings in listas:
+            if sumados + len(postings) > MAX_POSTINGS_TRIGRAMAS and conteo:
+                break
+            conteo.update(postings)
+            sumados += len(postings)
+
+        similares = {}
+        for id_palabra, _ in conteo.most_common(PALABRAS_APROXIMADAS * 4):
+            otros = _trigramas(self.vocabulario[id_palabra])
+            similitud = 2 * len(propios & otros) / (len(propios) + len(otros))
+            if similitud >= SIMILITUD_MINIMA:
+                similares[id_palabra] = similitud
+        mejores = sorted(similares.items(), key=lambda x: -x[1])[:PALABRAS_APROXIMADAS]
+        return dict(mejores)
+
+    def _aproximados(self, palabras: List[str], limite: int) -> List[int]:
+        """Clientes cuyas palabras se parecen a las de la consulta, por similitud total."""
+        aceptadas: List[Dict[str, float]] = []
+        for palabra in palabras:
+            desde, hasta = self._rango_prefijo(palabra)
+            # Palabras cortas o que ya son prefijo de alguna palabra no se corrigen
+            similares: Dict[str, float] = {self.vocabulario[i]: 1.0 for i in range(desde, min(hasta, desde + 50))}
+            if not similares and len(palabra) >= 3:
+                for id_palabra, similitud in self._palabras_similares(palabra).items():
+                    similares.setdefault(self.vocabulario[id_palabra], similitud)
+            if not similares:
+                return []
+            aceptadas.append(similares)
+
+        # La palabra con menos clientes guía el recorrido
+        def costo(similares: Dict[str, float]) -> int:
+            return sum(self._postings_de(p)[1] - self._postings_de(p)[0] for p in similares)
+        guia = min(range(len(aceptadas)), key=lambda i: costo(aceptadas[i]))
+
+        # Se recorre desde la palabra más parecida y se corta al completar el
+        # límite: las primeras coincidencias son las de mayor similitud guía
+        puntajes: Dict[int, float] = {}
+        revisadas = 0
+        for palabra, similitud in sorted(aceptadas[guia].items(), key=lambda x: -x[1]):
+            if len(puntajes) >= limite or revisadas > MAX_VERIFICACIONES:
+                break
+            desde, hasta = self._postings_de(palabra)
+            for posicion in self.postings[desde:hasta]:
+                revisadas += 1
+                if len(puntajes) >= limite or revisadas > MAX_VERIFICACIONES:
+                    break
+                puntaje = self._puntaje(posicion, aceptadas, guia, similitud)
+                if puntaje is not None:
+                    puntajes[posicion] = max(puntaje, puntajes.get(posicion, 0.0))
+        return sorted(puntajes, key=lambda p: (-puntajes[p], p))
+
+    def _postings_de(self, palabra: str) -> Tuple[int, int]:
+        i = bisect_left(self.vocabulario, palabra)
+        return self.inicio_palabra[i], self.inicio_palabra[i + 1]
+
+    def _puntaje(self, posicion: int, aceptadas: List[Dict[str, float]], guia: int,
+                 similitud_guia: float) -> Optional[float]:
+        palabras_nombre = self._normalizado(posicion).split()
+        puntaje = similitud_guia
+        for i, similares in enumerate(aceptadas):
+            if i == guia:
+                continue
+            mejor = max((similares.get(p, 0.0) for p in palabras_nombre), default=0.0)
+            if not mejor:
+                return None
+            puntaje += mejor
+        return puntaje
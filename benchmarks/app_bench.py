@@ -0,0 +1,44 @@
+"""La app real con pyodbc reemplazado por ``pyodbc_simulado``.
+
+Sirve como objetivo para cualquier servidor::
+
+    python -m benchmarks.app_bench PUERTO                         # werkzeug con hilos
+    gunicorn -c python:benchmarks.app_bench benchmarks.app_bench:app                  # WSGI
+    gunicorn -c python:benchmarks.app_bench -k uvicorn.workers.UvicornWorker benchmarks.app_bench:app_asgi
+
+Con ``-c python:benchmarks.app_bench`` este módulo es también la
+configuración de gunicorn: como gunicorn.conf.py, migra el esquema una vez
+en el master, pero con el sustituto de pyodbc ya instalado.
+
+Las rutas y conexiones se configuran con las variables ALTA_* de flask_app.
+"""
+import sys
+
+from benchmarks import pyodbc_simulado
+
+sys.modules['pyodbc'] = pyodbc_simulado
+
+from flask_app import crear_app, init_db  # noqa: E402
+
+
+def on_starting(server):
+    version = init_db()
+    server.log.info("Esquema SQLite en versión %d", version)
+
+
+def __getattr__(nombre):
+    # La app se crea en el worker que la pide, no al importar (gunicorn importa
+    # este módulo en el master como configuración). El modo ASGI importa
+    # httpx/asgiref; solo se carga si se pide
+    if nombre == 'app':
+        return crear_app()
+    if nombre == 'app_asgi':
+        from asgi import app as app_asgi
+        return app_asgi
+    raise AttributeError(nombre)
+
+
+if __name__ == "__main__":
+    from werkzeug.serving import run_simple
+
+    run_simple('127.0.0.1', int(sys.argv[1]), crear_app(), threaded=True)
@@ -0,0 +1,173 @@
+"""Benchmark del tiempo de arranque de un proceso de la app.
+
+Cada medición es un intérprete nuevo que importa ``flask_app`` como en
+producción (con el pyodbc instalado, no con ``pyodbc_simulado``) y llama a
+``crear_app()``; se reportan por separado la importación, ``crear_app``
+(logging + migraciones) y el total del proceso, y qué dependencias pesadas
+quedaron cargadas tras el arranque (deberían ser ninguna: se cargan con su
+primer uso, ver importacion_diferida.py). Escenarios sobre una BD SQLite
+temporal:
+
+- ``bd_nueva``: BD vacía, se aplican todas las migraciones;
+- ``bd_al_dia``: BD con ``--solicitudes`` solicitudes y el esquema al día
+  (el caso de cada worker en un reinicio normal);
+- ``bd_sin_versionar``: la misma BD con ``user_version`` 0, como la primera
+  vez que arranca esta versión sobre una BD existente.
+
+Con ``--servidor gunicorn`` mide además el tiempo desde el lanzamiento de
+gunicorn (con gunicorn.conf.py, como en el Dockerfile) hasta la primera
+respuesta de /init.
+
+    python -m benchmarks.arranque --solicitudes 100000 --repeticiones 10 --servidor gunicorn
+"""
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+from benchmarks.carga import RAIZ, esperar_app, puerto_libre
+
+# Dependencias que no deberían cargarse al arrancar
+PESADAS = ('pyodbc', 'requests', 'pyarrow', 'httpx')
+
+MEDICION = """
+import json, sys, time
+inicio = time.perf_counter()
+import flask_app
+importado = time.perf_counter()
+flask_app.crear_app()
+listo = time.perf_counter()
+cargadas = [m for m in %r if m in sys.modules]
+print(json.dumps({"importar_s": importado - inicio, "crear_app_s": listo - importado, "cargadas": cargadas}))
+""" % (PESADAS,)
+
+PRECARGA = """
+import sys
+import flask_app
+from benchmarks.carga import payload_solicitud
+cliente = flask_app.crear_app().test_client()
+restantes = int(sys.argv[1])
+while restantes > 0:
+    lote = [payload_solicitud('11.111.111-1') for _ in range(min(restantes, 50000))]
+    cliente.post('/api/guardar_lote', json=lote).get_json()
+    restantes -= len(lote)
+"""
+
+
+def medir_proceso(env: Dict[str, str]) -> Dict[str, float]:
+    inicio = time.perf_counter()
+    salida = subprocess.run([sys.executable, '-c', MEDICION], cwd=RAIZ, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    total = time.perf_counter() - inicio
+    return dict(json.loads(salida.strip().splitlines()[-1]), proceso_s=total)
+
+
+def resumir(nombre: str, mediciones: List[Dict[str, float]]) -> Dict:
+    resultado = {"escenario": nombre, "repeticiones": len(mediciones),
+                 "cargadas": sorted({m for medicion in mediciones for m in medicion['cargadas']})}
+    for clave in ('importar_s', 'crear_app_s', 'proceso_s'):
+        valores = [m[clave] for m in mediciones]
+        resultado[clave.replace('_s', '_ms_p50')] = round(statistics.median(valores) * 1000, 1)
+        resultado[clave.replace('_s', '_ms_max')] = round(max(valores) * 1000, 1)
+    return resultado
+
+
+def poner_version(db_path: str, version: int):
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.execute(f"PRAGMA user_version = {version}")
+    finally:
+        conn.close()
+
+
+def medir_gunicorn(env: Dict[str, str], workers: int, repeticiones: int) -> Dict:
+    tiempos = []
+    for _ in range(repeticiones):
+        puerto = puerto_libre()
+        inicio = time.perf_counter()
+        proceso = subprocess.Popen(['gunicorn', '-w', str(workers), '-b', f"127.0.0.1:{puerto}",
+                                    'flask_app:crear_app()'],
+                                   cwd=RAIZ, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            esperar_app(f"http://127.0.0.1:{puerto}", proceso)
+            tiempos.append(time.perf_counter() - inicio)
+        finally:
+            proceso.terminate()
+            proceso.wait(timeout=10)
+    return {"escenario": "gunicorn_primera_respuesta", "workers": workers, "repeticiones": repeticiones,
+            "ms_p50": round(statistics.median(tiempos) * 1000, 1),
+            "ms_max": round(max(tiempos) * 1000, 1)}
+
+
+# ==================== MAIN ====================
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--solicitudes', type=int, default=50_000, help='solicitudes precargadas en la BD')
+    parser.add_argument('--repeticiones', type=int, default=5, help='procesos medidos por escenario')
+    parser.add_argument('--servidor', choices=('ninguno', 'gunicorn'), default='ninguno')
+    parser.add_argument('--workers', type=int, default=4, help='workers de gunicorn')
+    parser.add_argument('--salida', default=None, help='archivo JSON (por defecto stdout)')
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix='bench_arranque_') as tmp:
+        db_path = os.path.join(tmp, 'alta.db')
+        env = dict(os.environ,
+                   ALTA_DB_PATH=db_path,
+                   ALTA_LOG_PATH=os.path.join(tmp, 'logs'),
+                   ALTA_SQL_CONN_STR=f"DATABASE={os.path.join(tmp, 'sqlserver.db')}",
+                   ALTA_SYNC_EN_APP='0',
+                   ALTA_ARCHIVO_EN_APP='0',
+                   PYTHONPATH=RAIZ)
+
+        resultados = []
+        nuevas = []
+        for _ in range(args.repeticiones):
+            for sufijo in ('', '-wal', '-shm'):
+                if os.path.exists(db_path + sufijo):
+                    os.remove(db_path + sufijo)
+            nuevas.append(medir_proceso(env))
+        resultados.append(resumir('bd_nueva', nuevas))
+
+        if args.solicitudes:
+            subprocess.run([sys.executable, '-c', PRECARGA, str(args.solicitudes)], cwd=RAIZ, env=env,
+                           check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        conn = sqlite3.connect(db_path)
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        conn.close()
+        resultados.append(resumir('bd_al_dia', [medir_proceso(env) for _ in range(args.repeticiones)]))
+
+        sin_versionar = []
+        for _ in range(args.repeticiones):
+            poner_version(db_path, 0)
+            sin_versionar.append(medir_proceso(env))
+        resultados.append(resumir('bd_sin_versionar', sin_versionar))
+
+        if args.servidor == 'gunicorn':
+            resultados.append(medir_gunicorn(env, args.workers, args.repeticiones))
+
+    informe = {
+        "configuracion": {
+            "solicitudes": args.solicitudes,
+            "version_esquema": version,
+            "python": platform.python_version(),
+            "plataforma": platform.platform(),
+        },
+        "resultados": resultados,
+    }
+    texto = json.dumps(informe, indent=2, ensure_ascii=False)
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as f:
+            f.write(texto + '\n')
+    else:
+        print(texto)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,275 @@
+"""Benchmark de carga reproducible con sustitutos locales.
+
+Levanta la app real contra una BD SQLite temporal, un SQL Server simulado
+(``pyodbc_simulado``, con latencia configurable) y un servidor HTTP local
+que sirve un archivo de clientes sintético. Mide p50/p99 y throughput de
+``/guardarsolicitud``, ``/buscar_cliente``, ``/api/autocompletar_cliente``,
+``/api/obtener_pendientes`` e ``/init`` a distintos niveles de concurrencia
+y escribe el resultado en JSON.
+
+    python -m benchmarks.carga --clientes 1000000 --concurrencia 1,8,32 \\
+        --servidor gunicorn --salida bench_output.json
+"""
+import argparse
+import functools
+import http.server
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List
+
+import requests
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SEMILLA = 20240601
+
+
+# ==================== DATOS SINTÉTICOS ====================
+def formatear_rut(numero: int) -> str:
+    """RUT con puntos, guion y dígito verificador (módulo 11)."""
+    suma, factor = 0, 2
+    for digito in reversed(str(numero)):
+        suma += int(digito) * factor
+        factor = 2 if factor == 7 else factor + 1
+    dv = 11 - suma % 11
+    dv = {10: 'K', 11: '0'}.get(dv, str(dv))
+    return f"{numero:,}".replace(',', '.') + f"-{dv}"
+
+
+def generar_clientes(ruta: str, cantidad: int) -> List[str]:
+    """Escribe el archivo RUT;Nombre y retorna los RUT generados."""
+    rng = random.Random(SEMILLA)
+    numeros = rng.sample(range(5_000_000, 99_999_999), cantidad)
+    ruts = [formatear_rut(n) for n in numeros]
+    with open(ruta, 'w', encoding='utf-8') as f:
+        f.write("RUT;Nombre\n")
+        for i, rut in enumerate(ruts):
+            f.write(f"{rut};Cliente Sintético {i} SpA\n")
+    return ruts
+
+
+def payload_solicitud(rut: str, n_direcciones: int = 2) -> Dict:
+    return {
+        "fechaIngreso": "01-06-2024", "rutCliente": rut, "cliente": "Cliente Bench",
+        "nroSAM": "123456", "razonSocial": "Bench SpA", "ejecutivoComercial": "Ejecutivo",
+        "fonoEjecutivo": "912345678", "contactoCliente": "Contacto", "fonoContactoCliente": "912345678",
+        "contactoTecnico": "Técnico", "fonoContactoTecnico": "912345678", "jefeProyecto": "Jefe",
+        "fonoJefeProyecto": "912345678", "proyecto": "Proyecto", "pepGasto": "PEP-1",
+        "proveedor": "Proveedor", "actividad": "Alta", "tipoDireccion": "MULTI",
+        "conceptoOtrosCostos": "N/A", "monedaOtrosCostos": "CLP", "montoOtrosCostos": "0",
+        "monedaInstalacion": "CLP", "costoInstalacion": "150000", "monedaRenta": "UF",
+        "valorRenta": "12.5", "plazoMeses": "24",
+        "direcciones": [
+            {"numero": i + 1, "direccion": f"Av. Siempre Viva {100 + i}", "servicio": "Internet",
+             "capacidad": "1 Giga"}
+            for i in range(n_direcciones)
+        ],
+    }
+
+
+# ==================== INFRAESTRUCTURA ====================
+def puerto_libre() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+class _ArchivoSilencioso(http.server.SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+def servir_directorio(directorio: str) -> http.server.ThreadingHTTPServer:
+    handler = functools.partial(_ArchivoSilencioso, directory=directorio)
+    servidor = http.server.ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor
+
+
+def iniciar_app(servidor: str, puerto: int, env: Dict[str, str], workers: int) -> subprocess.Popen:
+    destino = f"127.0.0.1:{puerto}"
+    comandos = {
+        'werkzeug': [sys.executable, '-m', 'benchmarks.app_bench', str(puerto)],
+        'gunicorn': ['gunicorn', '-c', 'python:benchmarks.app_bench', '-w', str(workers), '--threads', '8',
+                     '-b', destino, 'benchmarks.app_bench:app'],
+        'uvicorn': ['gunicorn', '-c', 'python:benchmarks.app_bench', '-w', str(workers),
+                    '-k', 'uvicorn.workers.UvicornWorker', '-b', destino, 'benchmarks.app_bench:app_asgi'],
+    }
+    return subprocess.Popen(comandos[servidor], cwd=RAIZ, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def esperar_app(base: str, proceso: subprocess.Popen, timeout: float = 30):
+    limite = time.monotonic() + timeout
+    while time.monotonic() < limite:
+        if proceso.poll() is not None:
+            raise RuntimeError(f"El servidor terminó con código {proceso.returncode}")
+        try:
+            requests.get(base + "/init", timeout=1)
+            return
+        except requests.ConnectionError:
+            time.sleep(0.1)
+    raise RuntimeError("El servidor no respondió a tiempo")
+
+
+# ==================== MEDICIÓN ====================
+def percentil(valores: List[float], p: float) -> float:
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    k = min(len(ordenados) - 1, max(0, round(p / 100 * len(ordenados)) - 1))
+    return ordenados[k]
+
+
+def medir(nombre: str, hacer: Callable[[requests.Session, int], requests.Response],
+          concurrencia: int, total: int) -> Dict:
+    """Ejecuta ``total`` requests con ``concurrencia`` hilos (sesión keep-alive por hilo)."""
+    local = threading.local()
+    latencias: List[float] = []
+    errores = 0
+    lock = threading.Lock()
+
+    def uno(i: int):
+        nonlocal errores
+        sesion = getattr(local, 'sesion', None)
+        if sesion is None:
+            sesion = local.sesion = requests.Session()
+        inicio = time.perf_counter()
+        try:
+            resp = hacer(sesion, i)
+            ok = resp.status_code < 500
+        except requests.RequestException:
+            ok = False
+        duracion = time.perf_counter() - inicio
+        with lock:
+            latencias.append(duracion)
+            if not ok:
+                errores += 1
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(concurrencia) as pool:
+        list(pool.map(uno, range(total)))
+    total_s = time.perf_counter() - inicio
+
+    return {
+        "endpoint": nombre,
+        "concurrencia": concurrencia,
+        "requests": total,
+        "errores": errores,
+        "p50_ms": round(percentil(latencias, 50) * 1000, 3),
+        "p99_ms": round(percentil(latencias, 99) * 1000, 3),
+        "max_ms": round(max(latencias) * 1000, 3),
+        "rps": round(total / total_s, 1),
+    }
+
+
+def escenarios(base: str, ruts: List[str]) -> Dict[str, Callable]:
+    rng = random.Random(SEMILLA)
+    cuerpo = payload_solicitud(ruts[0])
+    # Un número distinto por request: el mismo contenido sería un envío repetido (idempotencia)
+    return {
+        "/guardarsolicitud": lambda s, i: s.post(base + "/guardarsolicitud",
+                                                 json=dict(cuerpo, solicitudNro=rng.randrange(1 << 40)),
+                                                 timeout=30),
+        "/buscar_cliente": lambda s, i: s.get(base + "/buscar_cliente",
+                                              params={"rut": rng.choice(ruts)}, timeout=30),
+        # Prefijos de número y un error de tipeo sobre los nombres "Cliente Sintético N SpA"
+        "/api/autocompletar_cliente": lambda s, i: s.get(
+            base + "/api/autocompletar_cliente",
+            params={"q": rng.choice(("cliente sintetico ", "sintetco ")) + str(rng.randrange(1000))},
+            timeout=30),
+        "/api/obtener_pendientes": lambda s, i: s.get(base + "/api/obtener_pendientes",
+                                                      params={"limit": 100}, timeout=30),
+        "/init": lambda s, i: s.get(base + "/init", timeout=30),
+    }
+
+
+# ==================== MAIN ====================
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--clientes', type=int, default=100_000, help='RUT en el archivo sintético')
+    parser.add_argument('--concurrencia', default='1,8,32', help='niveles separados por coma')
+    parser.add_argument('--requests', type=int, default=500, help='requests por endpoint y nivel')
+    parser.add_argument('--servidor', choices=('werkzeug', 'gunicorn', 'uvicorn'), default='werkzeug')
+    parser.add_argument('--workers', type=int, default=2, help='workers de gunicorn')
+    parser.add_argument('--latencia-sql-ms', type=float, default=5.0, help='latencia simulada de SQL Server')
+    parser.add_argument('--pendientes', type=int, default=2000, help='solicitudes precargadas sin sincronizar')
+    parser.add_argument('--con-sincronizador', action='store_true',
+                        help='deja correr el worker de sincronización durante la medición')
+    parser.add_argument('--endpoints', default=None, help='subconjunto de endpoints separados por coma')
+    parser.add_argument('--salida', default=None, help='archivo JSON (por defecto stdout)')
+    args = parser.parse_args(argv)
+
+    niveles = [int(n) for n in args.concurrencia.split(',')]
+
+    with tempfile.TemporaryDirectory(prefix='bench_alta_') as tmp:
+        ruts = generar_clientes(os.path.join(tmp, 'clientes.csv'), args.clientes)
+        servidor_archivos = servir_directorio(tmp)
+
+        puerto = puerto_libre()
+        base = f"http://127.0.0.1:{puerto}"
+        env = dict(os.environ,
+                   ALTA_DB_PATH=os.path.join(tmp, 'alta.db'),
+                   ALTA_LOG_PATH=os.path.join(tmp, 'logs'),
+                   ALTA_SQL_CONN_STR=(f"DATABASE={os.path.join(tmp, 'sqlserver.db')};"
+                                      f"LATENCIA_MS={args.latencia_sql_ms};HANDSHAKE_MS={args.latencia_sql_ms * 6}"),
+                   ALTA_CLIENTES_URL=f"http://127.0.0.1:{servidor_archivos.server_port}/clientes.csv",
+                   ALTA_SYNC_EN_APP='1' if args.con_sincronizador else '0',
+                   PYTHONPATH=RAIZ)
+
+        proceso = iniciar_app(args.servidor, puerto, env, args.workers)
+        try:
+            esperar_app(base, proceso)
+
+            # Precarga del backlog y del índice de clientes (primer request paga la descarga)
+            if args.pendientes:
+                lote = [payload_solicitud(ruts[i % len(ruts)]) for i in range(args.pendientes)]
+                requests.post(base + "/api/guardar_lote", json=lote, timeout=300).raise_for_status()
+            inicio_carga = time.perf_counter()
+            requests.get(base + "/buscar_cliente", params={"rut": ruts[0]}, timeout=120)
+            carga_clientes_s = time.perf_counter() - inicio_carga
+
+            resultados = []
+            seleccion = args.endpoints.split(',') if args.endpoints else None
+            for nombre, hacer in escenarios(base, ruts).items():
+                if seleccion and nombre not in seleccion:
+                    continue
+                for nivel in niveles:
+                    resultados.append(medir(nombre, hacer, nivel, args.requests))
+        finally:
+            proceso.terminate()
+            proceso.wait(timeout=10)
+            servidor_archivos.shutdown()
+
+    informe = {
+        "configuracion": {
+            "servidor": args.servidor,
+            "workers": args.workers if args.servidor != 'werkzeug' else 1,
+            "clientes": args.clientes,
+            "latencia_sql_ms": args.latencia_sql_ms,
+            "pendientes": args.pendientes,
+            "con_sincronizador": args.con_sincronizador,
+            "python": platform.python_version(),
+            "plataforma": platform.platform(),
+        },
+        "carga_inicial_clientes_s": round(carga_clientes_s, 3),
+        "resultados": resultados,
+    }
+    texto = json.dumps(informe, indent=2, ensure_ascii=False)
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as f:
+            f.write(texto + '\n')
+    else:
+        print(texto)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""Sustituto local de pyodbc para benchmarks: SQLite con latencia inyectada.
+
+Implementa la parte de la interfaz de pyodbc que usa la app (connect,
+cursor, execute, executemany, fetchone/fetchall, commit, rollback, close y
+``Error``). Cada ida y vuelta duerme ``LATENCIA_MS`` para simular la red;
+``connect`` cuesta ``HANDSHAKE_MS``. La cadena de conexión tiene la forma::
+
+    DATABASE=/tmp/sqlserver.db;LATENCIA_MS=5;HANDSHAKE_MS=30
+
+``OUTPUT INSERTED.id`` se traduce a ``RETURNING id`` de SQLite, y un
+``executemany`` con ``fast_executemany`` cuenta como una sola ida y vuelta.
+
+También entiende el T-SQL de la huella de reconciliación
+(``reconciliacion.SQL_HUELLA``): ``ISNULL``, ``CONCAT``, ``FLOOR``, los
+literales ``N'...'`` y los 4 primeros bytes de ``HASHBYTES('MD5', ...)``
+como INT con signo, calculados igual que en SQL Server (MD5 del texto en
+UTF-16LE).
+"""
+import hashlib
+import math
+import re
+import sqlite3
+import time
+
+apilevel = '2.0'
+threadsafety = 1
+paramstyle = 'qmark'
+
+
+class Error(Exception):
+    pass
+
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS solicitud (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  fechaingreso TEXT, rutcliente TEXT, cliente TEXT, nrosam TEXT, razonsocial TEXT,
+  ejecutivocomercial TEXT, fonoejecutivo TEXT, contactocliente TEXT, fonocontactocliente TEXT,
+  contactotecnico TEXT, fonocontactotecnico TEXT, jefeproyecto TEXT, fonojefeproyecto TEXT,
+  proyecto TEXT, pepgasto TEXT, proveedor TEXT, actividad TEXT, tipodireccion TEXT,
+  conceptootroscostos TEXT, monedaotros_costos TEXT, montootros_costos REAL,
+  monedainstalacion TEXT, costoinstalacion REAL, monedarenta TEXT, valorrenta REAL, plazomeses INTEGER
+);
+CREATE TABLE IF NOT EXISTS direccion (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  solicitudid INTEGER, numero INTEGER, direccion TEXT, servicio TEXT, capacidad TEXT
+);
+"""
+
+_OUTPUT_INSERTED = re.compile(r"\s+OUTPUT\s+INSERTED\.(\w+)\s+(VALUES\s*\(.*\))\s*$", re.IGNORECASE | re.DOTALL)
+
+# T-SQL de reconciliacion.SQL_HUELLA → SQLite (HUELLA_MD5 se registra en cada conexión)
+_TSQL = (
+    (re.compile(r"CAST\(SUBSTRING\(HASHBYTES\('MD5',\s*"), "HUELLA_MD5("),
+    (re.compile(r"\)\),\s*1,\s*4\)\s+AS\s+INT\)"), "))"),
+    (re.compile(r"\bN'"), "'"),
+    (re.compile(r"\bISNULL\(", re.IGNORECASE), "IFNULL("),
+)
+
+
+def _parsear(conn_str: str) -> dict:
+    partes = (p.split('=', 1) for p in conn_str.split(';') if '=' in p)
+    return {k.strip().upper(): v.strip() for k, v in partes}
+
+
+def _traducir(sql: str) -> str:
+    sql = _OUTPUT_INSERTED.sub(r" \2 RETURNING \1", sql)
+    for patron, reemplazo in _TSQL:
+        sql = patron.sub(reemplazo, sql)
+    return sql
+
+
+def _huella_md5(texto):
+    """CAST(SUBSTRING(HASHBYTES('MD5', texto), 1, 4) AS INT) sobre NVARCHAR."""
+    digest = hashlib.md5(('' if texto is None else str(texto)).encode('utf-16-le')).digest()
+    return int.from_bytes(digest[:4], 'big', signed=True)
+
+
+def _concat(*valores):
+    # CONCAT de T-SQL trata NULL como texto vacío
+    return ''.join('' if v is None else str(v) for v in valores)
+
+
+class Cursor:
+    def __init__(self, conexion: 'Connection'):
+        self._conexion = conexion
+        self._cur = conexion._db.cursor()
+        self.fast_executemany = False
+
+    def execute(self, sql: str, *params):
+        if len(params) == 1 and isinstance(params[0], (tuple, list)):
+            params = params[0]
+        self._conexion._ida_y_vuelta()
+        try:
+            self._cur.execute(_traducir(sql), params)
+        except sqlite3.Error as e:
+            raise Error(str(e)) from e
+        return self
+
+    def executemany(self, sql: str, filas):
+        filas = list(filas)
+        idas = 1 if self.fast_executemany else len(filas)
+        for _ in range(idas):
+            self._conexion._ida_y_vuelta()
+        try:
+            self._cur.executemany(_traducir(sql), filas)
+        except sqlite3.Error as e:
+            raise Error(str(e)) from e
+
+    def fetchone(self):
+        return self._cur.fetchone()
+
+    def fetchall(self):
+        return self._cur.fetchall()
+
+    def close(self):
+        self._cur.close()
+
+
+class Connection:
+    def __init__(self, conn_str: str, timeout: int = 0):
+        opciones = _parsear(conn_str)
+        self._latencia = float(opciones.get('LATENCIA_MS', 0)) / 1000
+        time.sleep(float(opciones.get('HANDSHAKE_MS', 0)) / 1000)
+        self._db = sqlite3.connect(opciones.get('DATABASE', ':memory:'), timeout=30,
+                                   check_same_thread=False)
+        self._db.executescript(_ESQUEMA)
+        self._db.create_function('HUELLA_MD5', 1, _huella_md5, deterministic=True)
+        self._db.create_function('CONCAT', -1, _concat, deterministic=True)
+        self._db.create_function('FLOOR', 1, lambda x: None if x is None else math.floor(x), deterministic=True)
+
+    def _ida_y_vuelta(self):
+        if self._latencia:
+            time.sleep(self._latencia)
+
+    def cursor(self) -> Cursor:
+        return Cursor(self)
+
+    def commit(self):
+        self._ida_y_vuelta()
+        self._db.commit()
+
+    def rollback(self):
+        self._db.rollback()
+
+    def close(self):
+        self._db.close()
+
+
+def connect(conn_str: str, timeout: int = 0, **kwargs) -> Connection:
+    try:
+        return Connection(conn_str, timeout)
+    except sqlite3.Error as e:
+        raise Error(str(e)) from e
@@ -0,0 +1,186 @@
+"""Búsqueda de solicitudes: índice FTS5 y filtros indexados.
+
+``solicitud_fts`` es una tabla FTS5 con el texto de la solicitud y de sus
+direcciones, cuyo rowid es el ID de la solicitud. Las rutas de guardado la
+alimentan con ``indexar_solicitudes`` dentro de su transacción, con un
+solo INSERT … SELECT por solicitud o por lote: en FTS5 eso es varias
+veces más barato que un trigger por fila. Un trigger sí cubre el borrado.
+
+Los resultados se entregan del más reciente al más antiguo con keyset
+(``before_id``). Cada consulta parte del índice más selectivo disponible
+(RUT, texto, estado de sincronización o la clave primaria) para que una
+página sea un recorrido acotado y no un ordenamiento del total.
+"""
+import re
+import sqlite3
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+# Columnas de solicitud indexadas en texto completo (más ``direcciones``).
+# rutcliente va en el índice para combinar RUT y texto en una sola consulta FTS.
+COLUMNAS_FTS = (
+    'rutcliente', 'cliente', 'razonsocial', 'proyecto', 'pepgasto', 'ejecutivocomercial',
+    'contactocliente', 'contactotecnico', 'jefeproyecto', 'proveedor', 'nrosam',
+)
+
+_columnas = ', '.join(COLUMNAS_FTS)
+
+SQL_CREAR_FTS = f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS solicitud_fts USING fts5(
+      {_columnas}, direcciones,
+      tokenize = 'unicode61 remove_diacritics 2'
+    )
+"""
+
+SQL_TRIGGER_BORRADO_FTS = """
+    CREATE TRIGGER IF NOT EXISTS trg_solicitud_fts_delete AFTER DELETE ON solicitud BEGIN
+      DELETE FROM solicitud_fts WHERE rowid = OLD.id;
+    END
+"""
+
+SQL_INDEXAR = f"""
+    INSERT INTO solicitud_fts (rowid, {_columnas}, direcciones)
+    SELECT s.id, {', '.join(f's.{c}' for c in COLUMNAS_FTS)},
+           IFNULL((SELECT group_concat(d.direccion, ' ') FROM direccion d WHERE d.solicitudid = s.id), '')
+    FROM solicitud s
+    WHERE s.id BETWEEN ? AND ?
+"""
+
+_PALABRA = re.compile(r'\w+', re.UNICODE)
+
+
+def crear_indice_fts(cur: sqlite3.Cursor):
+    """Crea la tabla FTS y su trigger, e indexa las solicitudes que aún no estén.
+
+    La primera vez indexa toda la tabla; luego solo lo insertado después del
+    último ID indexado (p. ej. por una versión anterior de la app).
+    """
+    cur.execute(SQL_CREAR_FTS)
+    cur.execute(SQL_TRIGGER_BORRADO_FTS)
+    ultimo = cur.execute("SELECT IFNULL(MAX(rowid), 0) FROM solicitud_fts").fetchone()[0]
+    indexar_solicitudes(cur, ultimo + 1, 1 << 62)
+
+
+def indexar_solicitudes(cur: sqlite3.Cursor, desde_id: int, hasta_id: int):
+    """Agrega al índice las solicitudes [desde_id, hasta_id] con sus direcciones.
+
+    Debe llamarse en la misma transacción, después de insertar las direcciones.
+    """
+    cur.execute(SQL_INDEXAR, (desde_id, hasta_id))
+
+
+def consulta_fts(texto: str) -> Optional[str]:
+    """Convierte texto libre en una consulta FTS5 segura.
+
+    Cada palabra se busca como prefijo y todas deben aparecer (AND); la
+    sintaxis FTS5 del usuario (comillas, NEAR, columnas) no se interpreta.
+    """
+    palabras = _PALABRA.findall(texto or '')
+    if not palabras:
+        return None
+    return ' '.join(f'"{p}"*' for p in palabras)
+
+
+# fecha_creacion crece con el ID: un rango de fechas se traduce a un rango de
+# IDs con dos búsquedas en idx_solicitud_fecha, y el recorrido sigue siendo
+# por clave primaria (también lo usa exportacion.py)
+SQL_PRIMER_ID_DESDE = "SELECT id FROM solicitud WHERE fecha_creacion >= ? ORDER BY fecha_creacion, id LIMIT 1"
+SQL_ULTIMO_ID_HASTA = """SELECT id FROM solicitud WHERE fecha_creacion < ?
+                         ORDER BY fecha_creacion DESC, id DESC LIMIT 1"""
+
+
+def _fecha(valor: str, nombre: str) -> datetime:
+    try:
+        return datetime.strptime(valor, '%Y-%m-%d')
+    except ValueError:
+        raise ValueError(f"{nombre} debe tener formato AAAA-MM-DD")
+
+
+def limites_fecha(desde: Optional[str], hasta: Optional[str]) -> Tuple[Optional[str], Optional[str]]:
+    """Parámetros de SQL_PRIMER_ID_DESDE y SQL_ULTIMO_ID_HASTA para ``desde``/``hasta``.
+
+    Las fechas son AAAA-MM-DD inclusivas (None si no vienen). Lanza
+    ValueError ante un formato inválido.
+    """
+    inferior = _fecha(desde, 'desde').strftime('%Y-%m-%d') if desde else None
+    superior = (_fecha(hasta, 'hasta') + timedelta(days=1)).strftime('%Y-%m-%d') if hasta else None
+    return inferior, superior
+
+
+def construir_busqueda(q: Optional[str] = None, rut: Optional[str] = None, estado: Optional[str] = None,
+                       estado_sync: Optional[str] = None, ejecutivo: Optional[str] = None,
+                       desde: Optional[str] = None, hasta: Optional[str] = None,
+                       before_id: Optional[int] = None, limite: int = 50) -> Tuple[str, List[Any]]:
+    """SQL y parámetros de una página de resultados (más recientes primero).
+
+    ``rut`` debe venir normalizado; ``desde``/``hasta`` son fechas AAAA-MM-DD
+    inclusivas sobre ``fecha_creacion``. Lanza ValueError ante filtros inválidos.
+    """
+    condiciones: List[str] = []
+    params: List[Any] = []
+
+    fts = consulta_fts(q) if q else None
+    if q and fts is None:
+        raise ValueError("q no contiene palabras buscables")
+
+    if fts:
+        # FTS5 recorre por rowid descendente y cruza el RUT en el mismo índice
+        if rut:
+            fts = 'rutcliente : "%s" AND (%s)' % (rut.replace('"', '""'), fts)
+        origen = "solicitud_fts f JOIN solicitud s ON s.id = f.rowid"
+        union_sync = "LEFT JOIN sync_estado se ON se.solicitud_id = s.id"
+        condiciones.append("solicitud_fts MATCH ?")
+        params.append(fts)
+        clave = "f.rowid"
+    elif estado_sync and not rut:
+        # idx_sync_estado(estado_sync) entrega los IDs ya ordenados
+        origen = "sync_estado se JOIN solicitud s ON s.id = se.solicitud_id"
+        union_sync = ""
+        clave = "se.solicitud_id"
+    else:
+        origen = "solicitud s"
+        union_sync = "LEFT JOIN sync_estado se ON se.solicitud_id = s.id"
+        clave = "s.id"
+
+    if before_id is not None:
+        condiciones.append(f"{clave} < ?")
+        params.append(before_id)
+    if rut and not fts:
+        condiciones.append("s.rutcliente = ?")
+        params.append(rut)
+    if estado_sync:
+        condiciones.append("se.estado_sync = ?")
+        params.append(estado_sync)
+    if estado:
+        condiciones.append("s.estado = ?")
+        params.append(estado)
+    if ejecutivo:
+        condiciones.append("s.ejecutivocomercial = ?")
+        params.append(ejecutivo)
+
+    inferior, superior = limites_fecha(desde, hasta)
+    if inferior:
+        condiciones.append(f"{clave} >= ({SQL_PRIMER_ID_DESDE})")
+        params.append(inferior)
+    if superior:
+        condiciones.append(f"{clave} <= ({SQL_ULTIMO_ID_HASTA})")
+        params.append(superior)
+
+    where = f"WHERE {' AND '.join(condiciones)}" if condiciones else ""
+    sql = f"""
+        SELECT s.*, se.estado_sync, se.fecha_sync
+        FROM {origen}
+        {union_sync}
+        {where}
+        ORDER BY {clave} DESC
+        LIMIT ?
+    """
+    params.append(limite)
+    return sql, params
+
+
+def buscar_solicitudes(cur: sqlite3.Cursor, **filtros) -> List[Dict]:
+    """Ejecuta ``construir_busqueda`` y retorna las filas como dicts."""
+    sql, params = construir_busqueda(**filtros)
+    cur.execute(sql, params)
+    return [dict(r) for r in cur.fetchall()]
@@ -0,0 +1,205 @@
+"""Feed de cambios de solicitudes con cursor monótono.
+
+Cada alta y cada cambio de ``sync_estado`` deja una fila en ``cambios``
+(por trigger, así lo cubren todas las rutas de escritura: guardar, lotes,
+el sincronizador, marcar_sincronizado y la reconciliación). ``seq`` es
+AUTOINCREMENT y nunca se reutiliza, de modo que un consumidor solo
+necesita recordar el último ``seq`` recibido.
+
+Los consumidores en espera (long-poll o SSE) no consultan la BD: un hilo
+vigía por proceso revisa ``PRAGMA data_version`` (una lectura de memoria
+compartida del WAL) y solo cuando otra conexión confirmó algo lee
+``MAX(seq)`` y despierta a los que esperan, sean hilos o corrutinas.
+
+Los cambios se conservan ``retencion_dias``; un cursor anterior a lo
+conservado recibe ``reinicio`` y debe resincronizar con
+/api/obtener_pendientes.
+"""
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, Optional, Set, Tuple
+
+from sincronizacion import direcciones_por_solicitud
+
+logger = logging.getLogger(__name__)
+
+SQL_CREAR_CAMBIOS = """
+    CREATE TABLE IF NOT EXISTS cambios (
+      seq INTEGER PRIMARY KEY AUTOINCREMENT,
+      solicitud_id INTEGER NOT NULL,
+      estado_sync TEXT,
+      fecha TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+"""
+
+# Toda solicitud nace con su fila PENDIENTE en sync_estado, así que basta con
+# observar sync_estado: un alta y cada cambio de estado dejan una fila. Quien
+# actualiza sync_estado usa INSERT ... ON CONFLICT DO UPDATE: un INSERT OR
+# REPLACE borra e inserta, dispara el trigger de INSERT y dejaría una fila por
+# cada re-marca aunque el estado no cambie (ERROR → ERROR, SINCRONIZADO otra vez).
+SQL_TRIGGERS_CAMBIOS = (
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_cambios_sync_insert AFTER INSERT ON sync_estado BEGIN
+      INSERT INTO cambios (solicitud_id, estado_sync) VALUES (NEW.solicitud_id, NEW.estado_sync);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_cambios_sync_update AFTER UPDATE OF estado_sync ON sync_estado
+    WHEN NEW.estado_sync IS NOT OLD.estado_sync BEGIN
+      INSERT INTO cambios (solicitud_id, estado_sync) VALUES (NEW.solicitud_id, NEW.estado_sync);
+    END
+    """,
+)
+
+SQL_CAMBIOS_PAGINA = "SELECT seq, solicitud_id FROM cambios WHERE seq > ? ORDER BY seq LIMIT ?"
+
+
+def crear_feed_cambios(cur: sqlite3.Cursor):
+    """Crea la tabla ``cambios`` y sus triggers."""
+    cur.execute(SQL_CREAR_CAMBIOS)
+    for sql in SQL_TRIGGERS_CAMBIOS:
+        cur.execute(sql)
+
+
+class FeedCambios:
+    def __init__(self, get_db: Callable[[], sqlite3.Connection], retencion_dias: int = 7,
+                 intervalo: float = 0.1, intervalo_purga: float = 3600):
+        self.get_db = get_db
+        self.retencion_dias = retencion_dias
+        self.intervalo = intervalo
+        self.intervalo_purga = intervalo_purga
+
+        self._cond = threading.Condition()
+        self._ultimo = 0
+        self._esperas_async: Set[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = set()
+        self._hilo: Optional[threading.Thread] = None
+
+    # ---------- Lectura ----------
+    def leer(self, cursor: int, limite: int, estado_sync: Optional[str] = None) -> Dict:
+        """Solicitudes cambiadas después de ``cursor``, en su estado actual.
+
+        Varios cambios de una misma solicitud en la página se entregan una vez,
+        con el ``seq`` del último. ``estado_sync`` filtra por el estado actual.
+        El cursor retornado avanza hasta el último cambio revisado aunque el
+        filtro lo haya descartado.
+        """
+        db = self.get_db()
+        try:
+            cur = db.cursor()
+            reinicio = cursor < self._primer_seq(cur) - 1
+            cur.execute(SQL_CAMBIOS_PAGINA, (cursor, limite))
+            ultimos: Dict[int, int] = {}
+            for seq, solicitud_id in cur.fetchall():
+                ultimos[solicitud_id] = seq
+            if not ultimos:
+                return {"cambios": [], "cursor": cursor, "reinicio": reinicio}
+            nuevo_cursor = max(ultimos.values())
+
+            cur.execute("""
+                SELECT s.*, se.estado_sync, se.fecha_sync
+                FROM solicitud s
+                LEFT JOIN sync_estado se ON se.solicitud_id = s.id
+                WHERE s.id IN (SELECT value FROM json_each(?))
+            """, (json.dumps(list(ultimos)),))
+            solicitudes = [dict(r) for r in cur.fetchall()
+                           if estado_sync is None or r['estado_sync'] == estado_sync]
+            direcciones = direcciones_por_solicitud(cur, [s['id'] for s in solicitudes])
+        finally:
+            db.close()
+
+        for sol in solicitudes:
+            sol['seq'] = ultimos[sol['id']]
+            sol['direcciones'] = direcciones.get(sol['id'], [])
+        solicitudes.sort(key=lambda s: s['seq'])
+        return {"cambios": solicitudes, "cursor": nuevo_cursor, "reinicio": reinicio}
+
+    @staticmethod
+    def _primer_seq(cur: sqlite3.Cursor) -> int:
+        """Primer ``seq`` conservado (o el siguiente a asignar si se purgó todo)."""
+        primero = cur.execute("SELECT MIN(seq) FROM cambios").fetchone()[0]
+        if primero is not None:
+            return primero
+        fila = cur.execute("SELECT seq FROM sqlite_sequence WHERE name = 'cambios'").fetchone()
+        return (fila[0] if fila else 0) + 1
+
+    # ---------- Espera ----------
+    def esperar(self, cursor: int, timeout: float) -> bool:
+        """Bloquea hasta que exista un cambio posterior a ``cursor`` o venza ``timeout``."""
+        self._iniciar_vigia()
+        with self._cond:
+            return self._cond.wait_for(lambda: self._ultimo > cursor, timeout)
+
+    async def esperar_async(self, cursor: int, timeout: float) -> bool:
+        """Versión para el event loop: no ocupa un hilo mientras espera."""
+        self._iniciar_vigia()
+        loop = asyncio.get_running_loop()
+        fin = loop.time() + timeout
+        while True:
+            futuro = loop.create_future()
+            espera = (loop, futuro)
+            with self._cond:
+                if self._ultimo > cursor:
+                    return True
+                self._esperas_async.add(espera)
+            try:
+                await asyncio.wait_for(futuro, max(fin - loop.time(), 0))
+            except asyncio.TimeoutError:
+                return self._ultimo > cursor
+            finally:
+                with self._cond:
+                    self._esperas_async.discard(espera)
+
+    @staticmethod
+    def _resolver(futuro: asyncio.Future):
+        if not futuro.done():
+            futuro.set_result(True)
+
+    def _iniciar_vigia(self):
+        with self._cond:
+            if self._hilo is not None and self._hilo.is_alive():
+                return
+            db = self.get_db()
+            try:
+                self._ultimo = db.execute("SELECT IFNULL(MAX(seq), 0) FROM cambios").fetchone()[0]
+            finally:
+                db.close()
+            self._hilo = threading.Thread(target=self._vigiar, name="vigia-cambios", daemon=True)
+            self._hilo.start()
+
+    def _vigiar(self):
+        db = self.get_db()
+        version = None
+        purgado_en = 0.0
+        while True:
+            try:
+                actual = db.execute("PRAGMA data_version").fetchone()[0]
+                if actual != version:
+                    version = actual
+                    ultimo = db.execute("SELECT IFNULL(MAX(seq), 0) FROM cambios").fetchone()[0]
+                    if ultimo > self._ultimo:
+                        self._notificar(ultimo)
+                if time.monotonic() - purgado_en >= self.intervalo_purga:
+                    purgado_en = time.monotonic()
+                    self._purgar(db)
+            except sqlite3.Error as e:
+                logger.warning("Vigía de cambios: %s", e)
+            time.sleep(self.intervalo)
+
+    def _notificar(self, ultimo: int):
+        with self._cond:
+            self._ultimo = ultimo
+            self._cond.notify_all()
+            for loop, futuro in self._esperas_async:
+                loop.call_soon_threadsafe(self._resolver, futuro)
+
+    def _purgar(self, db: sqlite3.Connection):
+        cur = db.execute("DELETE FROM cambios WHERE fecha < datetime('now', ?)",
+                         (f"-{int(self.retencion_dias)} days",))
+        borrados = cur.rowcount
+        db.commit()
+        if borrados:
+            logger.info("Feed de cambios: %d cambios antiguos purgados", borrados)
@@ -0,0 +1,79 @@
+"""Conexiones SQLite persistentes y afinadas, una por hilo.
+
+``get_db()`` devolvía una conexión nueva en cada llamada; ahora cada hilo
+(y cada proceso, tras un fork de gunicorn) reutiliza la suya. La conexión
+queda en modo WAL con ``synchronous=NORMAL``, de modo que lectores y el
+escritor no se bloquean entre sí y cada commit cuesta una sola escritura
+al WAL.
+
+``close()`` no cierra la conexión: solo hace rollback de una transacción
+que haya quedado abierta, para que el patrón existente
+``db = get_db() ... finally: db.close()`` siga funcionando sin cambios.
+"""
+import logging
+import os
+import sqlite3
+import threading
+
+logger = logging.getLogger(__name__)
+
+PRAGMAS = (
+    # Solo tiene efecto al crear la BD (debe ir antes de WAL); en una BD existente
+    # se activa una vez con ``python archivado.py --vacuum-completo``
+    "PRAGMA auto_vacuum=INCREMENTAL",
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-16000",     # ~16 MB de caché de páginas
+    "PRAGMA mmap_size=268435456",   # 256 MB mapeados en memoria
+)
+
+
+class ConexionReutilizable(sqlite3.Connection):
+    """Conexión cuyo ``close()`` la devuelve al hilo en vez de cerrarla."""
+
+    def close(self):
+        if self.in_transaction:
+            self.rollback()
+
+    def cerrar(self):
+        """Cierra realmente la conexión."""
+        super().close()
+
+
+class GestorSQLite:
+    def __init__(self, db_path: str, busy_timeout: float = 5.0, cached_statements: int = 256):
+        self.db_path = db_path
+        self.busy_timeout = busy_timeout
+        self.cached_statements = cached_statements
+        self._local = threading.local()
+
+    def conexion(self) -> ConexionReutilizable:
+        """Conexión del hilo actual (se crea la primera vez)."""
+        conn = getattr(self._local, 'conn', None)
+        # Tras un fork la conexión heredada no debe usarse en el hijo
+        if conn is None or self._local.pid != os.getpid():
+            conn = self._abrir()
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _abrir(self) -> ConexionReutilizable:
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.busy_timeout,
+            factory=ConexionReutilizable,
+            cached_statements=self.cached_statements,
+        )
+        conn.row_factory = sqlite3.Row  # Permite acceso por columna
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def cerrar(self):
+        """Cierra la conexión del hilo actual, si existe."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            self._local.conn = None
+            if self._local.pid == os.getpid():
+                conn.cerrar()
@@ -0,0 +1,160 @@
+"""Logging no bloqueante: QueueHandler en el proceso y un hilo escritor.
+
+Los requests solo encolan el LogRecord; el formateo y la escritura a disco
+(archivo + consola) ocurren en el hilo del QueueListener, de modo que una
+demora del volumen de logs no se traduce en latencia.
+
+Cada worker de gunicorn es un proceso con su propio handler sobre el mismo
+archivo. Si cada uno rotara por su cuenta, el primero renombraría el
+archivo mientras los demás siguen escribiendo en el renombrado (o lo
+pisarían al rotar de nuevo) y se perderían registros. Por eso la rotación
+por defecto es 'externa': un ``WatchedFileHandler`` reabre el archivo
+cuando logrotate lo mueve, y la rotación la hace un solo proceso::
+
+    /home/cfbayolo/mysite/logs/flask_app.log {
+        daily
+        rotate 10
+        compress
+        delaycompress
+        missingok
+        notifempty
+    }
+
+'tamano' y 'diaria' rotan dentro del proceso y solo son seguras con un
+único proceso escribiendo (werkzeug, un worker).
+
+El nivel DEBUG puede activarse solo para una fracción de los requests de
+ciertas rutas (``muestreo_debug``), p. ej. {'buscar_cliente': 0.01}.
+"""
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+from typing import Dict, Optional
+
+FORMATO_TEXTO = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# True durante un request elegido por muestreo para registrar DEBUG
+_debug_muestreado = contextvars.ContextVar('debug_muestreado', default=False)
+
+
+class FormatoJSON(logging.Formatter):
+    """Una línea JSON por registro, para ingesta estructurada."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        datos = {
+            "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "nivel": record.levelname,
+            "logger": record.name,
+            "mensaje": record.getMessage(),
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            datos["excepcion"] = record.exc_text
+        return json.dumps(datos, ensure_ascii=False)
+
+
+class FiltroMuestreo(logging.Filter):
+    """Deja pasar los registros desde ``nivel``; los inferiores solo en requests muestreados."""
+
+    def __init__(self, nivel: int):
+        super().__init__()
+        self.nivel = nivel
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno >= self.nivel or _debug_muestreado.get()
+
+
+class _QueueHandlerSinCopia(logging.handlers.QueueHandler):
+    """QueueHandler que no formatea en el hilo del request.
+
+    El ``prepare`` estándar llama a ``format`` para fusionar argumentos antes
+    de encolar; aquí solo se convierte el traceback a texto (el objeto no
+    debe sobrevivir al frame) y el mensaje se arma en el hilo escritor.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_muestreo: Dict[str, float] = {}
+
+
+def configurar_logging(log_path: str, archivo: str = 'flask_app.log', nivel: int = logging.INFO,
+                       formato_json: bool = False, rotacion: str = 'externa',
+                       max_bytes: int = 20 * 1024 * 1024, respaldos: int = 10,
+                       muestreo_debug: Optional[Dict[str, float]] = None):
+    """Configura el logger raíz con cola + hilo escritor.
+
+    ``rotacion`` es 'externa' (logrotate; seguro con varios procesos),
+    'tamano' (``max_bytes``) o 'diaria' (medianoche); en estas dos se
+    conservan ``respaldos`` archivos. Idempotente.
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    os.makedirs(log_path, exist_ok=True)
+    ruta = os.path.join(log_path, archivo)
+    if rotacion == 'diaria':
+        handler_archivo = logging.handlers.TimedRotatingFileHandler(
+            ruta, when='midnight', backupCount=respaldos, encoding='utf-8')
+    elif rotacion == 'tamano':
+        handler_archivo = logging.handlers.RotatingFileHandler(
+            ruta, maxBytes=max_bytes, backupCount=respaldos, encoding='utf-8')
+    else:
+        handler_archivo = logging.handlers.WatchedFileHandler(ruta, encoding='utf-8')
+
+    formato = FormatoJSON() if formato_json else logging.Formatter(FORMATO_TEXTO)
+    handler_consola = logging.StreamHandler()
+    for handler in (handler_archivo, handler_consola):
+        handler.setFormatter(formato)
+
+    cola: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    handler_cola = _QueueHandlerSinCopia(cola)
+
+    _muestreo.clear()
+    _muestreo.update(muestreo_debug or {})
+    raiz = logging.getLogger()
+    if _muestreo:
+        # Los DEBUG deben crearse para poder muestrearlos; el filtro descarta el resto
+        handler_cola.addFilter(FiltroMuestreo(nivel))
+        raiz.setLevel(min(nivel, logging.DEBUG))
+    else:
+        raiz.setLevel(nivel)
+    raiz.addHandler(handler_cola)
+
+    _listener = logging.handlers.QueueListener(cola, handler_archivo, handler_consola,
+                                               respect_handler_level=True)
+    _listener.start()
+    atexit.register(detener_logging)
+
+
+def detener_logging():
+    """Vacía la cola y detiene el hilo escritor."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def muestrear_request(ruta: Optional[str]) -> bool:
+    """Decide si el request actual registra DEBUG, según la tasa de su ruta."""
+    tasa = _muestreo.get(ruta or '', 0.0)
+    muestreado = tasa > 0 and random.random() < tasa
+    _debug_muestreado.set(muestreado)
+    return muestreado
+
+
+def terminar_muestreo():
+    """Desactiva el DEBUG muestreado al terminar el request."""
+    _debug_muestreado.set(False)
@@ -0,0 +1,303 @@
+import asyncio
+import logging
+import threading
+import time
+from typing import Dict, List, Optional
+
+from autocompletado import IndiceClientes
+from esquema_solicitud import normalizar_rut
+from importacion_diferida import importar_diferido
+from metricas import DESCARGA_CLIENTES_BYTES, DESCARGA_CLIENTES_SEGUNDOS
+
+# Se carga en la primera descarga (el modo ASGI usa httpx y nunca la necesita)
+requests = importar_diferido('requests')
+
+logger = logging.getLogger(__name__)
+
+SEPARADORES = [';', ',', '|', '\t']
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+
+
+def parsear_clientes(lineas) -> Dict[str, str]:
+    """Convierte las líneas del archivo de clientes en un dict RUT normalizado → nombre.
+
+    El separador se detecta una sola vez con la primera línea de datos; las
+    líneas que no lo contienen se descartan.
+    """
+    clientes: Dict[str, str] = {}
+    separador = None
+
+    for linea in lineas:
+        if isinstance(linea, bytes):
+            linea = linea.decode('utf-8', errors='ignore')
+        linea = linea.strip()
+
+        # Saltar línea vacía o cabecera
+        if not linea or linea.lower().startswith('rut'):
+            continue
+
+        if separador is None:
+            separador = next((sep for sep in SEPARADORES if sep in linea), None)
+            if separador is None:
+                continue
+
+        partes = linea.split(separador, 2)
+        if len(partes) < 2:
+            continue
+
+        rut_txt = partes[0].strip()
+        cliente = partes[1].strip()
+        if not rut_txt or not cliente:
+            continue
+
+        # Ante RUT duplicados se conserva el primero, como en la búsqueda lineal
+        clientes.setdefault(normalizar_rut(rut_txt), cliente)
+
+    return clientes
+
+
+class _ContadorBytes:
+    """Itera las líneas de la descarga acumulando su tamaño en bytes."""
+
+    def __init__(self, lineas):
+        self._lineas = lineas
+        self.bytes = 0
+
+    def __iter__(self):
+        for linea in self._lineas:
+            self.bytes += len(linea) + 1
+            yield linea
+
+
+class DirectorioClientes:
+    """Índice en memoria del archivo de clientes con refresco en segundo plano.
+
+    El archivo se descarga y parsea una sola vez; las búsquedas posteriores son
+    un acceso O(1) al dict. Un hilo daemon refresca el índice cada ``ttl``
+    segundos usando GET condicional (ETag / Last-Modified). Si un refresco
+    falla se sigue sirviendo la última copia válida.
+
+    El índice de autocompletado se construye en la primera consulta que lo
+    usa y desde entonces se reconstruye en el hilo de refresco cada vez que
+    cambia el archivo; mientras tanto se sigue usando el anterior.
+    """
+
+    def __init__(self, url: str, ttl: float = 300, timeout: float = 15):
+        self.url = url
+        self.ttl = ttl
+        self.timeout = timeout
+
+        self._clientes: Optional[Dict[str, str]] = None
+        self._etag: Optional[str] = None
+        self._last_modified: Optional[str] = None
+        self._cargado_en: float = 0.0
+        self._ultimo_error: Optional[str] = None
+        self._indice: Optional[IndiceClientes] = None
+
+        self._lock_carga = threading.Lock()
+        self._lock_indice = threading.Lock()
+        self._lock_async: Optional[asyncio.Lock] = None
+        self._hilo: Optional[threading.Thread] = None
+        self._detener = threading.Event()
+        # True mientras corre bucle_refresco_async (modo ASGI): no hace falta el hilo
+        self._refresco_async = False
+
+    # ---------- Consulta ----------
+    def buscar(self, rut: str) -> Optional[str]:
+        """Retorna el nombre del cliente para un RUT ya normalizado, o None.
+
+        La primera llamada del proceso carga el índice de forma síncrona y
+        arranca el hilo de refresco. Lanza excepción solo si nunca se ha
+        podido cargar el archivo.
+        """
+        clientes = self._clientes
+        if clientes is None:
+            self._asegurar_carga()
+            clientes = self._clientes
+        return clientes.get(rut)
+
+    def autocompletar(self, consulta: str, limite: int = 10) -> List[Dict[str, str]]:
+        """Clientes ({rut, cliente}) cuyo nombre coincide con ``consulta``.
+
+        Coincide por prefijo del nombre, prefijo de sus palabras o, si faltan
+        resultados, por parecido (errores de tipeo). Sin distinguir acentos
+        ni mayúsculas.
+        """
+        if self._clientes is None:
+            self._asegurar_carga()
+        indice = self._indice
+        if indice is None:
+            with self._lock_indice:
+                if self._indice is None:
+                    self._indice = IndiceClientes(self._clientes)
+                    logger.info("Índice de autocompletado construido: %d clientes", len(self._indice))
+                indice = self._indice
+        return indice.sugerir(consulta, limite)
+
+    def _actualizar_indice(self):
+        """Reconstruye el índice de autocompletado si está en uso y quedó desfasado."""
+        with self._lock_indice:
+            clientes = self._clientes
+            if self._indice is None or self._indice.origen is clientes:
+                return
+            inicio = time.monotonic()
+            self._indice = IndiceClientes(clientes)
+        logger.info("Índice de autocompletado reconstruido: %d clientes en %.2fs",
+                    len(clientes), time.monotonic() - inicio)
+
+    def estado(self) -> Dict:
+        """Resumen del snapshot actual (para diagnóstico)."""
+        clientes = self._clientes
+        return {
+            "registros": len(clientes) if clientes is not None else 0,
+            "cargado": clientes is not None,
+            "edad_segundos": round(time.monotonic() - self._cargado_en, 1) if clientes is not None else None,
+            "etag": self._etag,
+            "last_modified": self._last_modified,
+            "ultimo_error": self._ultimo_error,
+            "indice_autocompletado": self._indice is not None,
+        }
+
+    # ---------- Carga / refresco ----------
+    def _asegurar_carga(self):
+        with self._lock_carga:
+            if self._clientes is None:
+                self.refrescar()
+                if self._clientes is None:
+                    raise RuntimeError(f"No se pudo cargar el archivo de clientes: {self._ultimo_error}")
+        self._iniciar_hilo()
+
+    def _cabeceras(self) -> Dict[str, str]:
+        headers = {'User-Agent': USER_AGENT}
+        if self._clientes is not None:
+            if self._etag:
+                headers['If-None-Match'] = self._etag
+            if self._last_modified:
+                headers['If-Modified-Since'] = self._last_modified
+        return headers
+
+    def _sin_cambios(self, inicio: float) -> bool:
+        DESCARGA_CLIENTES_SEGUNDOS.observar(time.monotonic() - inicio, 'sin_cambios')
+        self._cargado_en = time.monotonic()
+        self._ultimo_error = None
+        logger.debug("Archivo de clientes sin cambios (304)")
+        return True
+
+    def _reemplazar(self, clientes: Dict[str, str], cabeceras, inicio: float, total_bytes: int) -> bool:
+        DESCARGA_CLIENTES_SEGUNDOS.observar(time.monotonic() - inicio, 'ok')
+        DESCARGA_CLIENTES_BYTES.observar(total_bytes)
+        if not clientes:
+            raise ValueError("El archivo de clientes no contiene registros válidos")
+
+        self._clientes = clientes
+        self._etag = cabeceras.get('ETag')
+        self._last_modified = cabeceras.get('Last-Modified')
+        self._cargado_en = time.monotonic()
+        self._ultimo_error = None
+        logger.info("Directorio de clientes cargado: %d registros en %.2fs",
+                    len(clientes), time.monotonic() - inicio)
+        return True
+
+    def _fallo(self, error: Exception, inicio: float) -> bool:
+        DESCARGA_CLIENTES_SEGUNDOS.observar(time.monotonic() - inicio, 'error')
+        self._ultimo_error = f"{type(error).__name__}: {error}"
+        if self._clientes is not None:
+            logger.warning("Refresco de clientes falló, se mantiene snapshot anterior: %s",
+                           self._ultimo_error)
+        else:
+            logger.error("No se pudo cargar el archivo de clientes: %s", self._ultimo_error)
+        return False
+
+    def refrescar(self) -> bool:
+        """Descarga el archivo si cambió y reemplaza el snapshot.
+
+        Retorna True si el snapshot quedó vigente (actualizado o 304), False si
+        el refresco falló y se mantiene la copia anterior.
+        """
+        inicio = time.monotonic()
+        try:
+            resp = requests.get(self.url, stream=True, timeout=self.timeout,
+                                headers=self._cabeceras(), allow_redirects=True)
+            with resp:
+                if resp.status_code == 304:
+                    return self._sin_cambios(inicio)
+
+                resp.raise_for_status()
+                contador = _ContadorBytes(resp.iter_lines())
+                clientes = parsear_clientes(contador)
+                self._reemplazar(clientes, resp.headers, inicio, contador.bytes)
+
+        except Exception as e:
+            return self._fallo(e, inicio)
+        self._actualizar_indice()
+        return True
+
+    # ---------- Variante asíncrona (modo ASGI) ----------
+    async def buscar_async(self, rut: str, cliente_http) -> Optional[str]:
+        """Como ``buscar``, pero la carga inicial no bloquea el event loop."""
+        clientes = self._clientes
+        if clientes is None:
+            if self._lock_async is None:
+                self._lock_async = asyncio.Lock()
+            async with self._lock_async:
+                if self._clientes is None:
+                    await self.refrescar_async(cliente_http)
+                    if self._clientes is None:
+                        raise RuntimeError(f"No se pudo cargar el archivo de clientes: {self._ultimo_error}")
+            clientes = self._clientes
+        return clientes.get(rut)
+
+    async def refrescar_async(self, cliente_http) -> bool:
+        """Refresco con un ``httpx.AsyncClient``; el parseo corre en un hilo."""
+        inicio = time.monotonic()
+        try:
+            resp = await cliente_http.get(self.url, headers=self._cabeceras(),
+                                          timeout=self.timeout, follow_redirects=True)
+            if resp.status_code == 304:
+                return self._sin_cambios(inicio)
+
+            resp.raise_for_status()
+            contenido = resp.content
+            loop = asyncio.get_running_loop()
+            clientes = await loop.run_in_executor(None, parsear_clientes, contenido.splitlines())
+            self._reemplazar(clientes, resp.headers, inicio, len(contenido))
+
+        except Exception as e:
+            return self._fallo(e, inicio)
+        await loop.run_in_executor(None, self._actualizar_indice)
+        return True
+
+    async def bucle_refresco_async(self, cliente_http):
+        """Tarea de refresco periódico para el modo ASGI (reemplaza al hilo).
+
+        Mientras corre, la carga síncrona (p. ej. /api/autocompletar_cliente,
+        que se delega a Flask) no arranca el hilo de refresco.
+        """
+        self._refresco_async = True
+        try:
+            while True:
+                await asyncio.sleep(self.ttl)
+                await self.refrescar_async(cliente_http)
+        finally:
+            self._refresco_async = False
+
+    def _iniciar_hilo(self):
+        # El hilo se crea en el primer uso y no al importar, para que cada
+        # worker de gunicorn tenga el suyo después del fork.
+        if self._refresco_async or (self._hilo is not None and self._hilo.is_alive()):
+            return
+        with self._lock_carga:
+            if self._hilo is not None and self._hilo.is_alive():
+                return
+            self._detener.clear()
+            self._hilo = threading.Thread(target=self._bucle_refresco,
+                                          name="directorio-clientes", daemon=True)
+            self._hilo.start()
+
+    def _bucle_refresco(self):
+        while not self._detener.wait(self.ttl):
+            self.refrescar()
+
+    def detener(self):
+        """Detiene el hilo de refresco."""
+        self._detener.set()
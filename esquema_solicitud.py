@@ -0,0 +1,157 @@
+"""Esquema declarativo de la solicitud: clave JSON → columna → tipo → obligatorio.
+
+Es la única definición del mapeo de campos. De ella se derivan el texto
+SQL de los INSERT (SQLite y SQL Server) y ``convertir_solicitud``, que en
+una sola pasada valida el payload, reporta todos los errores juntos y
+produce la tupla de parámetros lista para ejecutar.
+"""
+from operator import itemgetter
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+
+class Campo(NamedTuple):
+    clave: str               # clave en el JSON del formulario
+    columna: str             # columna en solicitud
+    tipo: str                # 'texto' | 'rut' | 'real' | 'entero'
+    obligatorio: bool = True
+    sqlserver: bool = True   # False si la columna solo existe en SQLite
+
+
+CAMPOS: Tuple[Campo, ...] = (
+    Campo('fechaIngreso', 'fechaingreso', 'texto'),
+    Campo('rutCliente', 'rutcliente', 'rut'),
+    Campo('cliente', 'cliente', 'texto'),
+    Campo('nroSAM', 'nrosam', 'texto'),
+    Campo('razonSocial', 'razonsocial', 'texto'),
+    Campo('ejecutivoComercial', 'ejecutivocomercial', 'texto'),
+    Campo('fonoEjecutivo', 'fonoejecutivo', 'texto'),
+    Campo('contactoCliente', 'contactocliente', 'texto'),
+    Campo('fonoContactoCliente', 'fonocontactocliente', 'texto'),
+    Campo('contactoTecnico', 'contactotecnico', 'texto'),
+    Campo('fonoContactoTecnico', 'fonocontactotecnico', 'texto'),
+    Campo('jefeProyecto', 'jefeproyecto', 'texto'),
+    Campo('fonoJefeProyecto', 'fonojefeproyecto', 'texto'),
+    Campo('proyecto', 'proyecto', 'texto'),
+    Campo('pepGasto', 'pepgasto', 'texto'),
+    Campo('proveedor', 'proveedor', 'texto'),
+    Campo('actividad', 'actividad', 'texto'),
+    Campo('tipoDireccion', 'tipodireccion', 'texto'),
+    Campo('conceptoOtrosCostos', 'conceptootroscostos', 'texto'),
+    Campo('monedaOtrosCostos', 'monedaotros_costos', 'texto'),
+    Campo('montoOtrosCostos', 'montootros_costos', 'real', obligatorio=False),
+    Campo('monedaInstalacion', 'monedainstalacion', 'texto'),
+    Campo('costoInstalacion', 'costoinstalacion', 'real', obligatorio=False),
+    Campo('monedaRenta', 'monedarenta', 'texto'),
+    Campo('valorRenta', 'valorrenta', 'real', obligatorio=False),
+    Campo('plazoMeses', 'plazomeses', 'entero'),
+    Campo('solicitudNro', 'nrosolicitud', 'entero', obligatorio=False, sqlserver=False),
+)
+
+CAMPOS_DIRECCION = ('numero', 'direccion', 'servicio', 'capacidad')
+
+# ==================== SQL PRECOMPILADO ====================
+COLUMNAS_SOLICITUD: Tuple[str, ...] = tuple(c.columna for c in CAMPOS)
+COLUMNAS_SQLSERVER: Tuple[str, ...] = tuple(c.columna for c in CAMPOS if c.sqlserver)
+
+
+def _marcadores(n: int) -> str:
+    return ', '.join('?' * n)
+
+
+SQL_INSERT_SOLICITUD = (
+    f"INSERT INTO solicitud ({', '.join(COLUMNAS_SOLICITUD)}) "
+    f"VALUES ({_marcadores(len(COLUMNAS_SOLICITUD))})"
+)
+
+# OUTPUT INSERTED.id devuelve el ID generado sin un SELECT @@IDENTITY aparte
+SQL_INSERT_SOLICITUD_SQLSERVER = (
+    f"INSERT INTO solicitud ({', '.join(COLUMNAS_SQLSERVER)}) "
+    f"OUTPUT INSERTED.id "
+    f"VALUES ({_marcadores(len(COLUMNAS_SQLSERVER))})"
+)
+
+SQL_INSERT_DIRECCION = (
+    f"INSERT INTO direccion (solicitudid, {', '.join(CAMPOS_DIRECCION)}) "
+    f"VALUES ({_marcadores(len(CAMPOS_DIRECCION) + 1)})"
+)
+
+# Extrae de una fila SQLite (sqlite3.Row o dict) los parámetros para SQL Server
+fila_sqlserver = itemgetter(*COLUMNAS_SQLSERVER)
+
+# Número reservado en /init dentro de una fila de SQL_INSERT_SOLICITUD (None si no vino)
+nrosolicitud_fila = itemgetter(COLUMNAS_SOLICITUD.index('nrosolicitud'))
+
+
+# ==================== CONVERSIÓN ====================
+def normalizar_rut(rut: str) -> str:
+    """Normaliza RUT: elimina puntos, espacios y convierte a minúsculas."""
+    return rut.replace(".", "").replace("-", "").strip().lower()
+
+
+def validar_rut(rut: str) -> bool:
+    """Valida formato básico de RUT chileno."""
+    rut_clean = normalizar_rut(rut)
+    return len(rut_clean) >= 8 and len(rut_clean) <= 10
+
+
+def _vacio(valor: Any) -> bool:
+    return valor is None or not str(valor).strip()
+
+
+def convertir_solicitud(data: Dict) -> Tuple[Optional[Tuple], List[Tuple], List[str]]:
+    """Valida y convierte un payload en una sola pasada.
+
+    Retorna ``(fila, direcciones, errores)``: ``fila`` son los parámetros de
+    SQL_INSERT_SOLICITUD y ``direcciones`` las tuplas (numero, direccion,
+    servicio, capacidad) sin el ID de la solicitud. Si hay errores, ``fila``
+    es None y ``errores`` los lista todos.
+    """
+    if not isinstance(data, dict):
+        return None, [], ["El cuerpo debe ser un objeto JSON"]
+
+    errores: List[str] = []
+    fila: List[Any] = []
+    numericos_invalidos = False
+
+    for campo in CAMPOS:
+        valor = data.get(campo.clave)
+
+        if campo.obligatorio and _vacio(valor):
+            errores.append(f"Campo obligatorio faltante: {campo.clave}")
+            continue
+
+        if campo.tipo == 'texto':
+            fila.append(valor)
+        elif campo.tipo == 'rut':
+            if not validar_rut(str(valor)):
+                errores.append("Formato de RUT inválido")
+                continue
+            fila.append(normalizar_rut(str(valor)))
+        else:
+            try:
+                if campo.tipo == 'real':
+                    fila.append(0.0 if valor is None else float(valor))
+                elif campo.obligatorio:
+                    fila.append(int(valor))
+                else:
+                    fila.append(int(valor) if valor else None)
+            except (TypeError, ValueError):
+                numericos_invalidos = True
+
+    if numericos_invalidos:
+        errores.append("Valores numéricos inválidos")
+
+    direcciones_data = data.get('direcciones', [])
+    direcciones: List[Tuple] = []
+    if not isinstance(direcciones_data, list) or len(direcciones_data) == 0:
+        errores.append("Debe incluir al menos una dirección")
+    else:
+        for i, d in enumerate(direcciones_data, start=1):
+            if not isinstance(d, dict) or any(k not in d for k in CAMPOS_DIRECCION):
+                errores.append(f"Dirección {i} incompleta")
+                continue
+            direcciones.append(tuple(d[k] for k in CAMPOS_DIRECCION))
+
+    if errores:
+        return None, [], errores
+    return tuple(fila), direcciones, []
@@ -0,0 +1,241 @@
+"""Exportación masiva de solicitudes en streaming (CSV, NDJSON o Parquet).
+
+Las solicitudes se leen en páginas por clave primaria (keyset), cada una
+con una sola consulta de direcciones, y cada formato las convierte en
+trozos de bytes a medida que llegan: la memoria depende del tamaño de
+página y no del total exportado, y el primer trozo sale apenas se lee la
+primera página. Entre páginas no queda abierta ninguna transacción de
+lectura, así una exportación larga no impide los checkpoints del WAL.
+
+- ``ndjson``: una solicitud por línea, con sus direcciones anidadas.
+- ``csv``: una fila por dirección, con los campos de la solicitud repetidos.
+- ``parquet``: un row group por página, direcciones como lista de structs
+  (requiere ``pyarrow``).
+
+Desde la línea de comandos::
+
+    python exportacion.py --formato csv --desde 2026-09-01 --hasta 2026-09-30 > septiembre.csv
+"""
+import csv
+import io
+import json
+import sqlite3
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from busqueda import SQL_PRIMER_ID_DESDE, SQL_ULTIMO_ID_HASTA, limites_fecha
+from esquema_solicitud import CAMPOS, CAMPOS_DIRECCION, COLUMNAS_SOLICITUD
+from importacion_diferida import importar_diferido
+from sincronizacion import direcciones_por_solicitud
+
+# Dependencia opcional (sin ella no hay formato parquet); se carga con la primera exportación parquet
+pa = importar_diferido('pyarrow', opcional=True)
+
+FORMATOS = ('csv', 'ndjson', 'parquet')
+
+TIPOS_CONTENIDO = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+COLUMNAS_EXPORTACION: Tuple[str, ...] = (
+    ('id',) + COLUMNAS_SOLICITUD + ('fecha_creacion', 'estado', 'estado_sync', 'fecha_sync')
+)
+
+SQL_PAGINA = """
+    SELECT s.*, se.estado_sync, se.fecha_sync
+    FROM solicitud s
+    LEFT JOIN sync_estado se ON se.solicitud_id = s.id
+    WHERE s.id > ? AND s.id <= ? {filtros}
+    ORDER BY s.id
+    LIMIT ?
+"""
+
+
+def rango_ids(cur: sqlite3.Cursor, desde: Optional[str], hasta: Optional[str]) -> Tuple[int, int]:
+    """Rango (excluido, incluido] de IDs creados entre ``desde`` y ``hasta`` (AAAA-MM-DD, inclusivas).
+
+    Mismas búsquedas que los filtros de fecha de busqueda.py; el recorrido
+    posterior es por clave primaria.
+    """
+    inferior, superior = limites_fecha(desde, hasta)
+    primero, ultimo = 0, 1 << 62
+    if inferior:
+        fila = cur.execute(SQL_PRIMER_ID_DESDE, (inferior,)).fetchone()
+        primero = fila[0] - 1 if fila else ultimo
+    if superior:
+        fila = cur.execute(SQL_ULTIMO_ID_HASTA, (superior,)).fetchone()
+        ultimo = fila[0] if fila else 0
+    return primero, ultimo
+
+
+def iterar_solicitudes(get_db: Callable[[], sqlite3.Connection], desde: Optional[str] = None,
+                       hasta: Optional[str] = None, estado: Optional[str] = None,
+                       estado_sync: Optional[str] = None, pagina: int = 1000) -> Iterator[List[Dict]]:
+    """Genera páginas de solicitudes (con ``direcciones``) en orden de ID.
+
+    Lanza ValueError ante fechas inválidas antes de generar la primera página.
+    """
+    filtros, params = '', []
+    if estado:
+        filtros += " AND s.estado = ?"
+        params.append(estado)
+    if estado_sync:
+        filtros += " AND se.estado_sync = ?"
+        params.append(estado_sync)
+    sql = SQL_PAGINA.format(filtros=filtros)
+
+    db = get_db()
+    try:
+        primero, ultimo = rango_ids(db.cursor(), desde, hasta)
+    finally:
+        db.close()
+
+    def generar():
+        after_id = primero
+        while True:
+            db = get_db()
+            try:
+                cur = db.cursor()
+                cur.execute(sql, [after_id, ultimo] + params + [pagina])
+                filas = [dict(r) for r in cur.fetchall()]
+                if not filas:
+                    return
+                direcciones = direcciones_por_solicitud(cur, [f['id'] for f in filas])
+            finally:
+                db.close()
+
+            for sol in filas:
+                sol['direcciones'] = [{k: d[k] for k in CAMPOS_DIRECCION} for d in direcciones.get(sol['id'], [])]
+            yield filas
+            if len(filas) < pagina:
+                return
+            after_id = filas[-1]['id']
+
+    return generar()
+
+
+# ==================== FORMATOS ====================
+def a_ndjson(paginas: Iterator[List[Dict]]) -> Iterator[bytes]:
+    for filas in paginas:
+        yield ''.join(json.dumps(sol, ensure_ascii=False, default=str) + '\n' for sol in filas).encode('utf-8')
+
+
+def a_csv(paginas: Iterator[List[Dict]]) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    escritor.writerow(COLUMNAS_EXPORTACION + tuple(f'dir_{c}' for c in CAMPOS_DIRECCION))
+    for filas in paginas:
+        for sol in filas:
+            base = [sol.get(c) for c in COLUMNAS_EXPORTACION]
+            # Una solicitud sin direcciones igual aparece, con las columnas de dirección vacías
+            for d in sol['direcciones'] or [{}]:
+                escritor.writerow(base + [d.get(c) for c in CAMPOS_DIRECCION])
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+def _esquema_parquet():
+    tipos = {c.columna: {'real': pa.float64(), 'entero': pa.int64()}.get(c.tipo, pa.string()) for c in CAMPOS}
+    tipos['id'] = pa.int64()
+    direccion = pa.struct([('numero', pa.int64()), ('direccion', pa.string()),
+                           ('servicio', pa.string()), ('capacidad', pa.string())])
+    campos = [pa.field(c, tipos.get(c, pa.string())) for c in COLUMNAS_EXPORTACION]
+    return pa.schema(campos + [pa.field('direcciones', pa.list_(direccion))])
+
+
+class _Sumidero:
+    """Destino de escritura que acumula bytes hasta que el generador los entrega."""
+
+    def __init__(self):
+        self.partes: List[bytes] = []
+        self.posicion = 0
+        self.closed = False
+
+    def write(self, datos) -> int:
+        datos = bytes(datos)
+        self.partes.append(datos)
+        self.posicion += len(datos)
+        return len(datos)
+
+    def tell(self) -> int:
+        return self.posicion
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def vaciar(self) -> bytes:
+        datos = b''.join(self.partes)
+        self.partes.clear()
+        return datos
+
+
+def a_parquet(paginas: Iterator[List[Dict]]) -> Iterator[bytes]:
+    if pa is None:
+        raise RuntimeError("El formato parquet requiere pyarrow")
+    import pyarrow.parquet as pq
+
+    esquema = _esquema_parquet()
+    sumidero = _Sumidero()
+    escritor = pq.ParquetWriter(sumidero, esquema, compression='zstd')
+    for filas in paginas:
+        datos = {c: [sol.get(c) for sol in filas] for c in COLUMNAS_EXPORTACION}
+        datos['direcciones'] = [sol['direcciones'] for sol in filas]
+        escritor.write_table(pa.Table.from_pydict(datos, schema=esquema))
+        yield sumidero.vaciar()
+    escritor.close()
+    yield sumidero.vaciar()
+
+
+CONVERSORES = {'csv': a_csv, 'ndjson': a_ndjson, 'parquet': a_parquet}
+
+
+def exportar(get_db: Callable[[], sqlite3.Connection], formato: str, **filtros) -> Iterator[bytes]:
+    """Trozos de bytes de la exportación en ``formato``.
+
+    Valida formato y filtros antes de retornar (ValueError), para que el
+    llamador pueda responder 400 sin haber empezado a transmitir.
+    """
+    if formato not in FORMATOS:
+        raise ValueError(f"formato debe ser uno de: {', '.join(FORMATOS)}")
+    if formato == 'parquet' and pa is None:
+        raise ValueError("formato parquet no disponible (falta pyarrow)")
+    return CONVERSORES[formato](iterar_solicitudes(get_db, **filtros))
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+
+    from flask_app import crear_app, get_db
+
+    crear_app()
+
+    parser = argparse.ArgumentParser(description="Exporta solicitudes con sus direcciones")
+    parser.add_argument('--formato', choices=FORMATOS, default='csv')
+    parser.add_argument('--desde', help="fecha de creación inicial AAAA-MM-DD (inclusive)")
+    parser.add_argument('--hasta', help="fecha de creación final AAAA-MM-DD (inclusive)")
+    parser.add_argument('--estado')
+    parser.add_argument('--estado-sync', dest='estado_sync')
+    parser.add_argument('--salida', help="archivo de salida (por defecto stdout)")
+    args = parser.parse_args()
+
+    try:
+        trozos = exportar(get_db, args.formato, desde=args.desde, hasta=args.hasta,
+                          estado=args.estado, estado_sync=args.estado_sync)
+    except ValueError as e:
+        parser.error(str(e))
+
+    salida = open(args.salida, 'wb') if args.salida else sys.stdout.buffer
+    try:
+        for trozo in trozos:
+            salida.write(trozo)
+    finally:
+        if args.salida:
+            salida.close()
@@ -1,87 +1,134 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Response, g, request, jsonify
 import sqlite3
+import hashlib
+import json
 from datetime import datetime
 import os
-import pyodbc
 import logging
-import requests
+import threading
+import time
 from functools import wraps
 from typing import Optional, Dict, List, Tuple
 
+from archivado import Archivador
+from busqueda import buscar_solicitudes, indexar_solicitudes
+from cambios import FeedCambios
+from conexion_sqlite import GestorSQLite
+from configuracion_logs import configurar_logging, muestrear_request, terminar_muestreo
+from directorio_clientes import DirectorioClientes
+from esquema_solicitud import (
+    SQL_INSERT_DIRECCION, SQL_INSERT_SOLICITUD, convertir_solicitud, normalizar_rut, nrosolicitud_fila,
+    validar_rut
+)
+from exportacion import TIPOS_CONTENIDO, exportar
+from idempotencia import ClaveReutilizada, RegistroIdempotencia, huella_payload
+from metricas import BUSQUEDAS_CLIENTE, DURACION_BD, LATENCIA_HTTP, REGISTRO, Gauge
+from migraciones import migrar
+from numeracion import NumeroDuplicado, ReservaNumeros, es_numero_duplicado
+from pagina_estatica import PaginaEstatica
+from pool_sqlserver import PoolSQLServer
+from reconciliacion import Reconciliador
+from reportes import ResumenMontos, acumular_resumen
+from sincronizacion import SincronizadorSQLServer, direcciones_por_solicitud
+
 # ==================== CONFIGURACIÓN ====================
-DB_PATH = "/home/cfbayolo/mysite/alta.db"
+# Las variables ALTA_* permiten apuntar a recursos locales (benchmarks, pruebas)
+DB_PATH = os.environ.get("ALTA_DB_PATH", "/home/cfbayolo/mysite/alta.db")
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-LOG_PATH = "/home/cfbayolo/mysite/logs"
-
-# Crear directorio de logs si no existe
-os.makedirs(LOG_PATH, exist_ok=True)
-
-# Configurar logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(os.path.join(LOG_PATH, 'flask_app.log')),
-        logging.StreamHandler()
-    ]
-)
+LOG_PATH = os.environ.get("ALTA_LOG_PATH", "/home/cfbayolo/mysite/logs")
+
+# Logging: formato JSON opcional, rotación y fracción de requests por ruta que
+# registran DEBUG (p. ej. {'buscar_cliente': 0.01}). Con varios workers de gunicorn
+# la rotación debe ser 'externa' (logrotate, ver configuracion_logs.py); 'tamano' y
+# 'diaria' rotan dentro del proceso y solo sirven con un único proceso
+LOG_JSON = False
+LOG_ROTACION = os.environ.get("ALTA_LOG_ROTACION", "externa")
+LOG_MUESTREO_DEBUG: Dict[str, float] = {}
+
 logger = logging.getLogger(__name__)
 
+# Migraciones del esquema: las aplica un solo proceso a la vez
+MIGRACION_LOCK_PATH = DB_PATH + ".migracion.lock"
+
 app = Flask(__name__)
 app.config['JSON_SORT_KEYS'] = False
 
-SQL_CONN_STR = (
+SQL_CONN_STR = os.environ.get("ALTA_SQL_CONN_STR", (
     'DRIVER={ODBC Driver 17 for SQL Server};'
     'SERVER=NOTDELL191114\\SQLEXPRESS;'
     'DATABASE=SolicitudAlta;'
     'Trusted_Connection=yes;'
     'TrustServerCertificate=yes;'
+))
+
+# Archivo compartido de clientes (RUT;Nombre) y su tiempo de refresco en segundos
+CLIENTES_URL = os.environ.get(
+    "ALTA_CLIENTES_URL", "https://drive.google.com/uc?export=download&id=10EUZK61nkiZ90IbNOYLjAtnWKz-9IKPx"
 )
+CLIENTES_TTL = 300
+
+directorio_clientes = DirectorioClientes(CLIENTES_URL, ttl=CLIENTES_TTL)
+
+# Sugerencias por respuesta de /api/autocompletar_cliente
+AUTOCOMPLETAR_LIMITE = 10
+AUTOCOMPLETAR_LIMITE_MAX = 50
+
+# Sincronización a SQL Server dentro de la app (por defecto) o, con ALTA_SYNC_EN_APP=0,
+# como proceso aparte (python sincronizacion.py) o mediante el cliente externo de
+# /api/obtener_pendientes + /api/marcar_sincronizado. Este último no debe correr junto
+# con el sincronizador: ambos envían las mismas solicitudes PENDIENTES y duplicarían
+# filas en SQL Server. Usar uno solo (ver Dockerfile).
+SYNC_EN_APP = os.environ.get("ALTA_SYNC_EN_APP", "1") != "0"
+SYNC_LOCK_PATH = DB_PATH + ".sync.lock"
+
+# Archivo frío: solicitudes SINCRONIZADAS con más de ARCHIVO_DIAS_RETENCION días
+# salen de la BD viva a un archivo SQLite por mes en ARCHIVO_DIR
+ARCHIVO_EN_APP = os.environ.get("ALTA_ARCHIVO_EN_APP", "1") != "0"
+ARCHIVO_DIR = os.environ.get("ALTA_ARCHIVO_DIR", os.path.join(os.path.dirname(DB_PATH), "archivo"))
+ARCHIVO_DIAS_RETENCION = 90
+ARCHIVO_LOCK_PATH = DB_PATH + ".archivo.lock"
+
+# Reconciliación con SQL Server (python reconciliacion.py): IDs remotos por bucket
+RECONCILIACION_BUCKET = 1000
+RECONCILIACION_LOCK_PATH = DB_PATH + ".reconciliacion.lock"
+
+# Máximo de solicitudes aceptadas por /api/guardar_lote
+LOTE_MAX = 50000
+
+# Paginación de /api/obtener_pendientes
+PENDIENTES_PAGINA = 500
+PENDIENTES_LIMITE_MAX = 5000
+
+# Paginación de /api/buscar_solicitudes
+BUSQUEDA_PAGINA = 50
+BUSQUEDA_LIMITE_MAX = 500
+
+# Solicitudes por página leída en /api/exportar (la memoria depende de esto, no del total)
+EXPORTACION_PAGINA = 1000
+
+# Feed de cambios (/api/cambios y /api/cambios/stream)
+CAMBIOS_PAGINA = 500
+CAMBIOS_LIMITE_MAX = 5000
+CAMBIOS_ESPERA_MAX = 30         # segundos máximos de un long-poll
+CAMBIOS_SSE_DURACION = 300      # el cliente SSE reconecta con Last-Event-ID
+CAMBIOS_RETENCION_DIAS = 7
+# Long-polls y streams SSE esperando a la vez en cada proceso WSGI: cada uno ocupa
+# un hilo de gthread (ver gunicorn.conf.py); los que excedan reciben 503. El modo
+# ASGI los atiende en el event loop y no usa este límite
+CAMBIOS_ESPERAS_MAX = int(os.environ.get("ALTA_CAMBIOS_ESPERAS_MAX", "4"))
+
+# Ventana (segundos) en que un envío repetido de /guardarsolicitud devuelve el ID original
+IDEMPOTENCIA_TTL = 24 * 3600
+
+# index.html no lleva huella en el nombre: caché corta y revalidación por ETag
+INDEX_CACHE_CONTROL = "public, max-age=300, must-revalidate"
 
 # ==================== UTILIDADES ====================
-def normalizar_rut(rut: str) -> str:
-    """Normaliza RUT: elimina puntos, espacios y convierte a minúsculas."""
-    return rut.replace(".", "").replace("-", "").strip().lower()
-
-def validar_rut(rut: str) -> bool:
-    """Valida formato básico de RUT chileno."""
-    rut_clean = normalizar_rut(rut)
-    return len(rut_clean) >= 8 and len(rut_clean) <= 10
-
-def validar_datos_solicitud(data: Dict) -> Tuple[bool, str]:
-    """Valida datos obligatorios de solicitud."""
-    campos_obligatorios = [
-        'fechaIngreso', 'rutCliente', 'cliente', 'nroSAM', 'razonSocial',
-        'ejecutivoComercial', 'fonoEjecutivo', 'contactoCliente', 
-        'fonoContactoCliente', 'contactoTecnico', 'fonoContactoTecnico',
-        'jefeProyecto', 'fonoJefeProyecto', 'proyecto', 'pepGasto',
-        'proveedor', 'actividad', 'tipoDireccion', 'conceptoOtrosCostos',
-        'monedaOtrosCostos', 'monedaInstalacion', 'monedaRenta', 'plazoMeses'
-    ]
-    
-    for campo in campos_obligatorios:
-        if campo not in data or not str(data.get(campo, '')).strip():
-            return False, f"Campo obligatorio faltante: {campo}"
-    
-    # Validar RUT
-    if not validar_rut(data['rutCliente']):
-        return False, "Formato de RUT inválido"
-    
-    # Validar valores numéricos
-    try:
-        float(data.get('montoOtrosCostos', 0))
-        float(data.get('costoInstalacion', 0))
-        float(data.get('valorRenta', 0))
-        int(data['plazoMeses'])
-    except ValueError:
-        return False, "Valores numéricos inválidos"
-    
-    # Validar direcciones
-    direcciones = data.get('direcciones', [])
-    if not isinstance(direcciones, list) or len(direcciones) == 0:
-        return False, "Debe incluir al menos una dirección"
-    
-    return True, "OK"
+# normalizar_rut / validar_rut, el mapeo de campos y la validación viven en esquema_solicitud
+
+def filas_direccion(solicitud_id: int, direcciones: List[Tuple]) -> List[Tuple]:
+    """Antepone el ID de la solicitud a las direcciones convertidas."""
+    return [(solicitud_id,) + d for d in direcciones]
 
 def handle_errors(f):
     """Decorador para manejo centralizado de errores."""
@@ -90,7 +137,7 @@ def handle_errors(f):
         try:
             return f(*args, **kwargs)
         except Exception as e:
-            logger.error(f"Error en {f.__name__}: {str(e)}", exc_info=True)
+            logger.error("Error en %s: %s", f.__name__, e, exc_info=True)
             return jsonify({
                 "status": "ERROR",
                 "mensaje": f"Error interno del servidor: {str(e)}"
@@ -98,430 +145,551 @@ def handle_errors(f):
     return decorated_function
 
 # ==================== BASE DE DATOS ====================
+gestor_sqlite = GestorSQLite(DB_PATH)
+
 def get_db() -> sqlite3.Connection:
-    """Obtiene conexión a SQLite con mejor manejo de errores."""
+    """Obtiene la conexión SQLite reutilizable del hilo actual."""
     try:
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row  # Permite acceso por columna
-        return conn
+        return gestor_sqlite.conexion()
     except sqlite3.Error as e:
-        logger.error(f"Error conectando a SQLite: {e}")
+        logger.error("Error conectando a SQLite: %s", e)
         raise
 
-def init_db():
-    """Inicializa las tablas de SQLite."""
+def init_db() -> int:
+    """Deja el esquema SQLite en la última versión (ver migraciones.py). Retorna la versión."""
+    return migrar(DB_PATH, MIGRACION_LOCK_PATH)
+
+pool_sqlserver = PoolSQLServer(SQL_CONN_STR)
+sincronizador = SincronizadorSQLServer(get_db, pool_sqlserver, lock_path=SYNC_LOCK_PATH)
+reserva_numeros = ReservaNumeros(get_db)
+idempotencia = RegistroIdempotencia(get_db, ttl=IDEMPOTENCIA_TTL)
+archivador = Archivador(get_db, ARCHIVO_DIR, lock_path=ARCHIVO_LOCK_PATH, dias_retencion=ARCHIVO_DIAS_RETENCION)
+resumen_montos = ResumenMontos(get_db, ARCHIVO_DIR, DB_PATH)
+feed_cambios = FeedCambios(get_db, retencion_dias=CAMBIOS_RETENCION_DIAS)
+cupos_espera_cambios = threading.BoundedSemaphore(CAMBIOS_ESPERAS_MAX)
+reconciliador = Reconciliador(get_db, pool_sqlserver, lock_path=RECONCILIACION_LOCK_PATH,
+                              tamano_bucket=RECONCILIACION_BUCKET)
+pagina_index = PaginaEstatica(os.path.join(BASE_DIR, "index.html"), cache_control=INDEX_CACHE_CONTROL)
+
+# ==================== MÉTRICAS ====================
+@app.before_request
+def iniciar_cronometro():
+    g.inicio_request = time.perf_counter()
+    muestrear_request(request.endpoint)
+
+@app.after_request
+def registrar_latencia(response):
+    inicio = g.pop('inicio_request', None)
+    if inicio is not None:
+        LATENCIA_HTTP.observar(time.perf_counter() - inicio,
+                               request.endpoint or 'desconocido', request.method, response.status_code)
+    return response
+
+@app.teardown_request
+def fin_request(error=None):
+    terminar_muestreo()
+
+def contar_no_sincronizadas() -> Dict[Tuple, float]:
+    cola = sincronizador.profundidad_cola()
+    cola.pop('total')
+    return {(estado,): total for estado, total in cola.items()}
+
+def contar_error_log() -> Dict[Tuple, float]:
     db = get_db()
-    cur = db.cursor()
-    
     try:
-        cur.execute("""
-        CREATE TABLE IF NOT EXISTS solicitud (
-          id INTEGER PRIMARY KEY AUTOINCREMENT,
-          fechaingreso TEXT NOT NULL,
-          rutcliente TEXT NOT NULL,
-          cliente TEXT NOT NULL,
-          nrosam TEXT NOT NULL,
-          razonsocial TEXT NOT NULL,
-          ejecutivocomercial TEXT NOT NULL,
-          fonoejecutivo TEXT NOT NULL,
-          contactocliente TEXT NOT NULL,
-          fonocontactocliente TEXT NOT NULL,
-          contactotecnico TEXT NOT NULL,
-          fonocontactotecnico TEXT NOT NULL,
-          jefeproyecto TEXT NOT NULL,
-          fonojefeproyecto TEXT NOT NULL,
-          proyecto TEXT NOT NULL,
-          pepgasto TEXT NOT NULL,
-          proveedor TEXT NOT NULL,
-          actividad TEXT NOT NULL,
-          tipodireccion TEXT NOT NULL,
-          conceptootroscostos TEXT NOT NULL,
-          monedaotros_costos TEXT NOT NULL,
-          montootros_costos REAL DEFAULT 0,
-          monedainstalacion TEXT NOT NULL,
-          costoinstalacion REAL DEFAULT 0,
-          monedarenta TEXT NOT NULL,
-          valorrenta REAL DEFAULT 0,
-          plazomeses INTEGER NOT NULL,
-          fecha_creacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-          estado TEXT DEFAULT 'PENDIENTE'
-        )
-        """)
-        
-        cur.execute("""
-        CREATE TABLE IF NOT EXISTS direccion (
-          id INTEGER PRIMARY KEY AUTOINCREMENT,
-          solicitudid INTEGER NOT NULL,
-          numero INTEGER NOT NULL,
-          direccion TEXT NOT NULL,
-          servicio TEXT NOT NULL,
-          capacidad TEXT NOT NULL,
-          FOREIGN KEY(solicitudid) REFERENCES solicitud(id)
-        )
-        """)
-        
-        cur.execute("""
-        CREATE TABLE IF NOT EXISTS sync_estado (
-          solicitud_id INTEGER PRIMARY KEY,
-          estado_sync TEXT NOT NULL,
-          fecha_sync TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-          FOREIGN KEY(solicitud_id) REFERENCES solicitud(id)
-        )
-        """)
-        
-        cur.execute("""
-        CREATE TABLE IF NOT EXISTS error_log (
-          id INTEGER PRIMARY KEY AUTOINCREMENT,
-          solicitud_id INTEGER,
-          tipo_error TEXT NOT NULL,
-          mensaje_error TEXT NOT NULL,
-          detalle TEXT,
-          fecha_error TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-          FOREIGN KEY(solicitud_id) REFERENCES solicitud(id)
-        )
-        """)
-        
-        # Crear índices para mejorar búsquedas
-        cur.execute("CREATE INDEX IF NOT EXISTS idx_solicitud_rut ON solicitud(rutcliente)")
-        cur.execute("CREATE INDEX IF NOT EXISTS idx_sync_estado ON sync_estado(estado_sync)")
-        cur.execute("CREATE INDEX IF NOT EXISTS idx_direccion_solicitud ON direccion(solicitudid)")
-        
-        db.commit()
-        logger.info("Base de datos inicializada correctamente")
-    except sqlite3.Error as e:
-        logger.error(f"Error inicializando BD: {e}")
-        db.close()
-        raise
+        cur = db.cursor()
+        cur.execute("SELECT tipo_error, COUNT(*) FROM error_log GROUP BY tipo_error")
+        return {(tipo,): total for tipo, total in cur.fetchall()}
     finally:
         db.close()
 
-# Inicializar BD
-init_db()
+REGISTRO.registrar(Gauge('solicitudes_no_sincronizadas', 'Solicitudes aún no sincronizadas a SQL Server',
+                         ('estado',), contar_no_sincronizadas))
+REGISTRO.registrar(Gauge('error_log_registros', 'Registros en error_log por tipo',
+                         ('tipo_error',), contar_error_log))
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    """Métricas en formato de texto de Prometheus."""
+    return Response(REGISTRO.exponer(), mimetype="text/plain; version=0.0.4")
+
+@app.before_request
+def iniciar_sincronizador():
+    """Arranca los workers de sincronización y archivado en el primer request de cada proceso."""
+    if SYNC_EN_APP:
+        sincronizador.iniciar()
+    if ARCHIVO_EN_APP:
+        archivador.iniciar()
 
 # ==================== RUTAS ====================
 @app.route("/")
 def index():
-    """Sirve el archivo HTML principal."""
-    try:
-        return send_from_directory(BASE_DIR, "index.html")
-    except Exception as e:
-        logger.error(f"Error sirviendo index.html: {e}")
+    """Sirve el archivo HTML principal (precomprimido, con ETag)."""
+    respuesta = pagina_index.responder(request)
+    if respuesta is None:
+        logger.error("Error sirviendo index.html: %s", pagina_index.error)
         return jsonify({"status": "ERROR", "mensaje": "Archivo no encontrado"}), 404
+    return respuesta
 
 @app.route("/init", methods=["GET"])
 @handle_errors
 def init_form():
-    """Obtiene número de solicitud y fecha actual."""
-    db = get_db()
-    try:
-        cur = db.cursor()
-        cur.execute("SELECT IFNULL(MAX(id), 0) + 1 FROM solicitud")
-        nro = cur.fetchone()[0]
-        
-        return jsonify({
-            "solicitudNro": nro,
-            "fechaIngreso": datetime.now().strftime("%d-%m-%Y"),
-            "status": "OK"
-        })
-    finally:
-        db.close()
+    """Obtiene un número de solicitud reservado y la fecha actual."""
+    return jsonify({
+        "solicitudNro": reserva_numeros.siguiente(),
+        "fechaIngreso": datetime.now().strftime("%d-%m-%Y"),
+        "status": "OK"
+    })
 
-@app.route('/guardarsolicitud', methods=['POST'])
-@handle_errors
-def guardar():
-    """Guarda solicitud en SQLite y SQL Server."""
-    data = request.json
-    
-    # Validar datos
-    valido, mensaje = validar_datos_solicitud(data)
-    if not valido:
-        logger.warning(f"Validación fallida: {mensaje}")
-        return jsonify({"status": "ERROR", "mensaje": mensaje}), 400
+def guardar_en_sqlite(fila: Tuple, direcciones: List[Tuple],
+                      idempotency_key: Optional[str] = None) -> Tuple[int, bool]:
+    """Inserta solicitud, direcciones y su fila PENDIENTE del outbox en una transacción.
     
-    sqlite_id = None
-    sql_id = None
-    sql_sync_status = "pendiente"
+    Retorna (ID SQLite, nueva). Si la misma clave de idempotencia ya está
+    vigente retorna el ID original con nueva=False sin escribir nada.
+    Ante sqlite3.Error hace rollback y relanza; ``ClaveReutilizada`` si el
+    Idempotency-Key ya se usó con otro contenido y ``NumeroDuplicado`` si
+    otra solicitud, que no es un envío repetido, ya se guardó con el mismo
+    número.
+    """
+    huella = huella_payload(fila, direcciones)
+    clave = idempotencia.clave(idempotency_key, huella)
     
-    # ===== GUARDAR EN SQLITE (BUFFER LOCAL) =====
+    inicio_bd = time.perf_counter()
     db_sqlite = get_db()
     try:
         cur_sqlite = db_sqlite.cursor()
         
-        cur_sqlite.execute("""
-            INSERT INTO solicitud (
-                fechaingreso, rutcliente, cliente, nrosam, razonsocial, 
-                ejecutivocomercial, fonoejecutivo, contactocliente, fonocontactocliente,
-                contactotecnico, fonocontactotecnico, jefeproyecto, fonojefeproyecto,
-                proyecto, pepgasto, proveedor, actividad, tipodireccion,
-                conceptootroscostos, monedaotros_costos, montootros_costos,
-                monedainstalacion, costoinstalacion, monedarenta, valorrenta, plazomeses
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
-            data['fechaIngreso'], normalizar_rut(data['rutCliente']), data['cliente'], 
-            data['nroSAM'], data['razonSocial'], data['ejecutivoComercial'],
-            data['fonoEjecutivo'], data['contactoCliente'], data['fonoContactoCliente'],
-            data['contactoTecnico'], data['fonoContactoTecnico'], data['jefeProyecto'],
-            data['fonoJefeProyecto'], data['proyecto'], data['pepGasto'],
-            data['proveedor'], data['actividad'], data['tipoDireccion'],
-            data['conceptoOtrosCostos'], data['monedaOtrosCostos'],
-            float(data.get('montoOtrosCostos', 0)), data['monedaInstalacion'],
-            float(data.get('costoInstalacion', 0)), data['monedaRenta'],
-            float(data.get('valorRenta', 0)), int(data['plazoMeses'])
-        ))
+        previo = idempotencia.buscar(cur_sqlite, clave, huella)
+        if previo is not None:
+            logger.info("Envío repetido, se retorna la solicitud %s", previo)
+            return previo, False
         
+        cur_sqlite.execute(SQL_INSERT_SOLICITUD, fila)
         sqlite_id = cur_sqlite.lastrowid
         
+        if not idempotencia.registrar(cur_sqlite, clave, huella, sqlite_id):
+            # Un request concurrente con la misma clave confirmó primero
+            db_sqlite.rollback()
+            previo = idempotencia.buscar(cur_sqlite, clave, huella)
+            logger.info("Envío concurrente repetido, se retorna la solicitud %s", previo)
+            return previo, False
+        
         # Guardar direcciones en SQLite
-        direcciones = data.get('direcciones', [])
-        for d in direcciones:
-            cur_sqlite.execute("""
-                INSERT INTO direccion (solicitudid, numero, direccion, servicio, capacidad)
-                VALUES (?, ?, ?, ?, ?)
-            """, (sqlite_id, d['numero'], d['direccion'], d['servicio'], d['capacidad']))
+        cur_sqlite.executemany(SQL_INSERT_DIRECCION, filas_direccion(sqlite_id, direcciones))
+        
+        indexar_solicitudes(cur_sqlite, sqlite_id, sqlite_id)
+        acumular_resumen(cur_sqlite, sqlite_id, sqlite_id)
+        
+        # Encolar para sincronización en la misma transacción
+        cur_sqlite.execute(
+            "INSERT INTO sync_estado (solicitud_id, estado_sync) VALUES (?, 'PENDIENTE')",
+            (sqlite_id,)
+        )
         
         db_sqlite.commit()
-        logger.info(f"Solicitud guardada en SQLite con ID: {sqlite_id}")
+        DURACION_BD.observar(time.perf_counter() - inicio_bd, 'sqlite', 'guardar')
+        logger.info("Solicitud guardada en SQLite con ID: %s", sqlite_id)
     
     except sqlite3.Error as e:
-        logger.error(f"Error guardando en SQLite: {e}")
         db_sqlite.rollback()
-        return jsonify({"status": "ERROR", "mensaje": f"Error en BD local: {str(e)}"}), 500
+        if es_numero_duplicado(e):
+            # Un request concurrente con la misma clave confirmó primero: es un envío repetido
+            previo = idempotencia.buscar(db_sqlite.cursor(), clave, huella)
+            if previo is not None:
+                logger.info("Envío concurrente repetido, se retorna la solicitud %s", previo)
+                return previo, False
+            logger.warning("Número de solicitud %s ya utilizado", nrosolicitud_fila(fila))
+            raise NumeroDuplicado(nrosolicitud_fila(fila)) from e
+        logger.error("Error guardando en SQLite: %s", e)
+        raise
     finally:
         db_sqlite.close()
     
-    # ===== GUARDAR EN SQL SERVER =====
-    try:
-        conn_sql = pyodbc.connect(SQL_CONN_STR)
-        cur_sql = conn_sql.cursor()
-        
-        cur_sql.execute("""
-            INSERT INTO solicitud (
-                fechaingreso, rutcliente, cliente, nrosam, razonsocial,
-                ejecutivocomercial, fonoejecutivo, contactocliente, fonocontactocliente,
-                contactotecnico, fonocontactotecnico, jefeproyecto, fonojefeproyecto,
-                proyecto, pepgasto, proveedor, actividad, tipodireccion,
-                conceptootroscostos, monedaotros_costos, montootros_costos,
-                monedainstalacion, costoinstalacion, monedarenta, valorrenta, plazomeses
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
-            data['fechaIngreso'], normalizar_rut(data['rutCliente']), data['cliente'],
-            data['nroSAM'], data['razonSocial'], data['ejecutivoComercial'],
-            data['fonoEjecutivo'], data['contactoCliente'], data['fonoContactoCliente'],
-            data['contactoTecnico'], data['fonoContactoTecnico'], data['jefeProyecto'],
-            data['fonoJefeProyecto'], data['proyecto'], data['pepGasto'],
-            data['proveedor'], data['actividad'], data['tipoDireccion'],
-            data['conceptoOtrosCostos'], data['monedaOtrosCostos'],
-            float(data.get('montoOtrosCostos', 0)), data['monedaInstalacion'],
-            float(data.get('costoInstalacion', 0)), data['monedaRenta'],
-            float(data.get('valorRenta', 0)), int(data['plazoMeses'])
-        ))
-        
-        cur_sql.execute("SELECT @@IDENTITY")
-        sql_id = int(cur_sql.fetchone()[0])
-        
-        # Guardar direcciones en SQL Server
-        for d in direcciones:
-            cur_sql.execute("""
-                INSERT INTO direccion (solicitudid, numero, direccion, servicio, capacidad)
-                VALUES (?, ?, ?, ?, ?)
-            """, (sql_id, d['numero'], d['direccion'], d['servicio'], d['capacidad']))
-        
-        conn_sql.commit()
-        conn_sql.close()
-        
-        sql_sync_status = f"OK (ID: {sql_id})"
-        logger.info(f"Solicitud sincronizada a SQL Server con ID: {sql_id}")
-        
-        # Marcar como sincronizado
-        db = get_db()
-        try:
-            cur = db.cursor()
-            cur.execute(
-                "INSERT OR REPLACE INTO sync_estado (solicitud_id, estado_sync) VALUES (?, 'SINCRONIZADO')",
-                (sqlite_id,)
-            )
-            db.commit()
-        finally:
-            db.close()
+    # SQL Server se sincroniza en segundo plano desde el outbox
+    sincronizador.notificar()
+    idempotencia.purgar_si_corresponde()
+    return sqlite_id, True
+
+@app.route('/guardarsolicitud', methods=['POST'])
+@handle_errors
+def guardar():
+    """Guarda solicitud en SQLite y la deja en cola para SQL Server.
     
-    except pyodbc.Error as e:
-        sql_sync_status = f"Error: {str(e)}"
-        logger.error(f"Error sincronizando a SQL Server: {e}")
-        
-        # Registrar error en tabla de logs
-        db = get_db()
-        try:
-            cur = db.cursor()
-            cur.execute(
-                "INSERT INTO error_log (solicitud_id, tipo_error, mensaje_error) VALUES (?, ?, ?)",
-                (sqlite_id, "SQL_SERVER_SYNC", str(e))
-            )
-            db.commit()
-        finally:
-            db.close()
+    Un envío repetido (mismo header Idempotency-Key, o mismo contenido si no
+    viene) dentro de IDEMPOTENCIA_TTL responde 200 con el sqlite_id original.
+    Un solicitudNro ya guardado con otro contenido responde 409.
+    """
+    data = request.get_json(silent=True)
     
-    except Exception as e:
-        sql_sync_status = f"Error inesperado: {str(e)}"
-        logger.error(f"Error inesperado sincronizando: {e}")
+    # Validar y convertir en una sola pasada
+    fila, direcciones, errores = convertir_solicitud(data)
+    if errores:
+        mensaje = "; ".join(errores)
+        logger.warning("Validación fallida: %s", mensaje)
+        return jsonify({"status": "ERROR", "mensaje": mensaje, "errores": errores}), 400
+    
+    # ===== GUARDAR EN SQLITE (OUTBOX) =====
+    try:
+        sqlite_id, nueva = guardar_en_sqlite(fila, direcciones, request.headers.get('Idempotency-Key'))
+    except ClaveReutilizada:
+        return jsonify(RESPUESTA_CLAVE_REUTILIZADA), 422
+    except NumeroDuplicado as e:
+        return jsonify({"status": "ERROR", "mensaje": str(e)}), 409
+    except sqlite3.Error as e:
+        return jsonify({"status": "ERROR", "mensaje": f"Error en BD local: {str(e)}"}), 500
+    
+    if not nueva:
+        return jsonify(respuesta_repetida(sqlite_id, fila)), 200, {'Idempotent-Replayed': 'true'}
     
     return jsonify({
         "status": "OK",
         "sqlite_id": sqlite_id,
-        "sql_server_sync": sql_sync_status
+        "solicitudNro": nrosolicitud_fila(fila),
+        "sql_server_sync": "PENDIENTE"
     }), 201
 
-@app.route("/buscar_cliente")
+RESPUESTA_CLAVE_REUTILIZADA = {
+    "status": "ERROR",
+    "mensaje": "Idempotency-Key ya utilizado con una solicitud distinta"
+}
+
+def respuesta_repetida(sqlite_id: int, fila: Tuple) -> Dict:
+    # Un envío repetido tiene el mismo contenido, y por lo tanto el mismo número
+    return {"status": "OK", "sqlite_id": sqlite_id, "solicitudNro": nrosolicitud_fila(fila), "repetida": True}
+
+def leer_lote() -> List:
+    """Lee el cuerpo de /api/guardar_lote como arreglo JSON o como NDJSON.
+
+    En NDJSON una línea que no es JSON válido se devuelve como la excepción
+    de parseo, para reportarla en su posición del resultado.
+    """
+    if request.mimetype in ('application/x-ndjson', 'application/jsonl'):
+        items = []
+        for linea in request.stream:
+            linea = linea.strip()
+            if not linea:
+                continue
+            try:
+                items.append(json.loads(linea))
+            except ValueError as e:
+                items.append(e)
+        return items
+    
+    data = request.get_json(silent=True)
+    if not isinstance(data, list):
+        raise ValueError("Se esperaba un arreglo JSON o NDJSON de solicitudes")
+    return data
+
+def descartar_numeros_usados(cur: sqlite3.Cursor, validas: List[Tuple[int, Tuple, List[Tuple]]],
+                             resultados: List[Dict]) -> List[Tuple[int, Tuple, List[Tuple]]]:
+    """Quita del lote las solicitudes cuyo número ya está guardado o repetido en el lote.
+
+    Las quitadas quedan informadas como error en ``resultados``.
+    """
+    numeros = [nrosolicitud_fila(fila) for _, fila, _ in validas if nrosolicitud_fila(fila) is not None]
+    if not numeros:
+        return validas
+    cur.execute("SELECT nrosolicitud FROM solicitud WHERE nrosolicitud IN (SELECT value FROM json_each(?))",
+                (json.dumps(numeros),))
+    usados = {r[0] for r in cur.fetchall()}
+    restantes = []
+    for item in validas:
+        indice, fila, _ = item
+        numero = nrosolicitud_fila(fila)
+        if numero is not None and numero in usados:
+            resultados[indice] = {"indice": indice, "status": "ERROR", "mensaje": str(NumeroDuplicado(numero))}
+            continue
+        if numero is not None:
+            usados.add(numero)
+        restantes.append(item)
+    return restantes
+
+@app.route('/api/guardar_lote', methods=['POST'])
 @handle_errors
-def buscar_cliente():
-    """Busca nombre de cliente por RUT en archivo compartido de Google Drive."""
-    rut = normalizar_rut(request.args.get("rut", ""))
+def guardar_lote():
+    """Guarda muchas solicitudes en una sola transacción SQLite.
     
-    if not rut or not validar_rut(rut):
-        logger.warning(f"RUT inválido o vacío: {rut}")
-        return jsonify({"cliente": "", "validacion": False, "error": "RUT inválido"}), 400
+    Las solicitudes inválidas se informan en su posición y no impiden
+    guardar las demás.
+    """
+    try:
+        items = leer_lote()
+    except ValueError as e:
+        return jsonify({"status": "ERROR", "mensaje": str(e)}), 400
     
-    url = "https://drive.google.com/uc?export=download&id=10EUZK61nkiZ90IbNOYLjAtnWKz-9IKPx"
+    if len(items) > LOTE_MAX:
+        return jsonify({"status": "ERROR", "mensaje": f"Máximo {LOTE_MAX} solicitudes por lote"}), 413
     
-    try:
-        logger.info(f"🔍 Buscando RUT: {rut}")
-        
-        headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'}
-        resp = requests.get(url, stream=True, timeout=15, headers=headers, allow_redirects=True)
-        resp.raise_for_status()
-        
-        logger.info(f"✅ Archivo descargado. Status: {resp.status_code}")
+    resultados: List[Dict] = [None] * len(items)
+    validas: List[Tuple[int, Tuple, List[Tuple]]] = []
+    
+    for indice, data in enumerate(items):
+        if isinstance(data, ValueError):
+            resultados[indice] = {"indice": indice, "status": "ERROR", "mensaje": f"JSON inválido: {data}"}
+            continue
+        if not isinstance(data, dict):
+            resultados[indice] = {"indice": indice, "status": "ERROR", "mensaje": "Se esperaba un objeto"}
+            continue
         
-        cliente_encontrado = None
-        ruts_encontrados = []  # Para debug
-        lineas_procesadas = 0
-        lineas_con_datos = 0
+        fila, direcciones, errores = convertir_solicitud(data)
+        if errores:
+            resultados[indice] = {"indice": indice, "status": "ERROR", "mensaje": "; ".join(errores)}
+            continue
         
-        for linea_raw in resp.iter_lines(decode_unicode=True):
-            lineas_procesadas += 1
-            
-            if isinstance(linea_raw, bytes):
-                linea = linea_raw.decode('utf-8', errors='ignore')
-            else:
-                linea = linea_raw
-            
-            linea = linea.strip()
-            
-            # Saltar línea vacía o cabecera
-            if not linea or linea.lower().startswith('rut'):
-                continue
-            
-            # Detectar separador (puede ser ; , o |)
-            separadores = [';', ',', '|', '\t']
-            separador_usado = None
-            
-            for sep in separadores:
-                if sep in linea:
-                    separador_usado = sep
-                    break
-            
-            if not separador_usado:
-                logger.debug(f"Línea {lineas_procesadas} sin separador: {linea[:50]}")
-                continue
+        validas.append((indice, fila, direcciones))
+    
+    if validas:
+        inicio_bd = time.perf_counter()
+        db = get_db()
+        try:
+            cur = db.cursor()
+            # Lock de escritura desde el inicio: los IDs AUTOINCREMENT quedan contiguos
+            cur.execute("BEGIN IMMEDIATE")
+            validas = descartar_numeros_usados(cur, validas, resultados)
+            ids = range(0)
+            if validas:
+                cur.execute("""
+                    SELECT MAX(IFNULL((SELECT seq FROM sqlite_sequence WHERE name = 'solicitud'), 0),
+                               IFNULL((SELECT MAX(id) FROM solicitud), 0))
+                """)
+                primer_id = cur.fetchone()[0] + 1
             
-            try:
-                partes = linea.split(separador_usado)
-                if len(partes) < 2:
-                    continue
-                
-                rut_txt = partes[0].strip()
-                cliente = partes[1].strip()
-                
-                if not rut_txt or not cliente:
-                    continue
-                
-                rut_normalizado = normalizar_rut(rut_txt)
-                lineas_con_datos += 1
-                
-                # Guardar primeros 5 RUT para debug
-                if len(ruts_encontrados) < 5:
-                    ruts_encontrados.append(f"{rut_txt} → {rut_normalizado}")
-                
-                # Buscar coincidencia
-                if rut_normalizado == rut:
-                    cliente_encontrado = cliente
-                    logger.info(f"✅ ENCONTRADO: RUT {rut} = {cliente}")
-                    break
+                cur.executemany(SQL_INSERT_SOLICITUD, [fila for _, fila, _ in validas])
+                ultimo_id = primer_id + len(validas) - 1
+                if cur.execute("SELECT MAX(id) FROM solicitud").fetchone()[0] != ultimo_id:
+                    raise sqlite3.IntegrityError("IDs asignados no contiguos en inserción por lote")
             
-            except Exception as e:
-                logger.debug(f"Error en línea {lineas_procesadas}: {e}")
-                continue
+                ids = range(primer_id, ultimo_id + 1)
+                cur.executemany(SQL_INSERT_DIRECCION, (
+                    fila_dir
+                    for sqlite_id, (_, _, direcciones) in zip(ids, validas)
+                    for fila_dir in filas_direccion(sqlite_id, direcciones)
+                ))
+                indexar_solicitudes(cur, primer_id, ultimo_id)
+                acumular_resumen(cur, primer_id, ultimo_id)
+                cur.executemany(
+                    "INSERT INTO sync_estado (solicitud_id, estado_sync) VALUES (?, 'PENDIENTE')",
+                    ((sqlite_id,) for sqlite_id in ids)
+                )
+            db.commit()
+            DURACION_BD.observar(time.perf_counter() - inicio_bd, 'sqlite', 'guardar_lote')
+        except sqlite3.Error as e:
+            logger.error("Error guardando lote en SQLite: %s", e)
+            db.rollback()
+            return jsonify({"status": "ERROR", "mensaje": f"Error en BD local: {str(e)}"}), 500
+        finally:
+            db.close()
         
-        # Log detallado
-        logger.info(f"📊 RESUMEN: Lineas={lineas_procesadas}, Con datos={lineas_con_datos}")
-        if ruts_encontrados:
-            logger.info(f"📋 Primeros RUT encontrados: {ruts_encontrados}")
+        for sqlite_id, (indice, fila, _) in zip(ids, validas):
+            resultados[indice] = {"indice": indice, "status": "OK", "sqlite_id": sqlite_id,
+                                  "solicitudNro": nrosolicitud_fila(fila)}
         
-        if cliente_encontrado:
-            return jsonify({
-                "cliente": cliente_encontrado,
-                "validacion": True,
-                "encontrado": True
-            }), 200
-        else:
-            logger.warning(f"❌ RUT {rut} no encontrado después de procesar {lineas_con_datos} registros")
-            return jsonify({
-                "cliente": "",
-                "validacion": False,
-                "encontrado": False,
-                "mensaje": f"RUT {rut} no encontrado"
-            }), 404
+        sincronizador.notificar()
     
-    except Exception as e:
-        logger.error(f"❌ ERROR en buscar_cliente: {type(e).__name__}: {str(e)}", exc_info=True)
-        return jsonify({
+    errores = len(items) - len(validas)
+    logger.info("Lote guardado: %d solicitudes OK, %d con error", len(validas), errores)
+    return jsonify({
+        "status": "OK" if not errores else "PARCIAL",
+        "guardadas": len(validas),
+        "errores": errores,
+        "resultados": resultados
+    }), 201 if validas else 400
+
+RESPUESTA_RUT_INVALIDO = {"cliente": "", "validacion": False, "error": "RUT inválido"}
+
+def resultado_busqueda_cliente(rut: str, cliente_encontrado: Optional[str]) -> Tuple[Dict, int]:
+    """Cuerpo y status de /buscar_cliente (compartido con el modo ASGI)."""
+    BUSQUEDAS_CLIENTE.inc('encontrado' if cliente_encontrado else 'no_encontrado')
+    logger.debug("buscar_cliente rut=%s resultado=%r", rut, cliente_encontrado)
+    if cliente_encontrado:
+        return {
+            "cliente": cliente_encontrado,
+            "validacion": True,
+            "encontrado": True
+        }, 200
+    else:
+        logger.info("RUT %s no encontrado en directorio de clientes", rut)
+        return {
             "cliente": "",
             "validacion": False,
-            "error": str(e)
-        }), 500
+            "encontrado": False,
+            "mensaje": f"RUT {rut} no encontrado"
+        }, 404
 
+def error_busqueda_cliente(e: Exception) -> Tuple[Dict, int]:
+    BUSQUEDAS_CLIENTE.inc('error')
+    logger.error("❌ ERROR en buscar_cliente: %s: %s", type(e).__name__, e)
+    return {
+        "cliente": "",
+        "validacion": False,
+        "error": str(e)
+    }, 500
 
-@app.route("/api/obtener_pendientes", methods=["GET"])
+@app.route("/buscar_cliente")
 @handle_errors
-def obtener_pendientes():
-    """Obtiene todas las solicitudes pendientes de sincronización."""
+def buscar_cliente():
+    """Busca nombre de cliente por RUT en el índice en memoria del archivo de Google Drive."""
+    rut = normalizar_rut(request.args.get("rut", ""))
+    
+    if not rut or not validar_rut(rut):
+        logger.warning("RUT inválido o vacío: %s", rut)
+        return jsonify(RESPUESTA_RUT_INVALIDO), 400
+    
+    try:
+        cuerpo, status = resultado_busqueda_cliente(rut, directorio_clientes.buscar(rut))
+    except Exception as e:
+        cuerpo, status = error_busqueda_cliente(e)
+    return jsonify(cuerpo), status
+
+@app.route("/api/autocompletar_cliente")
+@handle_errors
+def autocompletar_cliente():
+    """Sugiere clientes por nombre mientras se escribe.
+
+    Parámetros:
+      q     - texto ingresado (sin distinguir acentos ni mayúsculas; tolera errores de tipeo)
+      limit - sugerencias a retornar (máximo AUTOCOMPLETAR_LIMITE_MAX)
+    """
+    consulta = request.args.get("q", "").strip()
+    if not consulta:
+        return jsonify({"status": "ERROR", "mensaje": "Parámetro q requerido"}), 400
+    try:
+        limite = int(request.args.get("limit", AUTOCOMPLETAR_LIMITE))
+    except ValueError:
+        return jsonify({"status": "ERROR", "mensaje": "limit debe ser entero"}), 400
+    if limite < 1:
+        return jsonify({"status": "ERROR", "mensaje": "limit debe ser >= 1"}), 400
+    limite = min(limite, AUTOCOMPLETAR_LIMITE_MAX)
+
+    try:
+        sugerencias = directorio_clientes.autocompletar(consulta, limite)
+    except Exception as e:
+        logger.error("❌ ERROR en autocompletar_cliente: %s: %s", type(e).__name__, e)
+        return jsonify({"status": "ERROR", "mensaje": str(e)}), 500
+    return jsonify({"status": "OK", "sugerencias": sugerencias})
+
+
+SQL_PENDIENTES_PAGINA = """
+    SELECT s.*, se.estado_sync, se.fecha_sync
+    FROM sync_estado se
+    JOIN solicitud s ON s.id = se.solicitud_id
+    WHERE se.estado_sync != 'SINCRONIZADO' AND se.solicitud_id > ?
+    ORDER BY se.solicitud_id
+    LIMIT ?
+"""
+
+def iterar_pendientes(after_id: int = 0, limite: Optional[int] = None):
+    """Genera las solicitudes pendientes (con direcciones) en orden de ID.
+    
+    Recorre la tabla por páginas de PENDIENTES_PAGINA usando keyset sobre el
+    índice parcial idx_sync_pendiente, con una sola consulta de direcciones
+    por página; la memoria usada no depende del tamaño del backlog.
+    """
     db = get_db()
     try:
         cur = db.cursor()
-        
-        # Solicitudes pendientes o sin sincronizar
-        cur.execute("""
-            SELECT s.*, 
-                   COALESCE(se.estado_sync, 'PENDIENTE') as estado_sync,
-                   se.fecha_sync
-            FROM solicitud s
-            LEFT JOIN sync_estado se ON s.id = se.solicitud_id
-            WHERE se.estado_sync IS NULL OR se.estado_sync != 'SINCRONIZADO'
-            ORDER BY s.fecha_creacion DESC
-        """)
-        
-        solicitudes = []
-        for row in cur.fetchall():
-            sol = dict(row)
+        entregadas = 0
+        while limite is None or entregadas < limite:
+            pagina = PENDIENTES_PAGINA if limite is None else min(PENDIENTES_PAGINA, limite - entregadas)
+            cur.execute(SQL_PENDIENTES_PAGINA, (after_id, pagina))
+            filas = [dict(r) for r in cur.fetchall()]
+            if not filas:
+                return
             
-            # Obtener direcciones
-            cur.execute("SELECT * FROM direccion WHERE solicitudid = ? ORDER BY numero", (sol['id'],))
-            sol['direcciones'] = [dict(r) for r in cur.fetchall()]
+            direcciones = direcciones_por_solicitud(cur, [f['id'] for f in filas])
+            for sol in filas:
+                sol['direcciones'] = direcciones.get(sol['id'], [])
+                yield sol
             
-            solicitudes.append(sol)
-        
-        logger.info(f"Se retornaron {len(solicitudes)} solicitudes pendientes")
-        return jsonify(solicitudes), 200
-    
+            entregadas += len(filas)
+            after_id = filas[-1]['id']
+            if len(filas) < pagina:
+                return
     finally:
         db.close()
 
+@app.route("/api/obtener_pendientes", methods=["GET"])
+@handle_errors
+def obtener_pendientes():
+    """Obtiene las solicitudes pendientes de sincronización.
+    
+    Parámetros opcionales:
+      after_id  - keyset: retorna solicitudes con ID mayor (orden ascendente)
+      limit     - tamaño de página, >= 1 (se recorta a PENDIENTES_LIMITE_MAX)
+      formato   - "ndjson" transmite una solicitud por línea sin armar la lista
+    
+    Sin parámetros se mantiene la respuesta original: arreglo completo,
+    más recientes primero.
+    
+    Es para el cliente externo que sincroniza por su cuenta; no debe correr
+    junto con el sincronizador (ALTA_SYNC_EN_APP o sincronizacion.py).
+    """
+    try:
+        after_id = int(request.args.get("after_id", 0))
+        limite = int(request.args["limit"]) if "limit" in request.args else None
+    except ValueError:
+        return jsonify({"status": "ERROR", "mensaje": "after_id y limit deben ser enteros"}), 400
+    if after_id < 0 or (limite is not None and limite < 1):
+        return jsonify({"status": "ERROR", "mensaje": "after_id debe ser >= 0 y limit >= 1"}), 400
+    if limite is not None:
+        limite = min(limite, PENDIENTES_LIMITE_MAX)
+    
+    if request.args.get("formato") == "ndjson":
+        def generar():
+            for sol in iterar_pendientes(after_id, limite):
+                yield json.dumps(sol, ensure_ascii=False, default=str) + "\n"
+        return Response(generar(), mimetype="application/x-ndjson")
+    
+    if limite is None and "after_id" not in request.args:
+        solicitudes = list(iterar_pendientes())
+        solicitudes.sort(key=lambda s: (s['fecha_creacion'] or '', s['id']), reverse=True)
+        logger.info("Se retornaron %d solicitudes pendientes", len(solicitudes))
+        return jsonify(solicitudes), 200
+    
+    limite = limite or PENDIENTES_PAGINA
+    solicitudes = list(iterar_pendientes(after_id, limite))
+    return jsonify({
+        "status": "OK",
+        "solicitudes": solicitudes,
+        "siguiente_after_id": solicitudes[-1]['id'] if len(solicitudes) == limite else None
+    }), 200
+
+# Completa un INSERT INTO sync_estado ... 'SINCRONIZADO': si la fila existe la
+# actualiza (el feed de cambios solo registra cambios reales de estado, ver cambios.py)
+SQL_UPSERT_SINCRONIZADO = """
+    ON CONFLICT(solicitud_id) DO UPDATE SET
+      estado_sync = 'SINCRONIZADO', fecha_sync = CURRENT_TIMESTAMP, intentos = 0, proximo_intento = NULL
+"""
+
 @app.route("/api/marcar_sincronizado", methods=["POST"])
 @handle_errors
 def marcar_sincronizado():
-    """Marca una solicitud como sincronizada."""
-    data = request.json
+    """Marca una o varias solicitudes como sincronizadas.
+    
+    Acepta uno de:
+      {"solicitud_id": 5}                 - una solicitud (404 si no existe)
+      {"solicitud_ids": [5, 6, 9]}        - lista; informa los IDs desconocidos
+      {"desde_id": 5, "hasta_id": 900}    - rango inclusivo de IDs existentes
+    
+    Todas las marcas se escriben en una sola transacción.
+    """
+    data = request.get_json(silent=True) or {}
     
-    if not data or 'solicitud_id' not in data:
+    if 'solicitud_ids' in data:
+        ids = data['solicitud_ids']
+        if not isinstance(ids, list) or not all(isinstance(i, int) and not isinstance(i, bool) for i in ids):
+            return jsonify({"status": "ERROR", "mensaje": "solicitud_ids debe ser una lista de enteros"}), 400
+        return marcar_sincronizado_lista(sorted(set(ids)))
+    
+    if 'desde_id' in data or 'hasta_id' in data:
+        try:
+            desde_id, hasta_id = int(data['desde_id']), int(data['hasta_id'])
+        except (KeyError, TypeError, ValueError):
+            return jsonify({"status": "ERROR", "mensaje": "desde_id y hasta_id deben ser enteros"}), 400
+        return marcar_sincronizado_rango(desde_id, hasta_id)
+    
+    if 'solicitud_id' not in data:
         return jsonify({"status": "ERROR", "mensaje": "Parámetro solicitud_id requerido"}), 400
     
     solicitud_id = data['solicitud_id']
@@ -537,32 +705,107 @@ def marcar_sincronizado():
         
         # Marcar como sincronizado
         cur.execute(
-            "INSERT OR REPLACE INTO sync_estado (solicitud_id, estado_sync) VALUES (?, 'SINCRONIZADO')",
+            "INSERT INTO sync_estado (solicitud_id, estado_sync) VALUES (?, 'SINCRONIZADO') " + SQL_UPSERT_SINCRONIZADO,
             (solicitud_id,)
         )
         db.commit()
         
-        logger.info(f"Solicitud {solicitud_id} marcada como SINCRONIZADO")
+        logger.info("Solicitud %s marcada como SINCRONIZADO", solicitud_id)
         return jsonify({"status": "OK", "solicitud_id": solicitud_id}), 200
     
     finally:
         db.close()
 
+def marcar_sincronizado_lista(ids: List[int]):
+    """Marca una lista de IDs con una consulta de existencia y un upsert."""
+    if not ids:
+        return jsonify({"status": "ERROR", "mensaje": "solicitud_ids está vacío"}), 400
+    if len(ids) > LOTE_MAX:
+        return jsonify({"status": "ERROR", "mensaje": f"Máximo {LOTE_MAX} IDs por llamada"}), 413
+    
+    # Los IDs viajan como un solo parámetro JSON para no depender del límite de variables
+    ids_json = json.dumps(ids)
+    
+    db = get_db()
+    try:
+        cur = db.cursor()
+        cur.execute("""
+            SELECT j.value FROM json_each(?) j
+            WHERE NOT EXISTS (SELECT 1 FROM solicitud s WHERE s.id = j.value)
+        """, (ids_json,))
+        desconocidos = [r[0] for r in cur.fetchall()]
+        
+        cur.execute("""
+            INSERT INTO sync_estado (solicitud_id, estado_sync)
+            SELECT s.id, 'SINCRONIZADO' FROM solicitud s
+            WHERE s.id IN (SELECT value FROM json_each(?))
+        """ + SQL_UPSERT_SINCRONIZADO, (ids_json,))
+        marcadas = cur.rowcount
+        db.commit()
+    finally:
+        db.close()
+    
+    logger.info("%d solicitudes marcadas como SINCRONIZADO (%d desconocidas)", marcadas, len(desconocidos))
+    return jsonify({
+        "status": "OK" if not desconocidos else "PARCIAL",
+        "marcadas": marcadas,
+        "desconocidos": desconocidos
+    }), 200
+
+def marcar_sincronizado_rango(desde_id: int, hasta_id: int):
+    """Marca todas las solicitudes existentes en el rango [desde_id, hasta_id]."""
+    if desde_id > hasta_id:
+        return jsonify({"status": "ERROR", "mensaje": "desde_id no puede ser mayor que hasta_id"}), 400
+    
+    db = get_db()
+    try:
+        cur = db.cursor()
+        cur.execute("""
+            INSERT INTO sync_estado (solicitud_id, estado_sync)
+            SELECT id, 'SINCRONIZADO' FROM solicitud WHERE id BETWEEN ? AND ?
+        """ + SQL_UPSERT_SINCRONIZADO, (desde_id, hasta_id))
+        marcadas = cur.rowcount
+        db.commit()
+    finally:
+        db.close()
+    
+    logger.info("%d solicitudes marcadas como SINCRONIZADO (rango %d-%d)", marcadas, desde_id, hasta_id)
+    return jsonify({
+        "status": "OK",
+        "marcadas": marcadas,
+        "desde_id": desde_id,
+        "hasta_id": hasta_id
+    }), 200
+
 @app.route("/api/obtener_solicitud/<int:solicitud_id>", methods=["GET"])
 @handle_errors
 def obtener_solicitud(solicitud_id):
-    """Obtiene detalle de una solicitud específica."""
+    """Obtiene detalle de una solicitud específica.
+    
+    Responde 304 sin leer ni serializar el registro si el ``If-None-Match``
+    coincide con la versión actual (ver ``etag_solicitud``). Si el ID ya no
+    está en la BD viva se busca en el archivo frío.
+    """
     db = get_db()
     try:
         cur = db.cursor()
         
-        cur.execute("SELECT * FROM solicitud WHERE id = ?", (solicitud_id,))
-        row = cur.fetchone()
+        cur.execute("""
+            SELECT se.estado_sync, se.fecha_sync FROM solicitud s
+            LEFT JOIN sync_estado se ON se.solicitud_id = s.id
+            WHERE s.id = ?
+        """, (solicitud_id,))
+        version = cur.fetchone()
         
-        if not row:
-            return jsonify({"status": "ERROR", "mensaje": "Solicitud no encontrada"}), 404
+        if not version:
+            return obtener_solicitud_archivada(solicitud_id)
         
-        solicitud = dict(row)
+        etag = etag_solicitud(solicitud_id, *version)
+        if request.if_none_match.contains(etag):
+            return respuesta_no_modificada(etag)
+        
+        cur.execute("SELECT * FROM solicitud WHERE id = ?", (solicitud_id,))
+        solicitud = dict(cur.fetchone())
         
         cur.execute("SELECT * FROM direccion WHERE solicitudid = ? ORDER BY numero", (solicitud_id,))
         solicitud['direcciones'] = [dict(r) for r in cur.fetchall()]
@@ -573,23 +816,291 @@ def obtener_solicitud(solicitud_id):
         if sync_row:
             solicitud['sync_estado'] = dict(sync_row)
         
-        return jsonify(solicitud), 200
+        return respuesta_con_etag(solicitud, etag)
     
     finally:
         db.close()
 
+def obtener_solicitud_archivada(solicitud_id: int):
+    """obtener_solicitud para un ID que ya se movió al archivo frío."""
+    solicitud = archivador.leer_solicitud(solicitud_id)
+    if solicitud is None:
+        return jsonify({"status": "ERROR", "mensaje": "Solicitud no encontrada"}), 404
+    
+    sync = solicitud.get('sync_estado') or {}
+    etag = etag_solicitud(solicitud_id, sync.get('estado_sync'), sync.get('fecha_sync'))
+    if request.if_none_match.contains(etag):
+        return respuesta_no_modificada(etag)
+    return respuesta_con_etag(solicitud, etag)
+
+def respuesta_no_modificada(etag: str) -> Response:
+    respuesta = Response(status=304)
+    respuesta.set_etag(etag)
+    respuesta.headers['Cache-Control'] = 'no-cache'
+    return respuesta
+
+def respuesta_con_etag(cuerpo: Dict, etag: str):
+    respuesta = jsonify(cuerpo)
+    respuesta.set_etag(etag)
+    respuesta.headers['Cache-Control'] = 'no-cache'
+    return respuesta, 200
+
+def etag_solicitud(solicitud_id: int, estado_sync: Optional[str], fecha_sync: Optional[str]) -> str:
+    """Versión del detalle de una solicitud.
+    
+    Solicitud y direcciones no se modifican tras insertarse; lo único que
+    cambia es su fila de sync_estado, reescrita completa (con fecha_sync)
+    en cada transición.
+    """
+    clave = f"{solicitud_id}|{estado_sync}|{fecha_sync}".encode('utf-8')
+    return hashlib.sha1(clave).hexdigest()[:16]
+
+@app.route("/api/buscar_solicitudes", methods=["GET"])
+@handle_errors
+def buscar_solicitudes_api():
+    """Búsqueda de solicitudes por texto y filtros, más recientes primero.
+    
+    Parámetros (todos opcionales y combinables):
+      q           - texto libre sobre cliente, razón social, proyecto, PEP,
+                    contactos, proveedor y direcciones (prefijos, sin tildes)
+      rut         - RUT del cliente (cualquier formato)
+      estado      - estado de la solicitud
+      estado_sync - PENDIENTE | ERROR | SINCRONIZADO
+      ejecutivo   - ejecutivo comercial (exacto)
+      desde/hasta - rango de fecha de creación AAAA-MM-DD (inclusivo)
+      before_id   - keyset: solicitudes con ID menor (siguiente página)
+      limit       - tamaño de página (máximo BUSQUEDA_LIMITE_MAX)
+    """
+    args = request.args
+    try:
+        before_id = int(args["before_id"]) if "before_id" in args else None
+        limite = int(args.get("limit", BUSQUEDA_PAGINA))
+    except ValueError:
+        return jsonify({"status": "ERROR", "mensaje": "before_id y limit deben ser enteros"}), 400
+    if limite < 1:
+        return jsonify({"status": "ERROR", "mensaje": "limit debe ser >= 1"}), 400
+    limite = min(limite, BUSQUEDA_LIMITE_MAX)
+    
+    try:
+        rut = normalizar_rut(args["rut"]) if args.get("rut") else None
+        if rut is not None and not validar_rut(rut):
+            return jsonify({"status": "ERROR", "mensaje": "RUT inválido"}), 400
+        
+        db = get_db()
+        try:
+            cur = db.cursor()
+            inicio_bd = time.perf_counter()
+            solicitudes = buscar_solicitudes(
+                cur, q=args.get("q"), rut=rut, estado=args.get("estado"),
+                estado_sync=args.get("estado_sync"), ejecutivo=args.get("ejecutivo"),
+                desde=args.get("desde"), hasta=args.get("hasta"),
+                before_id=before_id, limite=limite)
+            direcciones = direcciones_por_solicitud(cur, [s['id'] for s in solicitudes])
+            DURACION_BD.observar(time.perf_counter() - inicio_bd, 'sqlite', 'buscar_solicitudes')
+        finally:
+            db.close()
+    except ValueError as e:
+        return jsonify({"status": "ERROR", "mensaje": str(e)}), 400
+    
+    for sol in solicitudes:
+        sol['direcciones'] = direcciones.get(sol['id'], [])
+    
+    return jsonify({
+        "status": "OK",
+        "solicitudes": solicitudes,
+        "siguiente_before_id": solicitudes[-1]['id'] if len(solicitudes) == limite else None
+    }), 200
+
+@app.route("/api/exportar", methods=["GET"])
+@handle_errors
+def exportar_solicitudes():
+    """Exporta solicitudes con sus direcciones en streaming.
+    
+    Parámetros:
+      formato      - csv (por defecto), ndjson o parquet
+      desde/hasta  - fechas de creación AAAA-MM-DD, inclusivas
+      estado, estado_sync - filtros exactos
+    
+    La respuesta empieza con la primera página leída; la memoria no crece
+    con el tamaño de la exportación.
+    """
+    formato = request.args.get("formato", "csv")
+    try:
+        trozos = exportar(get_db, formato, desde=request.args.get("desde"), hasta=request.args.get("hasta"),
+                          estado=request.args.get("estado"), estado_sync=request.args.get("estado_sync"),
+                          pagina=EXPORTACION_PAGINA)
+    except ValueError as e:
+        return jsonify({"status": "ERROR", "mensaje": str(e)}), 400
+    
+    nombre = f"solicitudes_{datetime.now():%Y%m%d_%H%M%S}.{formato}"
+    logger.info("Exportación %s iniciada (%s)", formato, dict(request.args))
+    return Response(trozos, mimetype=TIPOS_CONTENIDO[formato],
+                    headers={"Content-Disposition": f'attachment; filename="{nombre}"'})
+
+def parametros_cambios(args, last_event_id: Optional[str] = None) -> Tuple[int, int, float, Optional[str]]:
+    """(cursor, limite, espera, estado_sync) de una consulta al feed; ValueError si son inválidos."""
+    try:
+        cursor = int(last_event_id or args.get("cursor", 0))
+        limite = int(args.get("limit", CAMBIOS_PAGINA))
+        espera = float(args.get("espera", CAMBIOS_ESPERA_MAX))
+    except (TypeError, ValueError):
+        raise ValueError("cursor, limit o espera inválidos")
+    if cursor < 0:
+        raise ValueError("cursor inválido")
+    return (cursor, max(1, min(limite, CAMBIOS_LIMITE_MAX)), max(0.0, min(espera, CAMBIOS_ESPERA_MAX)),
+            args.get("estado_sync") or None)
+
+@app.route("/api/cambios", methods=["GET"])
+@handle_errors
+def obtener_cambios():
+    """Long-poll del feed de cambios.
+    
+    Parámetros:
+      cursor       - último seq recibido (0 = desde lo más antiguo conservado)
+      limit        - cambios revisados por respuesta (máximo CAMBIOS_LIMITE_MAX)
+      espera       - segundos a esperar si no hay nada nuevo (máximo CAMBIOS_ESPERA_MAX)
+      estado_sync  - solo solicitudes cuyo estado actual sea este
+    
+    Retorna las solicitudes cambiadas (estado actual, con direcciones) y el
+    cursor para la próxima llamada. ``reinicio`` indica que se purgaron
+    cambios posteriores al cursor y hay que resincronizar completo.
+    """
+    try:
+        cursor, limite, espera, estado_sync = parametros_cambios(request.args)
+    except ValueError as e:
+        return jsonify({"status": "ERROR", "mensaje": str(e)}), 400
+    
+    fin = time.monotonic() + espera
+    resultado = feed_cambios.leer(cursor, limite, estado_sync)
+    if resultado["cambios"] or resultado["reinicio"] or espera <= 0:
+        return jsonify({"status": "OK", **resultado}), 200
+    
+    # Solo la espera ocupa un cupo
+    if not cupos_espera_cambios.acquire(blocking=False):
+        return respuesta_esperas_agotadas()
+    try:
+        while not resultado["cambios"] and not resultado["reinicio"]:
+            restante = fin - time.monotonic()
+            if restante <= 0 or not feed_cambios.esperar(resultado["cursor"], restante):
+                break
+            resultado = feed_cambios.leer(resultado["cursor"], limite, estado_sync)
+    finally:
+        cupos_espera_cambios.release()
+    
+    return jsonify({"status": "OK", **resultado}), 200
+
+def respuesta_esperas_agotadas():
+    logger.warning("Cupos de espera del feed de cambios agotados (%d)", CAMBIOS_ESPERAS_MAX)
+    return (jsonify({"status": "ERROR", "mensaje": "Demasiadas esperas de cambios abiertas, reintente"}),
+            503, {"Retry-After": "5"})
+
+def texto_eventos(cursor: int, resultado: Dict) -> str:
+    """Eventos SSE de una lectura del feed hecha desde ``cursor`` (compartido con el modo ASGI)."""
+    eventos = []
+    if resultado["reinicio"]:
+        eventos.append(f"event: reinicio\ndata: {json.dumps({'cursor': cursor})}\n\n")
+    for sol in resultado["cambios"]:
+        datos = json.dumps(sol, ensure_ascii=False, default=str)
+        eventos.append(f"id: {sol['seq']}\nevent: solicitud\ndata: {datos}\n\n")
+    if resultado["cursor"] != cursor and (not resultado["cambios"]
+                                          or resultado["cambios"][-1]["seq"] != resultado["cursor"]):
+        # Cambios descartados por el filtro: igual se avanza el Last-Event-ID del cliente
+        eventos.append(f"id: {resultado['cursor']}\n\n")
+    return "".join(eventos)
+
+def eventos_cambios(cursor: int, limite: int, estado_sync: Optional[str]):
+    """Genera el stream SSE del feed durante CAMBIOS_SSE_DURACION segundos."""
+    fin = time.monotonic() + CAMBIOS_SSE_DURACION
+    yield "retry: 3000\n\n"
+    while True:
+        resultado = feed_cambios.leer(cursor, limite, estado_sync)
+        texto = texto_eventos(cursor, resultado)
+        if texto:
+            yield texto
+        cursor = resultado["cursor"]
+        
+        restante = fin - time.monotonic()
+        if restante <= 0:
+            return
+        if not resultado["cambios"] and not feed_cambios.esperar(cursor, min(restante, 15)):
+            yield ": ping\n\n"
+
+@app.route("/api/cambios/stream", methods=["GET"])
+@handle_errors
+def stream_cambios():
+    """Feed de cambios como Server-Sent Events (evento ``solicitud`` con id = seq).
+    
+    Acepta los mismos parámetros que /api/cambios; al reconectar, el header
+    Last-Event-ID reemplaza a ``cursor``.
+    """
+    try:
+        cursor, limite, _, estado_sync = parametros_cambios(request.args, request.headers.get("Last-Event-ID"))
+    except ValueError as e:
+        return jsonify({"status": "ERROR", "mensaje": str(e)}), 400
+    
+    # El cupo se libera cuando el servidor cierra la respuesta (fin o desconexión)
+    if not cupos_espera_cambios.acquire(blocking=False):
+        return respuesta_esperas_agotadas()
+    respuesta = Response(eventos_cambios(cursor, limite, estado_sync), mimetype="text/event-stream",
+                         headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+    respuesta.call_on_close(cupos_espera_cambios.release)
+    return respuesta
+
+@app.route("/api/reportes/<dimension>", methods=["GET"])
+@handle_errors
+def reportes(dimension):
+    """Totales de montos por dimensión (moneda, ejecutivo, proveedor o mes).
+    
+    Cada fila separa concepto (renta, instalacion, otros_costos) y moneda.
+    Parámetros opcionales: desde/hasta (meses AAAA-MM, inclusivos) y concepto.
+    Lee resumen_montos, no la tabla de solicitudes.
+    """
+    try:
+        filas = resumen_montos.consultar(dimension, desde=request.args.get("desde"),
+                                         hasta=request.args.get("hasta"), concepto=request.args.get("concepto"))
+    except ValueError as e:
+        return jsonify({"status": "ERROR", "mensaje": str(e)}), 400
+    return jsonify({"status": "OK", "dimension": dimension, "filas": filas}), 200
+
+@app.route("/api/estado_sincronizacion", methods=["GET"])
+@handle_errors
+def estado_sincronizacion():
+    """Profundidad de la cola de sincronización y estado del worker."""
+    return jsonify({
+        "status": "OK",
+        "cola": sincronizador.profundidad_cola(),
+        "worker_activo": sincronizador.activo,
+        "ultimo_lote": sincronizador.ultimo_lote
+    }), 200
+
 # ==================== MANEJO DE ERRORES GLOBAL ====================
 @app.errorhandler(404)
 def not_found(error):
-    logger.warning(f"Ruta no encontrada: {request.path}")
+    logger.warning("Ruta no encontrada: %s", request.path)
     return jsonify({"status": "ERROR", "mensaje": "Ruta no encontrada"}), 404
 
 @app.errorhandler(500)
 def internal_error(error):
-    logger.error(f"Error interno del servidor: {error}")
+    logger.error("Error interno del servidor: %s", error)
     return jsonify({"status": "ERROR", "mensaje": "Error interno del servidor"}), 500
 
+# ==================== ARRANQUE ====================
+def crear_app() -> Flask:
+    """Punto de entrada de la app: ``gunicorn 'flask_app:crear_app()'``.
+
+    Importar este módulo no escribe en disco ni abre la BD; esto lo hace
+    aquí, una vez por proceso: arranca el logging (con su hilo escritor,
+    por eso no debe llamarse antes de un fork) y aplica las migraciones
+    pendientes, que con la BD al día son una sola lectura de user_version.
+    """
+    configurar_logging(LOG_PATH, formato_json=LOG_JSON, rotacion=LOG_ROTACION,
+                       muestreo_debug=LOG_MUESTREO_DEBUG)
+    version = init_db()
+    logger.info("Aplicación lista (esquema SQLite versión %d)", version)
+    return app
+
 # ==================== MAIN ====================
 if __name__ == "__main__":
+    crear_app()
     logger.info("Iniciando aplicación Flask")
     app.run(debug=True, host='127.0.0.1', port=5000)
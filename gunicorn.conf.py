@@ -0,0 +1,31 @@
+"""Configuración de gunicorn (se lee sola desde el directorio de trabajo).
+
+Las migraciones del esquema SQLite se aplican una vez en el master, antes
+de crear los workers; cada worker luego solo comprueba user_version en
+``crear_app()``. Como el master ya importó flask_app, los workers lo
+heredan por fork en vez de importarlo cada uno. Lo que arranca hilos o
+abre conexiones (logging, sincronizador, directorio de clientes) sigue
+ocurriendo en cada worker.
+
+En modo WSGI cada worker atiende con ``threads`` hilos (gthread): el
+long-poll de /api/cambios y el stream SSE ocupan un hilo mientras esperan,
+y con el worker sync por defecto uno solo bloquearía el proceso (y el SSE
+superaría el timeout del worker). flask_app.CAMBIOS_ESPERAS_MAX acota
+cuántos hilos pueden quedar esperando. En modo ASGI (``-k
+uvicorn.workers.UvicornWorker``) la línea de comandos reemplaza
+``worker_class`` y ``threads`` no se usa.
+
+Un cambio de código requiere reiniciar el master; HUP solo recrea los
+workers a partir de lo que el master ya importó.
+"""
+import os
+
+worker_class = 'gthread'
+threads = int(os.environ.get("ALTA_GUNICORN_HILOS", "16"))
+
+
+def on_starting(server):
+    from flask_app import init_db
+
+    version = init_db()
+    server.log.info("Esquema SQLite en versión %d", version)
@@ -0,0 +1,99 @@
+"""Deduplicación de envíos repetidos de /guardarsolicitud.
+
+Cada solicitud guardada deja su clave en la tabla ``idempotencia`` (clave
+primaria, por lo tanto índice único) dentro de la misma transacción que la
+inserta. La clave es el header ``Idempotency-Key`` si el cliente lo envía,
+o un hash del payload ya normalizado. Un reintento o doble clic con la
+misma clave dentro de ``ttl`` segundos recibe el ``sqlite_id`` original
+sin escribir nada ni volver a encolar la sincronización.
+"""
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from typing import Callable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+LARGO_MAX_CLAVE = 200
+
+
+class ClaveReutilizada(Exception):
+    """El Idempotency-Key ya se usó con un payload distinto."""
+
+
+def huella_payload(fila: Tuple, direcciones: List[Tuple]) -> str:
+    """Hash canónico de la solicitud convertida (tipos y RUT ya normalizados)."""
+    canonico = json.dumps([fila, direcciones], ensure_ascii=False, separators=(',', ':'), default=str)
+    return hashlib.sha256(canonico.encode('utf-8')).hexdigest()
+
+
+class RegistroIdempotencia:
+    def __init__(self, get_db: Callable[[], sqlite3.Connection], ttl: float = 24 * 3600,
+                 intervalo_purga: float = 600):
+        self.get_db = get_db
+        self.ttl = ttl
+        self.intervalo_purga = intervalo_purga
+
+        self._lock = threading.Lock()
+        self._purgado_en = 0.0
+
+    @staticmethod
+    def clave(encabezado: Optional[str], huella: str) -> str:
+        """Clave explícita del cliente si viene, si no la huella del contenido."""
+        encabezado = (encabezado or '').strip()
+        if encabezado:
+            return 'k:' + encabezado[:LARGO_MAX_CLAVE]
+        return 'h:' + huella
+
+    def buscar(self, cur: sqlite3.Cursor, clave: str, huella: str) -> Optional[int]:
+        """ID de la solicitud guardada con ``clave`` si aún no expira.
+
+        Lanza ``ClaveReutilizada`` si la clave vigente corresponde a otro contenido.
+        """
+        cur.execute("SELECT solicitud_id, huella FROM idempotencia WHERE clave = ? AND expira > ?",
+                    (clave, time.time()))
+        fila = cur.fetchone()
+        if fila is None:
+            return None
+        if fila[1] != huella:
+            raise ClaveReutilizada(clave)
+        return fila[0]
+
+    def registrar(self, cur: sqlite3.Cursor, clave: str, huella: str, solicitud_id: int) -> bool:
+        """Asocia ``clave`` a la solicitud dentro de la transacción del llamador.
+
+        Una clave expirada se reemplaza; retorna False si otro request ya
+        registró la misma clave vigente (el llamador debe hacer rollback).
+        """
+        ahora = time.time()
+        cur.execute("""
+            INSERT INTO idempotencia (clave, huella, solicitud_id, expira) VALUES (?, ?, ?, ?)
+            ON CONFLICT(clave) DO UPDATE SET
+              huella = excluded.huella, solicitud_id = excluded.solicitud_id, expira = excluded.expira
+            WHERE idempotencia.expira <= ?
+        """, (clave, huella, solicitud_id, ahora + self.ttl, ahora))
+        return cur.rowcount == 1
+
+    def purgar_si_corresponde(self):
+        """Borra las claves expiradas como máximo una vez cada ``intervalo_purga``."""
+        with self._lock:
+            if time.monotonic() - self._purgado_en < self.intervalo_purga:
+                return
+            self._purgado_en = time.monotonic()
+
+        db = self.get_db()
+        try:
+            cur = db.cursor()
+            cur.execute("DELETE FROM idempotencia WHERE expira <= ?", (time.time(),))
+            borradas = cur.rowcount
+            db.commit()
+        except sqlite3.Error as e:
+            logger.warning("No se pudieron purgar claves de idempotencia: %s", e)
+            return
+        finally:
+            db.close()
+        if borradas:
+            logger.debug("Claves de idempotencia expiradas purgadas: %d", borradas)
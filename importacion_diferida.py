@@ -0,0 +1,54 @@
+"""Importación diferida de dependencias pesadas.
+
+``importar_diferido('pyodbc')`` retorna un módulo sustituto sin importar
+nada; la importación real ocurre en el primer acceso a un atributo, p. ej.
+``pyodbc.connect``, y desde ahí los atributos quedan copiados en el
+sustituto. Un worker que nunca llega a SQL Server o a la descarga de
+clientes no paga esas importaciones al arrancar, y el código que las usa
+no cambia.
+
+No se usa ``importlib.util.LazyLoader``: con módulos de extensión (como
+pyodbc) el loader crea el módulo, y carga la biblioteca nativa, en
+``module_from_spec``, así que no difiere nada y un ``libodbc`` ausente
+rompería la importación de la app.
+
+Si el módulo ya está en ``sys.modules`` (p. ej. el sustituto que instala
+``benchmarks/app_bench.py``) se retorna ese.
+"""
+import importlib
+import importlib.util
+import sys
+from types import ModuleType
+from typing import Optional
+
+
+class ModuloDiferido(ModuleType):
+    """Importa el módulo real con el primer atributo que se le pide."""
+
+    def __getattr__(self, atributo: str):
+        # Solo se llama para atributos que el sustituto aún no tiene
+        if atributo.startswith('__'):
+            raise AttributeError(atributo)
+        modulo = importlib.import_module(self.__name__)
+        self.__dict__.update(modulo.__dict__)
+        return getattr(modulo, atributo)
+
+    def __repr__(self) -> str:
+        return f"<módulo diferido {self.__name__!r}>"
+
+
+def importar_diferido(nombre: str, opcional: bool = False) -> Optional[ModuleType]:
+    """Módulo ``nombre`` con carga diferida.
+
+    Si no está instalado lanza ImportError, o retorna None cuando
+    ``opcional`` (como el patrón ``try: import x / except ImportError``).
+    Que esté instalado no garantiza que cargue: un error al importarlo
+    (p. ej. una biblioteca nativa faltante) aparece en el primer uso.
+    """
+    if nombre in sys.modules:
+        return sys.modules[nombre]
+    if importlib.util.find_spec(nombre) is None:
+        if opcional:
+            return None
+        raise ImportError(f"No se encontró el módulo {nombre!r}", name=nombre)
+    return ModuloDiferido(nombre)
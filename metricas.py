@@ -0,0 +1,163 @@
+"""Métricas en memoria con salida en formato de texto de Prometheus.
+
+Implementación mínima (sin dependencias) de contadores, gauges e
+histogramas con etiquetas. Registrar una observación es una búsqueda
+binaria y una suma bajo lock, así que puede usarse en cada request.
+
+Los valores son por proceso: con varios workers de gunicorn cada uno
+expone los suyos en /metrics (la salida comienza con un comentario
+``# pid`` para distinguirlos). Los gauges que leen la BD sí son globales.
+"""
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Sequence, Tuple
+
+BUCKETS_LATENCIA = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+BUCKETS_BYTES = (1e4, 1e5, 1e6, 5e6, 1e7, 5e7, 1e8)
+
+
+def _etiquetas(nombres: Sequence[str], valores: Tuple, extra: str = '') -> str:
+    pares = [f'{n}="{_escapar(str(v))}"' for n, v in zip(nombres, valores)]
+    if extra:
+        pares.append(extra)
+    return '{' + ','.join(pares) + '}' if pares else ''
+
+
+def _escapar(valor: str) -> str:
+    return valor.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _numero(valor: float) -> str:
+    return repr(float(valor)) if valor != int(valor) else str(int(valor))
+
+
+class _Metrica:
+    tipo = ''
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas: Sequence[str] = ()):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self._lock = threading.Lock()
+
+    def exponer(self) -> List[str]:
+        return [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} {self.tipo}"]
+
+
+class Contador(_Metrica):
+    tipo = 'counter'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._valores: Dict[Tuple, float] = {}
+
+    def inc(self, *valores_etiquetas, cantidad: float = 1):
+        with self._lock:
+            self._valores[valores_etiquetas] = self._valores.get(valores_etiquetas, 0) + cantidad
+
+    def exponer(self) -> List[str]:
+        lineas = super().exponer()
+        with self._lock:
+            for clave, valor in sorted(self._valores.items()):
+                lineas.append(f"{self.nombre}{_etiquetas(self.etiquetas, clave)} {_numero(valor)}")
+        return lineas
+
+
+class Gauge(_Metrica):
+    """Gauge cuyo valor se calcula al momento de exponer (``funcion`` → {etiquetas: valor})."""
+    tipo = 'gauge'
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas: Sequence[str],
+                 funcion: Callable[[], Dict[Tuple, float]]):
+        super().__init__(nombre, ayuda, etiquetas)
+        self.funcion = funcion
+
+    def exponer(self) -> List[str]:
+        lineas = super().exponer()
+        for clave, valor in sorted(self.funcion().items()):
+            lineas.append(f"{self.nombre}{_etiquetas(self.etiquetas, clave)} {_numero(valor)}")
+        return lineas
+
+
+class Histograma(_Metrica):
+    tipo = 'histogram'
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas: Sequence[str] = (),
+                 buckets: Sequence[float] = BUCKETS_LATENCIA):
+        super().__init__(nombre, ayuda, etiquetas)
+        self.buckets = tuple(buckets)
+        # Por combinación de etiquetas: [conteos por bucket (+Inf al final), suma]
+        self._series: Dict[Tuple, list] = {}
+
+    def observar(self, valor: float, *valores_etiquetas):
+        i = bisect_left(self.buckets, valor)
+        with self._lock:
+            serie = self._series.get(valores_etiquetas)
+            if serie is None:
+                serie = self._series[valores_etiquetas] = [[0] * (len(self.buckets) + 1), 0.0]
+            serie[0][i] += 1
+            serie[1] += valor
+
+    @contextmanager
+    def medir(self, *valores_etiquetas):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observar(time.perf_counter() - inicio, *valores_etiquetas)
+
+    def exponer(self) -> List[str]:
+        lineas = super().exponer()
+        with self._lock:
+            series = [(clave, list(conteos), suma) for clave, (conteos, suma) in self._series.items()]
+        for clave, conteos, suma in sorted(series):
+            acumulado = 0
+            for limite, conteo in zip(self.buckets + (float('inf'),), conteos):
+                acumulado += conteo
+                le = '+Inf' if limite == float('inf') else _numero(limite)
+                etiquetas = _etiquetas(self.etiquetas, clave, 'le="%s"' % le)
+                lineas.append(f"{self.nombre}_bucket{etiquetas} {acumulado}")
+            lineas.append(f"{self.nombre}_sum{_etiquetas(self.etiquetas, clave)} {suma!r}")
+            lineas.append(f"{self.nombre}_count{_etiquetas(self.etiquetas, clave)} {acumulado}")
+        return lineas
+
+
+class Registro:
+    def __init__(self):
+        self._metricas: List[_Metrica] = []
+
+    def registrar(self, metrica: _Metrica) -> _Metrica:
+        self._metricas.append(metrica)
+        return metrica
+
+    def exponer(self) -> str:
+        """Texto para /metrics (Prometheus exposition format 0.0.4)."""
+        lineas = [f"# pid {os.getpid()}"]
+        for metrica in self._metricas:
+            lineas.extend(metrica.exponer())
+        return '\n'.join(lineas) + '\n'
+
+
+REGISTRO = Registro()
+
+LATENCIA_HTTP = REGISTRO.registrar(Histograma(
+    'http_request_duration_seconds', 'Latencia de requests HTTP por endpoint',
+    ('endpoint', 'metodo', 'status')))
+
+DURACION_BD = REGISTRO.registrar(Histograma(
+    'db_operation_duration_seconds', 'Duración de operaciones de base de datos',
+    ('bd', 'operacion')))
+
+DESCARGA_CLIENTES_SEGUNDOS = REGISTRO.registrar(Histograma(
+    'clientes_descarga_duration_seconds', 'Duración de la descarga del archivo de clientes',
+    ('resultado',)))
+
+DESCARGA_CLIENTES_BYTES = REGISTRO.registrar(Histograma(
+    'clientes_descarga_bytes', 'Bytes descargados del archivo de clientes',
+    buckets=BUCKETS_BYTES))
+
+BUSQUEDAS_CLIENTE = REGISTRO.registrar(Contador(
+    'clientes_busquedas_total', 'Búsquedas de cliente por RUT', ('resultado',)))
@@ -0,0 +1,265 @@
+"""Migraciones del esquema SQLite, versionadas con ``PRAGMA user_version``.
+
+Cada migración es una función que recibe un cursor y corre en una sola
+transacción junto con el nuevo ``user_version``: se aplica completa o no
+se aplica. Cuando la BD ya está al día, ``migrar`` solo lee
+``user_version`` (el encabezado del archivo), así que cada worker puede
+llamarla al arrancar sin costo; si hay migraciones pendientes las aplica
+un solo proceso bajo un lock de archivo y los demás esperan y luego ven
+la versión nueva. Con gunicorn se aplican una vez en el master, antes de
+crear los workers (ver gunicorn.conf.py).
+
+La versión 1 es el esquema que ``init_db`` recreaba en cada arranque. Sus
+sentencias son idempotentes (IF NOT EXISTS, columnas verificadas antes de
+agregarlas), de modo que también deja al día una BD creada antes de
+versionar el esquema (``user_version`` 0). Un cambio de esquema nuevo se
+agrega como otra función al final de ``MIGRACIONES``; una migración ya
+publicada no se edita.
+
+    python migraciones.py     # aplica lo pendiente y muestra la versión
+"""
+import fcntl
+import logging
+import sqlite3
+from typing import Callable, List
+
+from busqueda import crear_indice_fts
+from cambios import crear_feed_cambios
+from conexion_sqlite import GestorSQLite
+from reportes import crear_resumen
+
+logger = logging.getLogger(__name__)
+
+
+def _v1_esquema_base(cur: sqlite3.Cursor):
+    """Tablas, índices y triggers de la app hasta la introducción de las versiones."""
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS solicitud (
+      id INTEGER PRIMARY KEY AUTOINCREMENT,
+      fechaingreso TEXT NOT NULL,
+      rutcliente TEXT NOT NULL,
+      cliente TEXT NOT NULL,
+      nrosam TEXT NOT NULL,
+      razonsocial TEXT NOT NULL,
+      ejecutivocomercial TEXT NOT NULL,
+      fonoejecutivo TEXT NOT NULL,
+      contactocliente TEXT NOT NULL,
+      fonocontactocliente TEXT NOT NULL,
+      contactotecnico TEXT NOT NULL,
+      fonocontactotecnico TEXT NOT NULL,
+      jefeproyecto TEXT NOT NULL,
+      fonojefeproyecto TEXT NOT NULL,
+      proyecto TEXT NOT NULL,
+      pepgasto TEXT NOT NULL,
+      proveedor TEXT NOT NULL,
+      actividad TEXT NOT NULL,
+      tipodireccion TEXT NOT NULL,
+      conceptootroscostos TEXT NOT NULL,
+      monedaotros_costos TEXT NOT NULL,
+      montootros_costos REAL DEFAULT 0,
+      monedainstalacion TEXT NOT NULL,
+      costoinstalacion REAL DEFAULT 0,
+      monedarenta TEXT NOT NULL,
+      valorrenta REAL DEFAULT 0,
+      plazomeses INTEGER NOT NULL,
+      fecha_creacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+      estado TEXT DEFAULT 'PENDIENTE'
+    )
+    """)
+
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS direccion (
+      id INTEGER PRIMARY KEY AUTOINCREMENT,
+      solicitudid INTEGER NOT NULL,
+      numero INTEGER NOT NULL,
+      direccion TEXT NOT NULL,
+      servicio TEXT NOT NULL,
+      capacidad TEXT NOT NULL,
+      FOREIGN KEY(solicitudid) REFERENCES solicitud(id)
+    )
+    """)
+
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS sync_estado (
+      solicitud_id INTEGER PRIMARY KEY,
+      estado_sync TEXT NOT NULL,
+      fecha_sync TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+      intentos INTEGER DEFAULT 0,
+      proximo_intento TIMESTAMP,
+      FOREIGN KEY(solicitud_id) REFERENCES solicitud(id)
+    )
+    """)
+
+    # Migración: columnas de reintento en bases creadas antes del outbox
+    columnas_sync = {r[1] for r in cur.execute("PRAGMA table_info(sync_estado)")}
+    if 'intentos' not in columnas_sync:
+        cur.execute("ALTER TABLE sync_estado ADD COLUMN intentos INTEGER DEFAULT 0")
+    if 'proximo_intento' not in columnas_sync:
+        cur.execute("ALTER TABLE sync_estado ADD COLUMN proximo_intento TIMESTAMP")
+
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS error_log (
+      id INTEGER PRIMARY KEY AUTOINCREMENT,
+      solicitud_id INTEGER,
+      tipo_error TEXT NOT NULL,
+      mensaje_error TEXT NOT NULL,
+      detalle TEXT,
+      fecha_error TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+      FOREIGN KEY(solicitud_id) REFERENCES solicitud(id)
+    )
+    """)
+
+    # Crear índices para mejorar búsquedas
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_solicitud_rut ON solicitud(rutcliente)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_sync_estado ON sync_estado(estado_sync)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_direccion_solicitud ON direccion(solicitudid)")
+    # Filtros de /api/buscar_solicitudes (el rowid en la hoja da el orden por ID)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_solicitud_ejecutivo ON solicitud(ejecutivocomercial)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_solicitud_estado ON solicitud(estado)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_solicitud_fecha ON solicitud(fecha_creacion)")
+    # Índice parcial: solo las filas aún no sincronizadas, recorridas por ID
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS idx_sync_pendiente ON sync_estado(solicitud_id)
+        WHERE estado_sync != 'SINCRONIZADO'
+    """)
+
+    # Secuencia de números de solicitud (/init); continúa desde el mayor ID existente
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS secuencia (
+      nombre TEXT PRIMARY KEY,
+      ultimo INTEGER NOT NULL
+    )
+    """)
+    cur.execute("""
+        INSERT OR IGNORE INTO secuencia (nombre, ultimo)
+        SELECT 'solicitud', IFNULL(MAX(id), 0) FROM solicitud
+    """)
+
+    # Migración: número reservado en /init que el formulario envía al guardar
+    columnas_solicitud = {r[1] for r in cur.execute("PRAGMA table_info(solicitud)")}
+    if 'nrosolicitud' not in columnas_solicitud:
+        cur.execute("ALTER TABLE solicitud ADD COLUMN nrosolicitud INTEGER")
+
+    # Claves de envíos ya guardados (Idempotency-Key o hash del payload)
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS idempotencia (
+      clave TEXT PRIMARY KEY,
+      huella TEXT NOT NULL,
+      solicitud_id INTEGER NOT NULL,
+      expira REAL NOT NULL
+    )
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_idempotencia_expira ON idempotencia(expira)")
+
+    # Rango de IDs de cada archivo frío, para leer por ID lo ya archivado
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS archivo_rango (
+      archivo TEXT PRIMARY KEY,
+      min_id INTEGER NOT NULL,
+      max_id INTEGER NOT NULL
+    )
+    """)
+
+    # ID asignado por SQL Server a cada solicitud sincronizada y huella de lo
+    # enviado; lo llena el sincronizador y lo usa reconciliacion.py
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS sync_mapa (
+      solicitud_id INTEGER PRIMARY KEY,
+      sql_id INTEGER NOT NULL UNIQUE,
+      huella INTEGER NOT NULL
+    )
+    """)
+
+    # Índice de texto completo para /api/buscar_solicitudes, mantenido por triggers
+    crear_indice_fts(cur)
+
+    # Totales por moneda/ejecutivo/proveedor/mes para /api/reportes, mantenidos al guardar
+    crear_resumen(cur)
+
+    # Feed de cambios: una fila por alta o cambio de sync_estado, por trigger
+    crear_feed_cambios(cur)
+
+    # Migración: toda solicitud tiene fila en sync_estado (las previas al outbox no la tenían)
+    cur.execute("""
+        INSERT INTO sync_estado (solicitud_id, estado_sync)
+        SELECT s.id, 'PENDIENTE' FROM solicitud s
+        WHERE NOT EXISTS (SELECT 1 FROM sync_estado se WHERE se.solicitud_id = s.id)
+    """)
+
+
+def _v2_nrosolicitud_unico(cur: sqlite3.Cursor):
+    """Índice único parcial del número reservado en /init (las filas sin número no cuentan)."""
+    # Duplicados previos: el número queda en la solicitud más antigua
+    cur.execute("""
+        UPDATE solicitud SET nrosolicitud = NULL
+        WHERE nrosolicitud IS NOT NULL
+          AND id > (SELECT MIN(s2.id) FROM solicitud s2 WHERE s2.nrosolicitud = solicitud.nrosolicitud)
+    """)
+    if cur.rowcount:
+        logger.warning("%d solicitudes con número repetido quedaron sin nrosolicitud", cur.rowcount)
+    cur.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_solicitud_nrosolicitud ON solicitud(nrosolicitud)
+        WHERE nrosolicitud IS NOT NULL
+    """)
+    # La secuencia no vuelve a entregar un número ya guardado
+    cur.execute("""
+        UPDATE secuencia SET ultimo = MAX(ultimo, (SELECT IFNULL(MAX(nrosolicitud), 0) FROM solicitud))
+        WHERE nombre = 'solicitud'
+    """)
+
+
+# La posición en la lista es la versión que deja la migración (la primera es la 1)
+MIGRACIONES: List[Callable[[sqlite3.Cursor], None]] = [
+    _v1_esquema_base,
+    _v2_nrosolicitud_unico,
+]
+
+
+def version_esquema(conn: sqlite3.Connection) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrar(db_path: str, lock_path: str) -> int:
+    """Aplica las migraciones pendientes y retorna la versión resultante.
+
+    Lanza sqlite3.Error si una migración falla; la BD queda en la última
+    versión aplicada completa.
+    """
+    gestor = GestorSQLite(db_path)
+    try:
+        conn = gestor.conexion()
+        version = version_esquema(conn)
+        if version >= len(MIGRACIONES):
+            if version > len(MIGRACIONES):
+                logger.warning("Esquema SQLite en versión %d, más nueva que la de esta app (%d)",
+                               version, len(MIGRACIONES))
+            return version
+
+        with open(lock_path, 'a') as fd:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            # Otro proceso pudo haber migrado mientras se esperaba el lock
+            version = version_esquema(conn)
+            for numero in range(version + 1, len(MIGRACIONES) + 1):
+                migracion = MIGRACIONES[numero - 1]
+                cur = conn.cursor()
+                try:
+                    cur.execute("BEGIN IMMEDIATE")
+                    migracion(cur)
+                    cur.execute(f"PRAGMA user_version = {numero}")
+                    conn.commit()
+                except sqlite3.Error as e:
+                    conn.rollback()
+                    logger.error("Migración %d (%s) falló: %s", numero, migracion.__name__, e)
+                    raise
+                logger.info("Esquema SQLite migrado a la versión %d (%s)", numero, migracion.__name__)
+                version = numero
+        return version
+    finally:
+        gestor.cerrar()
+
+
+if __name__ == "__main__":
+    from flask_app import crear_app, init_db
+
+    crear_app()
+    print(f"Esquema SQLite en versión {init_db()}")
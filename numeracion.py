@@ -0,0 +1,74 @@
+"""Reserva atómica de números de solicitud para /init.
+
+Cada worker reserva un bloque de números en la tabla ``secuencia`` con una
+sola escritura y luego los entrega desde memoria, de modo que la carga del
+formulario normalmente no toca la BD y dos usuarios nunca ven el mismo
+número. Un bloque sin agotar se descarta tras ``ttl`` segundos para que
+los números sigan aproximadamente el orden cronológico.
+
+El número vuelve en ``solicitudNro`` al guardar; un índice único parcial
+sobre ``solicitud.nrosolicitud`` impide guardar dos solicitudes con el
+mismo número (``NumeroDuplicado``).
+"""
+import logging
+import sqlite3
+import threading
+import time
+from typing import Callable
+
+logger = logging.getLogger(__name__)
+
+
+class NumeroDuplicado(Exception):
+    """Ya existe una solicitud guardada con ese número."""
+
+    def __init__(self, numero: int):
+        super().__init__(f"Número de solicitud {numero} ya utilizado")
+        self.numero = numero
+
+
+def es_numero_duplicado(error: sqlite3.Error) -> bool:
+    """True si el error es la violación del índice único de nrosolicitud."""
+    return isinstance(error, sqlite3.IntegrityError) and 'solicitud.nrosolicitud' in str(error)
+
+
+class ReservaNumeros:
+    def __init__(self, get_db: Callable[[], sqlite3.Connection], nombre: str = 'solicitud',
+                 tamano_bloque: int = 20, ttl: float = 600):
+        self.get_db = get_db
+        self.nombre = nombre
+        self.tamano_bloque = tamano_bloque
+        self.ttl = ttl
+
+        self._lock = threading.Lock()
+        self._siguiente = 1
+        self._limite = 0  # último número del bloque vigente (inclusive)
+        self._reservado_en = 0.0
+
+    def siguiente(self) -> int:
+        """Entrega el próximo número reservado para este worker."""
+        with self._lock:
+            vencido = time.monotonic() - self._reservado_en > self.ttl
+            if self._siguiente > self._limite or vencido:
+                self._reservar_bloque()
+            nro = self._siguiente
+            self._siguiente += 1
+            return nro
+
+    def _reservar_bloque(self):
+        db = self.get_db()
+        try:
+            cur = db.cursor()
+            cur.execute("BEGIN IMMEDIATE")
+            cur.execute("UPDATE secuencia SET ultimo = ultimo + ? WHERE nombre = ?",
+                        (self.tamano_bloque, self.nombre))
+            cur.execute("SELECT ultimo FROM secuencia WHERE nombre = ?", (self.nombre,))
+            ultimo = cur.fetchone()[0]
+            db.commit()
+        finally:
+            db.close()
+
+        self._limite = ultimo
+        self._siguiente = ultimo - self.tamano_bloque + 1
+        self._reservado_en = time.monotonic()
+        logger.debug("Bloque de números reservado: %d-%d", self._siguiente, self._limite)
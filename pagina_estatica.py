@@ -0,0 +1,82 @@
+"""Página estática precomprimida con ETag fuerte.
+
+El archivo se lee y comprime (gzip y, si está instalado el módulo
+``brotli``, br) una sola vez al crear el objeto; cada request solo negocia
+``Accept-Encoding``, compara ``If-None-Match`` y devuelve los bytes ya
+preparados, o un 304 sin cuerpo.
+"""
+import gzip
+import hashlib
+import logging
+from typing import Dict, Optional, Tuple
+
+from flask import Response
+
+try:
+    import brotli
+except ImportError:  # dependencia opcional: sin ella se sirve solo gzip
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+
+class PaginaEstatica:
+    """Representaciones precalculadas de un archivo (identity, gzip, br)."""
+
+    def __init__(self, ruta: str, mimetype: str = 'text/html; charset=utf-8',
+                 cache_control: str = 'public, max-age=300, must-revalidate'):
+        self.ruta = ruta
+        self.mimetype = mimetype
+        self.cache_control = cache_control
+        # codificación ('' = sin comprimir) → (bytes, etag)
+        self._variantes: Dict[str, Tuple[bytes, str]] = {}
+        self.error: Optional[str] = None
+        self.cargar()
+
+    def cargar(self):
+        """Lee y comprime el archivo. Si falla se conserva el error para el 404."""
+        try:
+            with open(self.ruta, 'rb') as f:
+                contenido = f.read()
+        except OSError as e:
+            self.error = str(e)
+            logger.error("No se pudo leer %s: %s", self.ruta, e)
+            return
+
+        # El ETag fuerte identifica bytes exactos, así que cada codificación lleva el suyo
+        huella = hashlib.sha256(contenido).hexdigest()[:20]
+        variantes = {'': (contenido, f'"{huella}"'),
+                     'gzip': (gzip.compress(contenido, compresslevel=9, mtime=0), f'"{huella}-gz"')}
+        if brotli is not None:
+            variantes['br'] = (brotli.compress(contenido, quality=11), f'"{huella}-br"')
+
+        self._variantes = variantes
+        self.error = None
+        logger.info("%s precomprimido: %d bytes → %s", self.ruta, len(contenido),
+                    ", ".join(f"{cod}={len(datos)}" for cod, (datos, _) in variantes.items() if cod))
+
+    def _elegir(self, accept_encodings) -> str:
+        for codificacion in ('br', 'gzip'):
+            if codificacion in self._variantes and accept_encodings.quality(codificacion) > 0:
+                return codificacion
+        return ''
+
+    def responder(self, request) -> Optional[Response]:
+        """Respuesta para ``request`` (200 o 304), o None si el archivo no está disponible."""
+        if not self._variantes:
+            return None
+
+        codificacion = self._elegir(request.accept_encodings)
+        datos, etag = self._variantes[codificacion]
+
+        if request.if_none_match.contains(etag.strip('"')):
+            respuesta = Response(status=304)
+        else:
+            respuesta = Response(datos, content_type=self.mimetype)
+            if codificacion:
+                respuesta.headers['Content-Encoding'] = codificacion
+
+        respuesta.headers['ETag'] = etag
+        respuesta.headers['Cache-Control'] = self.cache_control
+        respuesta.headers['Vary'] = 'Accept-Encoding'
+        return respuesta
@@ -0,0 +1,129 @@
+"""Pool acotado y thread-safe de conexiones pyodbc a SQL Server.
+
+Evita pagar el handshake TLS/autenticación en cada operación. Las
+conexiones se verifican con ``SELECT 1`` si estuvieron ociosas más de
+``verificar_tras`` segundos y se reciclan al superar ``edad_maxima``.
+Una conexión que falló a nivel de red se marca con ``marcar_rota`` y se
+descarta al devolverla, aunque el bloque haya manejado el error.
+"""
+import logging
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+from importacion_diferida import importar_diferido
+
+# Se carga con la primera conexión, no al importar la app
+pyodbc = importar_diferido('pyodbc')
+
+logger = logging.getLogger(__name__)
+
+# SQLSTATE de errores de conexión (clase 08) y de timeout del driver
+ESTADOS_CONEXION_PERDIDA = ('HYT00', 'HYT01')
+
+
+def es_error_de_conexion(error: Exception) -> bool:
+    """True si el error de pyodbc indica que la conexión quedó inutilizable."""
+    estado = error.args[0] if error.args else None
+    return isinstance(estado, str) and (estado.startswith('08') or estado in ESTADOS_CONEXION_PERDIDA)
+
+
+class _ConexionPool:
+    __slots__ = ('conn', 'creada_en', 'usada_en')
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.creada_en = time.monotonic()
+        self.usada_en = self.creada_en
+
+
+class PoolSQLServer:
+    def __init__(self, conn_str: str, tamano_max: int = 4, edad_maxima: float = 1800,
+                 verificar_tras: float = 30, timeout_conexion: int = 10,
+                 timeout_espera: float = 30):
+        self.conn_str = conn_str
+        self.tamano_max = tamano_max
+        self.edad_maxima = edad_maxima
+        self.verificar_tras = verificar_tras
+        self.timeout_conexion = timeout_conexion
+        self.timeout_espera = timeout_espera
+
+        self._libres: "queue.LifoQueue[_ConexionPool]" = queue.LifoQueue()
+        self._cupos = threading.BoundedSemaphore(tamano_max)
+        self._rotas = set()
+
+    @contextmanager
+    def conexion(self):
+        """Presta una conexión del pool.
+
+        Si el bloque termina con excepción, o marcó la conexión con
+        ``marcar_rota``, la conexión se cierra en vez de volver al pool, para
+        no prestar después una conexión en estado dudoso.
+        """
+        if not self._cupos.acquire(timeout=self.timeout_espera):
+            raise pyodbc.Error("Pool SQL Server agotado: timeout esperando conexión")
+        item = None
+        rota = True
+        try:
+            item = self._obtener()
+            yield item.conn
+            rota = False
+        finally:
+            if item is not None:
+                if rota or id(item.conn) in self._rotas:
+                    self._rotas.discard(id(item.conn))
+                    self._cerrar(item)
+                else:
+                    item.usada_en = time.monotonic()
+                    self._libres.put(item)
+            self._cupos.release()
+
+    def marcar_rota(self, conn):
+        """Descarta ``conn`` (prestada por ``conexion()``) cuando se devuelva."""
+        self._rotas.add(id(conn))
+
+    def _obtener(self) -> _ConexionPool:
+        ahora = time.monotonic()
+        while True:
+            try:
+                item = self._libres.get_nowait()
+            except queue.Empty:
+                break
+            if ahora - item.creada_en > self.edad_maxima:
+                self._cerrar(item)
+                continue
+            if ahora - item.usada_en > self.verificar_tras and not self._saludable(item):
+                self._cerrar(item)
+                continue
+            return item
+
+        conn = pyodbc.connect(self.conn_str, timeout=self.timeout_conexion)
+        logger.debug("Nueva conexión SQL Server abierta")
+        return _ConexionPool(conn)
+
+    @staticmethod
+    def _saludable(item: _ConexionPool) -> bool:
+        try:
+            cur = item.conn.cursor()
+            cur.execute("SELECT 1")
+            cur.fetchone()
+            cur.close()
+            return True
+        except pyodbc.Error:
+            return False
+
+    @staticmethod
+    def _cerrar(item: _ConexionPool):
+        try:
+            item.conn.close()
+        except pyodbc.Error:
+            pass
+
+    def cerrar_todas(self):
+        """Cierra las conexiones ociosas (p. ej. al detener el worker)."""
+        while True:
+            try:
+                self._cerrar(self._libres.get_nowait())
+            except queue.Empty:
+                return
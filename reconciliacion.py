@@ -0,0 +1,334 @@
+"""Reconciliación SQLite ↔ SQL Server por sumas de control de rangos de IDs.
+
+El sincronizador guarda en ``sync_mapa`` el ``sql_id`` que SQL Server
+asignó a cada solicitud, junto con una huella de 32 bits del contenido
+enviado. La huella se calcula igual en ambos lados: en Python con
+``huella_fila`` y en SQL Server con la expresión T-SQL equivalente
+(``SQL_HUELLA``), sobre las columnas de ``COLUMNAS_HUELLA``.
+
+Una pasada compara, por cada bucket de ``tamano_bucket`` IDs remotos, la
+cantidad de filas y la suma de huellas. Desde SQL Server solo viaja una
+fila por bucket; el detalle (ID y huella) se pide únicamente para los
+buckets que no coinciden. En ellos:
+
+- una fila mapeada que ya no existe en SQL Server vuelve a PENDIENTE para
+  reenviarse (si sigue en la BD viva; si ya está archivada solo se informa);
+- una fila remota sin mapeo se empareja por huella con una solicitud local
+  sin mapeo: se registra el mapeo y, si estaba PENDIENTE o en ERROR (el
+  worker confirmó en SQL Server pero cayó antes de marcarla), se marca
+  SINCRONIZADA para no duplicarla. Las que no se emparejan se informan;
+- una fila mapeada con huella distinta se informa.
+
+La primera pasada sobre una BD sin mapeo recorre todos los buckets y
+completa ``sync_mapa`` para las solicitudes ya sincronizadas. Uso::
+
+    python reconciliacion.py
+"""
+import fcntl
+import hashlib
+import json
+import logging
+import math
+import sqlite3
+import time
+from collections import defaultdict, deque
+from typing import Callable, Dict, Iterable, List, Tuple
+
+from metricas import DURACION_BD
+from pool_sqlserver import PoolSQLServer
+
+logger = logging.getLogger(__name__)
+
+# Columnas que entran en la huella y cómo se representan como texto.
+# Son las que se guardan igual en ambos lados (las fechas y textos libres
+# largos dependen del tipo de columna en SQL Server y se dejan fuera).
+COLUMNAS_HUELLA: Tuple[Tuple[str, str], ...] = (
+    ('rutcliente', 'texto'),
+    ('cliente', 'texto'),
+    ('nrosam', 'texto'),
+    ('razonsocial', 'texto'),
+    ('ejecutivocomercial', 'texto'),
+    ('proyecto', 'texto'),
+    ('pepgasto', 'texto'),
+    ('plazomeses', 'entero'),
+    ('valorrenta', 'real'),
+    ('costoinstalacion', 'real'),
+    ('montootros_costos', 'real'),
+)
+
+# Máximo de IDs listados por categoría en el informe
+MAX_IDS_INFORME = 100
+
+
+def _texto_tsql(columna: str, tipo: str) -> str:
+    if tipo == 'entero':
+        valor = f"CAST(CAST({columna} AS BIGINT) AS NVARCHAR(20))"
+    elif tipo == 'real':
+        # Centésimas redondeadas: evita diferencias de representación del float
+        valor = f"CAST(CAST(FLOOR({columna} * 100 + 0.5) AS BIGINT) AS NVARCHAR(20))"
+    else:
+        valor = f"CAST({columna} AS NVARCHAR(4000))"
+    return f"ISNULL({valor}, N'')"
+
+
+# MD5 sobre el texto en UTF-16LE (NVARCHAR); los 4 primeros bytes como INT con signo
+SQL_HUELLA = (
+    "CAST(SUBSTRING(HASHBYTES('MD5', CONCAT("
+    + ", N'|', ".join(_texto_tsql(c, t) for c, t in COLUMNAS_HUELLA)
+    + ")), 1, 4) AS INT)"
+)
+
+
+def huella_fila(fila) -> int:
+    """Huella de una solicitud (sqlite3.Row o dict), idéntica a ``SQL_HUELLA``."""
+    partes = []
+    for columna, tipo in COLUMNAS_HUELLA:
+        valor = fila[columna]
+        if valor is None:
+            partes.append('')
+        elif tipo == 'entero':
+            partes.append(str(int(valor)))
+        elif tipo == 'real':
+            partes.append(str(math.floor(float(valor) * 100 + 0.5)))
+        else:
+            partes.append(str(valor))
+    digest = hashlib.md5('|'.join(partes).encode('utf-16-le')).digest()
+    return int.from_bytes(digest[:4], 'big', signed=True)
+
+
+class Reconciliador:
+    def __init__(self, get_db: Callable[[], sqlite3.Connection], pool: PoolSQLServer,
+                 lock_path: str, tamano_bucket: int = 1000):
+        self.get_db = get_db
+        self.pool = pool
+        self.lock_path = lock_path
+        self.tamano_bucket = int(tamano_bucket)
+
+        self._lock_fd = None
+        self.ultima_ejecucion: Dict = {}
+
+    def _tomar_lock(self) -> bool:
+        if self._lock_fd is not None:
+            return True
+        fd = open(self.lock_path, 'a')
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            fd.close()
+            return False
+        self._lock_fd = fd
+        return True
+
+    # ---------- Sumas de control ----------
+    def _buckets_locales(self) -> Dict[int, Tuple[int, int]]:
+        db = self.get_db()
+        try:
+            cur = db.cursor()
+            cur.execute("SELECT sql_id / ?, COUNT(*), SUM(huella) FROM sync_mapa GROUP BY 1",
+                        (self.tamano_bucket,))
+            return {b: (n, s) for b, n, s in cur.fetchall()}
+        finally:
+            db.close()
+
+    def _buckets_remotos(self, conn_sql) -> Dict[int, Tuple[int, int]]:
+        b = self.tamano_bucket
+        cur_sql = conn_sql.cursor()
+        with DURACION_BD.medir('sqlserver', 'reconciliar_buckets'):
+            cur_sql.execute(f"""
+                SELECT id / {b}, COUNT(*), SUM(CAST({SQL_HUELLA} AS BIGINT))
+                FROM solicitud
+                GROUP BY id / {b}
+            """)
+            filas = cur_sql.fetchall()
+        cur_sql.close()
+        return {int(bucket): (int(n), int(s)) for bucket, n, s in filas}
+
+    def _detalle_remoto(self, conn_sql, bucket: int) -> Dict[int, int]:
+        desde = bucket * self.tamano_bucket
+        cur_sql = conn_sql.cursor()
+        with DURACION_BD.medir('sqlserver', 'reconciliar_detalle'):
+            cur_sql.execute(f"SELECT id, {SQL_HUELLA} FROM solicitud WHERE id >= ? AND id < ?",
+                            (desde, desde + self.tamano_bucket))
+            filas = cur_sql.fetchall()
+        cur_sql.close()
+        return {int(i): int(h) for i, h in filas}
+
+    def _detalle_local(self, cur: sqlite3.Cursor, bucket: int) -> Dict[int, Tuple[int, int]]:
+        desde = bucket * self.tamano_bucket
+        cur.execute("SELECT sql_id, solicitud_id, huella FROM sync_mapa WHERE sql_id >= ? AND sql_id < ?",
+                    (desde, desde + self.tamano_bucket))
+        return {sql_id: (solicitud_id, huella) for sql_id, solicitud_id, huella in cur.fetchall()}
+
+    # ---------- Pasada completa ----------
+    def reconciliar(self) -> Dict:
+        """Compara ambos lados, repara lo que puede y retorna un informe."""
+        inicio = time.monotonic()
+        # Primero lo local: todo mapeo leído ya estaba confirmado en SQL Server,
+        # así una fila en vuelo no se toma por faltante.
+        locales = self._buckets_locales()
+        with self.pool.conexion() as conn_sql:
+            remotos = self._buckets_remotos(conn_sql)
+            distintos = sorted(b for b in set(locales) | set(remotos) if locales.get(b) != remotos.get(b))
+
+            faltantes: List[int] = []
+            diferentes: List[int] = []
+            huerfanas: List[Tuple[int, int]] = []
+            db = self.get_db()
+            try:
+                cur = db.cursor()
+                for bucket in distintos:
+                    mapa = self._detalle_local(cur, bucket)
+                    remoto = self._detalle_remoto(conn_sql, bucket)
+                    for sql_id, (solicitud_id, huella) in mapa.items():
+                        if sql_id not in remoto:
+                            faltantes.append(solicitud_id)
+                        elif remoto[sql_id] != huella:
+                            diferentes.append(solicitud_id)
+                    huerfanas.extend((sql_id, h) for sql_id, h in sorted(remoto.items()) if sql_id not in mapa)
+            finally:
+                db.close()
+
+        reenviadas, archivadas = self._reenviar(faltantes)
+        mapeadas, marcadas, sin_pareja = self._emparejar(huerfanas)
+
+        if diferentes:
+            logger.warning("Reconciliación: %d solicitudes con contenido distinto en SQL Server: %s",
+                           len(diferentes), diferentes[:MAX_IDS_INFORME])
+        if archivadas:
+            logger.warning("Reconciliación: %d solicitudes archivadas no están en SQL Server: %s",
+                           len(archivadas), archivadas[:MAX_IDS_INFORME])
+        if sin_pareja:
+            logger.warning("Reconciliación: %d filas de SQL Server sin solicitud local (duplicadas o ajenas): %s",
+                           len(sin_pareja), sin_pareja[:MAX_IDS_INFORME])
+
+        informe = {
+            "buckets": len(set(locales) | set(remotos)),
+            "buckets_distintos": len(distintos),
+            "reenviadas": len(reenviadas),
+            "mapeadas": mapeadas,
+            "marcadas_sincronizadas": marcadas,
+            "diferentes": diferentes[:MAX_IDS_INFORME],
+            "archivadas_faltantes": archivadas[:MAX_IDS_INFORME],
+            "huerfanas_sql_id": sin_pareja[:MAX_IDS_INFORME],
+            "segundos": round(time.monotonic() - inicio, 2),
+            "fecha": time.time(),
+        }
+        self.ultima_ejecucion = informe
+        logger.info("Reconciliación: %d/%d buckets distintos, %d reenviadas, %d mapeadas (%d marcadas) en %.1fs",
+                    len(distintos), informe["buckets"], len(reenviadas), mapeadas, marcadas, informe["segundos"])
+        return informe
+
+    # ---------- Reparación ----------
+    def _reenviar(self, faltantes: List[int]) -> Tuple[List[int], List[int]]:
+        """Vuelve a PENDIENTE las solicitudes vivas que faltan en SQL Server.
+
+        Retorna (reenviadas, archivadas): las archivadas ya no tienen fila
+        local que reenviar.
+        """
+        if not faltantes:
+            return [], []
+        db = self.get_db()
+        try:
+            cur = db.cursor()
+            cur.execute("BEGIN IMMEDIATE")
+            cur.execute("SELECT id FROM solicitud WHERE id IN (SELECT value FROM json_each(?))",
+                        (json.dumps(faltantes),))
+            vivas = [r[0] for r in cur.fetchall()]
+            ids_json = json.dumps(vivas)
+            cur.execute("DELETE FROM sync_mapa WHERE solicitud_id IN (SELECT value FROM json_each(?))", (ids_json,))
+            cur.execute("""
+                UPDATE sync_estado SET estado_sync = 'PENDIENTE', intentos = 0, proximo_intento = NULL
+                WHERE solicitud_id IN (SELECT value FROM json_each(?))
+            """, (ids_json,))
+            db.commit()
+        except sqlite3.Error:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+        archivadas = sorted(set(faltantes) - set(vivas))
+        return vivas, archivadas
+
+    def _candidatas(self, cur: sqlite3.Cursor, huellas: set) -> Dict[int, deque]:
+        """Solicitudes vivas sin mapeo cuya huella aparece entre ``huellas``, por huella y en orden de ID.
+
+        Solo revisa las posteriores a la última mapeada y las aún no
+        SINCRONIZADAS (índice parcial idx_sync_pendiente): las anteriores ya
+        sincronizadas se mapearon en una pasada previa. En la primera pasada
+        no hay mapeo y se recorren todas.
+        """
+        candidatas: Dict[int, deque] = defaultdict(deque)
+        cur.execute("SELECT IFNULL(MAX(solicitud_id), 0) FROM sync_mapa")
+        ultima_mapeada = cur.fetchone()[0]
+        cur.execute("""
+            SELECT s.* FROM solicitud s
+            LEFT JOIN sync_mapa m ON m.solicitud_id = s.id
+            WHERE m.solicitud_id IS NULL
+              AND s.id IN (SELECT id FROM solicitud WHERE id > ?
+                           UNION SELECT solicitud_id FROM sync_estado WHERE estado_sync != 'SINCRONIZADO')
+            ORDER BY s.id
+        """, (ultima_mapeada,))
+        for fila in cur:
+            h = huella_fila(fila)
+            if h in huellas:
+                candidatas[h].append(fila['id'])
+        return candidatas
+
+    def _emparejar(self, huerfanas: Iterable[Tuple[int, int]]) -> Tuple[int, int, List[int]]:
+        """Registra el mapeo de filas remotas sin mapeo que tienen pareja local.
+
+        Ambos lados asignan IDs crecientes, así que las huellas repetidas se
+        emparejan en orden. Retorna (mapeadas, marcadas SINCRONIZADAS, sql_id sin pareja).
+        """
+        huerfanas = list(huerfanas)
+        if not huerfanas:
+            return 0, 0, []
+        db = self.get_db()
+        try:
+            cur = db.cursor()
+            # Descarta las que el sincronizador mapeó mientras se leía SQL Server
+            cur.execute("SELECT sql_id FROM sync_mapa WHERE sql_id IN (SELECT value FROM json_each(?))",
+                        (json.dumps([sql_id for sql_id, _ in huerfanas]),))
+            ya_mapeadas = {r[0] for r in cur.fetchall()}
+            huerfanas = [(sql_id, h) for sql_id, h in huerfanas if sql_id not in ya_mapeadas]
+            candidatas = self._candidatas(cur, {h for _, h in huerfanas})
+
+            mapeadas = marcadas = 0
+            sin_pareja: List[int] = []
+            cur.execute("BEGIN IMMEDIATE")
+            for sql_id, h in huerfanas:
+                if not candidatas.get(h):
+                    sin_pareja.append(sql_id)
+                    continue
+                solicitud_id = candidatas[h].popleft()
+                cur.execute("INSERT OR IGNORE INTO sync_mapa (solicitud_id, sql_id, huella) VALUES (?, ?, ?)",
+                            (solicitud_id, sql_id, h))
+                if cur.rowcount != 1:
+                    sin_pareja.append(sql_id)
+                    continue
+                mapeadas += 1
+                cur.execute("""
+                    UPDATE sync_estado
+                    SET estado_sync = 'SINCRONIZADO', fecha_sync = CURRENT_TIMESTAMP, intentos = 0,
+                        proximo_intento = NULL
+                    WHERE solicitud_id = ? AND estado_sync != 'SINCRONIZADO'
+                """, (solicitud_id,))
+                marcadas += cur.rowcount
+            db.commit()
+        except sqlite3.Error:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+        return mapeadas, marcadas, sin_pareja
+
+
+if __name__ == "__main__":
+    from flask_app import crear_app, reconciliador
+
+    crear_app()
+
+    if reconciliador._tomar_lock():
+        print(json.dumps(reconciliador.reconciliar(), ensure_ascii=False, indent=2))
+    else:
+        logger.warning("Otra reconciliación está en curso; no se hace nada")
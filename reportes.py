@@ -0,0 +1,237 @@
+"""Totales de montos por moneda, ejecutivo, proveedor y mes.
+
+``resumen_montos`` guarda, por (mes, ejecutivo, proveedor, concepto,
+moneda), la cantidad de solicitudes y la suma del monto. Cada concepto
+lleva su propia moneda: ``renta`` (valorrenta/monedarenta),
+``instalacion`` (costoinstalacion/monedainstalacion) y ``otros_costos``
+(montootros_costos/monedaotros_costos). El mes sale de ``fecha_creacion``.
+
+Las rutas de guardado lo actualizan con ``acumular_resumen`` dentro de su
+transacción, con un solo INSERT … SELECT … GROUP BY por solicitud o por
+lote. Los reportes agregan esta tabla, cuyo tamaño depende de la cantidad
+de grupos y no de solicitudes. El archivado no descuenta: lo movido a
+archivo frío sigue contando.
+
+``reconstruir`` recalcula todo desde la BD viva y los archivos fríos y
+``verificar`` compara ese recálculo con la tabla::
+
+    python reportes.py --reconstruir
+    python reportes.py --verificar
+"""
+import logging
+import os
+import sqlite3
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# concepto → (columna de monto, columna de moneda)
+CONCEPTOS = {
+    'renta': ('valorrenta', 'monedarenta'),
+    'instalacion': ('costoinstalacion', 'monedainstalacion'),
+    'otros_costos': ('montootros_costos', 'monedaotros_costos'),
+}
+
+# dimensión del reporte → columnas de agrupación (siempre se separa por concepto y moneda)
+DIMENSIONES = {
+    'moneda': (),
+    'ejecutivo': ('ejecutivo',),
+    'proveedor': ('proveedor',),
+    'mes': ('mes',),
+}
+
+CLAVE_RESUMEN = ('mes', 'ejecutivo', 'proveedor', 'concepto', 'moneda')
+
+# Tolerancia de la verificación: las sumas incrementales de REAL pueden
+# diferir del recálculo en el último decimal
+TOLERANCIA = 1e-6
+
+SQL_CREAR_RESUMEN = """
+    CREATE TABLE IF NOT EXISTS resumen_montos (
+      mes TEXT NOT NULL,
+      ejecutivo TEXT NOT NULL,
+      proveedor TEXT NOT NULL,
+      concepto TEXT NOT NULL,
+      moneda TEXT NOT NULL,
+      cantidad INTEGER NOT NULL,
+      total REAL NOT NULL,
+      PRIMARY KEY (mes, ejecutivo, proveedor, concepto, moneda)
+    ) WITHOUT ROWID
+"""
+
+SQL_AGREGAR = "SELECT {clave}, COUNT(*), SUM(monto) FROM ({montos}) WHERE {filtro} GROUP BY {clave}".format(
+    clave=', '.join(CLAVE_RESUMEN),
+    montos=' UNION ALL '.join(f"""
+        SELECT IFNULL(strftime('%Y-%m', fecha_creacion), '') AS mes, IFNULL(ejecutivocomercial, '') AS ejecutivo,
+               IFNULL(proveedor, '') AS proveedor, '{concepto}' AS concepto, IFNULL({moneda}, '') AS moneda,
+               IFNULL({monto}, 0) AS monto, id
+        FROM solicitud""" for concepto, (monto, moneda) in CONCEPTOS.items()),
+    filtro='{filtro}',
+)
+
+SQL_ACUMULAR = f"""
+    INSERT INTO resumen_montos ({', '.join(CLAVE_RESUMEN)}, cantidad, total)
+    {SQL_AGREGAR.format(filtro='id BETWEEN :desde AND :hasta')}
+    ON CONFLICT ({', '.join(CLAVE_RESUMEN)}) DO UPDATE SET
+      cantidad = cantidad + excluded.cantidad, total = total + excluded.total
+"""
+
+SQL_INSERTAR = (f"INSERT INTO resumen_montos ({', '.join(CLAVE_RESUMEN)}, cantidad, total) "
+                f"VALUES ({', '.join('?' * (len(CLAVE_RESUMEN) + 2))})")
+
+
+def crear_resumen(cur: sqlite3.Cursor):
+    """Crea ``resumen_montos``; si es nueva, la llena con las solicitudes de la BD viva.
+
+    Si ya hay solicitudes archivadas, ``python reportes.py --reconstruir``
+    las incorpora.
+    """
+    existe = cur.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'resumen_montos'").fetchone()
+    cur.execute(SQL_CREAR_RESUMEN)
+    if not existe:
+        acumular_resumen(cur, 0, 1 << 62)
+
+
+def acumular_resumen(cur: sqlite3.Cursor, desde_id: int, hasta_id: int):
+    """Suma al resumen las solicitudes [desde_id, hasta_id] en la transacción del llamador."""
+    cur.execute(SQL_ACUMULAR, {'desde': desde_id, 'hasta': hasta_id})
+
+
+class ResumenMontos:
+    def __init__(self, get_db: Callable[[], sqlite3.Connection], archivo_dir: str, db_path: str):
+        self.get_db = get_db
+        self.archivo_dir = archivo_dir
+        self.db_path = db_path
+
+    # ---------- Consulta ----------
+    def consultar(self, dimension: str, desde: Optional[str] = None, hasta: Optional[str] = None,
+                  concepto: Optional[str] = None) -> List[Dict]:
+        """Totales por ``dimension`` (ver DIMENSIONES), concepto y moneda.
+
+        ``desde``/``hasta`` son meses AAAA-MM inclusivos. Lanza ValueError ante
+        parámetros inválidos.
+        """
+        if dimension not in DIMENSIONES:
+            raise ValueError(f"dimensión debe ser una de: {', '.join(DIMENSIONES)}")
+        if concepto is not None and concepto not in CONCEPTOS:
+            raise ValueError(f"concepto debe ser uno de: {', '.join(CONCEPTOS)}")
+        condiciones, params = [], []
+        for valor, operador in ((desde, '>='), (hasta, '<=')):
+            if valor:
+                if len(valor) != 7 or valor[4] != '-' or not (valor[:4] + valor[5:]).isdigit():
+                    raise ValueError("desde/hasta deben tener formato AAAA-MM")
+                condiciones.append(f"mes {operador} ?")
+                params.append(valor)
+        if concepto:
+            condiciones.append("concepto = ?")
+            params.append(concepto)
+
+        grupo = ', '.join(DIMENSIONES[dimension] + ('concepto', 'moneda'))
+        where = f"WHERE {' AND '.join(condiciones)}" if condiciones else ""
+        db = self.get_db()
+        try:
+            cur = db.cursor()
+            cur.execute(f"""
+                SELECT {grupo}, SUM(cantidad) AS cantidad, ROUND(SUM(total), 4) AS total
+                FROM resumen_montos {where}
+                GROUP BY {grupo}
+                ORDER BY {grupo}
+            """, params)
+            return [dict(r) for r in cur.fetchall()]
+        finally:
+            db.close()
+
+    # ---------- Recálculo ----------
+    def _recalcular(self, cur: sqlite3.Cursor) -> Dict[Tuple, Tuple[int, float]]:
+        """Totales completos: BD viva más archivos fríos.
+
+        Debe llamarse con el lock de escritura tomado (BEGIN IMMEDIATE), así
+        el archivador no puede borrar filas de la BD viva mientras se leen
+        los archivos. Las filas ya copiadas a un archivo que aún siguen en
+        la BD viva se cuentan una sola vez.
+        """
+        totales: Dict[Tuple, Tuple[int, float]] = {}
+
+        def sumar(filas):
+            for *clave, cantidad, total in filas:
+                previo = totales.get(tuple(clave), (0, 0.0))
+                totales[tuple(clave)] = (previo[0] + cantidad, previo[1] + total)
+
+        sumar(cur.execute(SQL_AGREGAR.format(filtro='1')).fetchall())
+
+        archivos = [r[0] for r in cur.execute("SELECT archivo FROM archivo_rango ORDER BY archivo")]
+        for archivo in archivos:
+            ruta = os.path.join(self.archivo_dir, archivo)
+            if not os.path.exists(ruta):
+                logger.warning("Archivo frío %s no encontrado; no se incluye en el recálculo", ruta)
+                continue
+            conn = sqlite3.connect(f"file:{ruta}?mode=ro", uri=True)
+            try:
+                conn.execute("ATTACH DATABASE ? AS viva", (f"file:{self.db_path}?mode=ro",))
+                sumar(conn.execute(SQL_AGREGAR.format(
+                    filtro='id NOT IN (SELECT id FROM viva.solicitud)')).fetchall())
+            finally:
+                conn.close()
+        return totales
+
+    def reconstruir(self) -> int:
+        """Reemplaza el resumen por un recálculo completo. Retorna la cantidad de grupos."""
+        db = self.get_db()
+        try:
+            cur = db.cursor()
+            cur.execute("BEGIN IMMEDIATE")
+            totales = self._recalcular(cur)
+            cur.execute("DELETE FROM resumen_montos")
+            cur.executemany(SQL_INSERTAR, (clave + valores for clave, valores in totales.items()))
+            db.commit()
+        except sqlite3.Error:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+        logger.info("Resumen de montos reconstruido: %d grupos", len(totales))
+        return len(totales)
+
+    def verificar(self) -> List[Dict]:
+        """Diferencias entre el resumen y un recálculo completo (lista vacía si coinciden)."""
+        db = self.get_db()
+        try:
+            cur = db.cursor()
+            cur.execute("BEGIN IMMEDIATE")
+            esperado = self._recalcular(cur)
+            actual = {tuple(r[:5]): (r[5], r[6]) for r in cur.execute(
+                f"SELECT {', '.join(CLAVE_RESUMEN)}, cantidad, total FROM resumen_montos")}
+        finally:
+            db.rollback()
+            db.close()
+
+        diferencias = []
+        for clave in sorted(set(esperado) | set(actual)):
+            cantidad_e, total_e = esperado.get(clave, (0, 0.0))
+            cantidad_a, total_a = actual.get(clave, (0, 0.0))
+            if cantidad_e != cantidad_a or abs(total_e - total_a) > TOLERANCIA * max(1.0, abs(total_e)):
+                diferencias.append({**dict(zip(CLAVE_RESUMEN, clave)),
+                                    "cantidad_esperada": cantidad_e, "cantidad_resumen": cantidad_a,
+                                    "total_esperado": total_e, "total_resumen": total_a})
+        if diferencias:
+            logger.warning("Resumen de montos inconsistente en %d grupos", len(diferencias))
+        return diferencias
+
+
+if __name__ == "__main__":
+    import json
+    import sys
+
+    from flask_app import crear_app, resumen_montos
+
+    crear_app()
+
+    if "--reconstruir" in sys.argv:
+        resumen_montos.reconstruir()
+    elif "--verificar" in sys.argv:
+        diferencias = resumen_montos.verificar()
+        print(json.dumps(diferencias, ensure_ascii=False, indent=2))
+        sys.exit(1 if diferencias else 0)
+    else:
+        print("Uso: python reportes.py --reconstruir | --verificar")
+        sys.exit(2)
@@ -0,0 +1,319 @@
+"""Worker de sincronización SQLite → SQL Server (patrón outbox).
+
+``guardar`` solo confirma en SQLite y deja la solicitud en ``sync_estado``
+como PENDIENTE. Este worker drena en lotes las solicitudes no
+SINCRONIZADAS hacia SQL Server, con backoff exponencial por solicitud y
+registro de fallas en ``error_log``.
+
+Puede correr como hilo dentro de la app (``SincronizadorSQLServer.iniciar``)
+o como proceso aparte::
+
+    python sincronizacion.py
+
+En ambos casos un lock de archivo garantiza que un solo proceso drene la
+cola aunque gunicorn levante varios workers. Dentro de la app está activo
+por defecto; ``ALTA_SYNC_EN_APP=0`` lo desactiva.
+
+Reemplaza al cliente externo de ``/api/obtener_pendientes`` y
+``/api/marcar_sincronizado``: ambos toman las mismas solicitudes PENDIENTES,
+así que si corren a la vez cada una puede llegar dos veces a SQL Server.
+"""
+import fcntl
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from esquema_solicitud import SQL_INSERT_DIRECCION, SQL_INSERT_SOLICITUD_SQLSERVER, fila_sqlserver
+from importacion_diferida import importar_diferido
+from metricas import DURACION_BD
+from pool_sqlserver import PoolSQLServer, es_error_de_conexion
+from reconciliacion import huella_fila
+
+pyodbc = importar_diferido('pyodbc')
+
+logger = logging.getLogger(__name__)
+
+# Solicitudes pendientes cuyo próximo intento ya venció. Parte desde
+# sync_estado para usar el índice parcial idx_sync_pendiente.
+SQL_PENDIENTES_LOTE = """
+    SELECT s.*, COALESCE(se.intentos, 0) AS intentos
+    FROM sync_estado se
+    JOIN solicitud s ON s.id = se.solicitud_id
+    WHERE se.estado_sync != 'SINCRONIZADO'
+      AND (se.proximo_intento IS NULL OR se.proximo_intento <= datetime('now'))
+    ORDER BY se.solicitud_id
+    LIMIT ?
+"""
+
+
+def direcciones_por_solicitud(cur, ids: List[int]) -> Dict[int, List[Dict]]:
+    """Direcciones de varias solicitudes en una sola consulta, agrupadas por solicitud."""
+    resultado: Dict[int, List[Dict]] = {}
+    if not ids:
+        return resultado
+    marcadores = ','.join('?' * len(ids))
+    cur.execute(f"SELECT * FROM direccion WHERE solicitudid IN ({marcadores}) ORDER BY solicitudid, numero", ids)
+    for r in cur.fetchall():
+        resultado.setdefault(r['solicitudid'], []).append(dict(r))
+    return resultado
+
+
+class SincronizadorSQLServer:
+    """Drena el outbox de SQLite hacia SQL Server en un hilo de fondo."""
+
+    def __init__(self, get_db: Callable[[], sqlite3.Connection], pool: PoolSQLServer,
+                 lock_path: str, tamano_lote: int = 50, intervalo: float = 5.0,
+                 backoff_base: float = 10.0, backoff_max: float = 3600.0):
+        self.get_db = get_db
+        self.pool = pool
+        self.lock_path = lock_path
+        self.tamano_lote = tamano_lote
+        self.intervalo = intervalo
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self._hilo: Optional[threading.Thread] = None
+        self._detener = threading.Event()
+        self._despertar = threading.Event()
+        self._lock_fd = None
+        self._fallas_consecutivas = 0
+        self.ultimo_lote: Optional[Dict] = None
+
+    # ---------- Control del hilo ----------
+    def iniciar(self):
+        """Arranca el hilo de sincronización (idempotente)."""
+        if self._hilo is not None and self._hilo.is_alive():
+            return
+        self._detener.clear()
+        self._hilo = threading.Thread(target=self._bucle, name="sincronizador-sqlserver", daemon=True)
+        self._hilo.start()
+
+    def detener(self):
+        self._detener.set()
+        self._despertar.set()
+        self.pool.cerrar_todas()
+
+    def notificar(self):
+        """Despierta al worker tras una nueva escritura (solo en este proceso)."""
+        self._despertar.set()
+
+    @property
+    def activo(self) -> bool:
+        """True si este proceso tiene el lock y está drenando la cola."""
+        return self._lock_fd is not None
+
+    def _tomar_lock(self) -> bool:
+        if self._lock_fd is not None:
+            return True
+        fd = open(self.lock_path, 'a')
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            fd.close()
+            return False
+        self._lock_fd = fd
+        logger.info("Sincronizador SQL Server activo en PID %d", os.getpid())
+        return True
+
+    def _bucle(self):
+        while not self._detener.is_set():
+            # Otro proceso ya drena la cola: reintentar el lock más tarde
+            if not self._tomar_lock():
+                self._detener.wait(self.intervalo * 6)
+                continue
+
+            espera = self.intervalo
+            try:
+                procesadas = self.procesar_lote()
+                if procesadas >= self.tamano_lote:
+                    espera = 0
+            except pyodbc.Error as e:
+                self._fallas_consecutivas += 1
+                espera = self._calcular_backoff(self._fallas_consecutivas)
+                logger.warning("SQL Server no disponible (%s); reintento en %.0fs", e, espera)
+            except Exception as e:
+                logger.error("Error inesperado en sincronizador: %s", e, exc_info=True)
+
+            if espera:
+                self._despertar.wait(espera)
+                self._despertar.clear()
+
+    def _calcular_backoff(self, intentos: int) -> float:
+        return min(self.backoff_base * (2 ** max(intentos - 1, 0)), self.backoff_max)
+
+    # ---------- Cola ----------
+    def profundidad_cola(self) -> Dict[str, int]:
+        """Cantidad de solicitudes no sincronizadas, por estado."""
+        db = self.get_db()
+        try:
+            cur = db.cursor()
+            cur.execute("""
+                SELECT estado_sync, COUNT(*)
+                FROM sync_estado
+                WHERE estado_sync != 'SINCRONIZADO'
+                GROUP BY 1
+            """)
+            por_estado = {estado: total for estado, total in cur.fetchall()}
+        finally:
+            db.close()
+        por_estado['total'] = sum(por_estado.values())
+        return por_estado
+
+    def procesar_lote(self) -> int:
+        """Envía un lote de solicitudes pendientes. Retorna cuántas se intentaron.
+
+        Lanza ``pyodbc.Error`` si no se pudo obtener una conexión del pool;
+        en ese caso las solicitudes del lote quedan con backoff.
+        """
+        db = self.get_db()
+        try:
+            cur = db.cursor()
+            cur.execute(SQL_PENDIENTES_LOTE, (self.tamano_lote,))
+            solicitudes = [dict(r) for r in cur.fetchall()]
+            if not solicitudes:
+                self._fallas_consecutivas = 0
+                return 0
+
+            ids = [s['id'] for s in solicitudes]
+            direcciones = direcciones_por_solicitud(cur, ids)
+
+            try:
+                ok, fallidas = self._enviar(solicitudes, direcciones)
+            except pyodbc.Error as e:
+                self._registrar_fallas(db, solicitudes, e)
+                db.commit()
+                raise
+
+            if ok:
+                cur.executemany("""
+                    INSERT INTO sync_estado (solicitud_id, estado_sync, fecha_sync, intentos)
+                    VALUES (?, 'SINCRONIZADO', CURRENT_TIMESTAMP, 0)
+                    ON CONFLICT(solicitud_id) DO UPDATE SET
+                      estado_sync = 'SINCRONIZADO', fecha_sync = CURRENT_TIMESTAMP, intentos = 0,
+                      proximo_intento = NULL
+                """, [(i,) for i, _ in ok])
+                # Mapeo local → remoto con la huella de lo enviado, para reconciliacion.py
+                por_id = {s['id']: s for s in solicitudes}
+                cur.executemany(
+                    "INSERT OR REPLACE INTO sync_mapa (solicitud_id, sql_id, huella) VALUES (?, ?, ?)",
+                    [(i, sql_id, huella_fila(por_id[i])) for i, sql_id in ok]
+                )
+            for sol, e in fallidas:
+                self._registrar_fallas(db, [sol], e)
+            # Estados y error_log del lote en una sola transacción
+            db.commit()
+
+            self._fallas_consecutivas = 0
+            self.ultimo_lote = {"enviadas": len(ok), "fallidas": len(fallidas), "fecha": time.time()}
+            logger.info("Lote sincronizado a SQL Server: %d OK, %d con error", len(ok), len(fallidas))
+            return len(solicitudes)
+        finally:
+            db.close()
+
+    def _enviar(self, solicitudes: List[Dict],
+                direcciones: Dict[int, List[Dict]]) -> Tuple[List[Tuple[int, int]], List]:
+        """Inserta el lote en SQL Server en una sola transacción.
+
+        Si el lote falla se reintenta solicitud por solicitud para aislar las
+        filas con error. Retorna ([(id, sql_id) OK], [(solicitud, error), ...]).
+
+        Si se pierde la conexión durante el lote se relanza el error (el pool
+        la descarta). Si se pierde en el reintento por solicitud, la conexión
+        se marca rota, se conservan las ya confirmadas y las restantes quedan
+        como fallidas con ese error.
+        """
+        with self.pool.conexion() as conn_sql, DURACION_BD.medir('sqlserver', 'sincronizar_lote'):
+            try:
+                ids = self._insertar(conn_sql, solicitudes, direcciones)
+                conn_sql.commit()
+                return ids, []
+            except pyodbc.Error as e:
+                if es_error_de_conexion(e) or not self._deshacer(conn_sql):
+                    raise
+                if len(solicitudes) == 1:
+                    return [], [(solicitudes[0], e)]
+
+            ok, fallidas = [], []
+            for i, sol in enumerate(solicitudes):
+                try:
+                    ids = self._insertar(conn_sql, [sol], direcciones)
+                    conn_sql.commit()
+                    ok.extend(ids)
+                except pyodbc.Error as e:
+                    if not es_error_de_conexion(e) and self._deshacer(conn_sql):
+                        fallidas.append((sol, e))
+                        continue
+                    self.pool.marcar_rota(conn_sql)
+                    fallidas.extend((pendiente, e) for pendiente in solicitudes[i:])
+                    break
+            return ok, fallidas
+
+    @staticmethod
+    def _deshacer(conn_sql) -> bool:
+        """Rollback de la transacción en curso; False si la conexión ya no responde."""
+        try:
+            conn_sql.rollback()
+            return True
+        except pyodbc.Error as e:
+            logger.warning("Rollback fallido en SQL Server, se descarta la conexión: %s", e)
+            return False
+
+    @staticmethod
+    def _insertar(conn_sql, solicitudes: List[Dict], direcciones: Dict[int, List[Dict]]) -> List[Tuple[int, int]]:
+        """Una ida y vuelta por solicitud (el ID vuelve en el mismo INSERT) y un
+        único executemany para todas las direcciones del lote. Retorna [(id, sql_id)]."""
+        cur_sql = conn_sql.cursor()
+        filas_direccion = []
+        ids = []
+        for sol in solicitudes:
+            cur_sql.execute(SQL_INSERT_SOLICITUD_SQLSERVER, fila_sqlserver(sol))
+            sql_id = int(cur_sql.fetchone()[0])
+            ids.append((sol['id'], sql_id))
+            filas_direccion.extend(
+                (sql_id, d['numero'], d['direccion'], d['servicio'], d['capacidad'])
+                for d in direcciones.get(sol['id'], [])
+            )
+        if filas_direccion:
+            cur_sql.fast_executemany = True
+            cur_sql.executemany(SQL_INSERT_DIRECCION, filas_direccion)
+        cur_sql.close()
+        return ids
+
+    def _registrar_fallas(self, db: sqlite3.Connection, solicitudes: List[Dict], error: Exception):
+        """Deja las solicitudes en ERROR con su próximo intento y registra el error.
+
+        No hace commit: queda en la transacción del llamador.
+        """
+        cur = db.cursor()
+        for sol in solicitudes:
+            intentos = sol.get('intentos', 0) + 1
+            espera = int(self._calcular_backoff(intentos))
+            cur.execute("""
+                INSERT INTO sync_estado (solicitud_id, estado_sync, fecha_sync, intentos, proximo_intento)
+                VALUES (?, 'ERROR', CURRENT_TIMESTAMP, ?, datetime('now', ?))
+                ON CONFLICT(solicitud_id) DO UPDATE SET
+                  estado_sync = 'ERROR', fecha_sync = CURRENT_TIMESTAMP, intentos = excluded.intentos,
+                  proximo_intento = excluded.proximo_intento
+            """, (sol['id'], intentos, f"+{espera} seconds"))
+            cur.execute(
+                "INSERT INTO error_log (solicitud_id, tipo_error, mensaje_error) VALUES (?, ?, ?)",
+                (sol['id'], "SQL_SERVER_SYNC", str(error))
+            )
+        logger.error("Error sincronizando %d solicitud(es) a SQL Server: %s", len(solicitudes), error)
+
+
+if __name__ == "__main__":
+    from flask_app import crear_app, sincronizador
+
+    crear_app()
+
+    logger.info("Iniciando sincronizador SQL Server como proceso independiente")
+    sincronizador.iniciar()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        sincronizador.detener()
@@ -0,0 +1,81 @@
+"""Configuración común de las pruebas.
+
+flask_app lee su configuración de las variables ALTA_* al importarse, así
+que se fijan aquí, antes de importarlo, apuntando a un directorio temporal
+de la sesión. SQL Server se reemplaza por ``benchmarks/pyodbc_simulado``
+(SQLite). Las pruebas comparten la BD de la sesión: cada una trabaja con
+las solicitudes que crea y no supone una BD vacía.
+"""
+import atexit
+import itertools
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+_TMP = tempfile.mkdtemp(prefix='alta_pruebas_')
+atexit.register(shutil.rmtree, _TMP, ignore_errors=True)
+os.environ.update(
+    ALTA_DB_PATH=os.path.join(_TMP, 'alta.db'),
+    ALTA_LOG_PATH=os.path.join(_TMP, 'logs'),
+    ALTA_ARCHIVO_DIR=os.path.join(_TMP, 'archivo'),
+    ALTA_SQL_CONN_STR=f"DATABASE={os.path.join(_TMP, 'sqlserver.db')}",
+    ALTA_CLIENTES_URL='http://127.0.0.1:9/clientes.csv',
+    ALTA_SYNC_EN_APP='0',
+    ALTA_ARCHIVO_EN_APP='0',
+)
+
+from benchmarks import pyodbc_simulado  # noqa: E402
+
+sys.modules['pyodbc'] = pyodbc_simulado
+
+_numeros = itertools.count(1_000_000)
+
+
+@pytest.fixture(scope='session')
+def fa():
+    """El módulo flask_app con la app creada (esquema migrado)."""
+    import flask_app
+
+    flask_app.crear_app()
+    return flask_app
+
+
+@pytest.fixture
+def cliente(fa):
+    return fa.app.test_client()
+
+
+def payload_solicitud(**cambios):
+    """Payload válido de /guardarsolicitud con un solicitudNro nuevo."""
+    datos = {
+        "fechaIngreso": "01-06-2024", "rutCliente": "11.111.111-1", "cliente": "Cliente Prueba",
+        "nroSAM": "123456", "razonSocial": "Prueba SpA", "ejecutivoComercial": "Ejecutivo",
+        "fonoEjecutivo": "912345678", "contactoCliente": "Contacto", "fonoContactoCliente": "912345678",
+        "contactoTecnico": "Técnico", "fonoContactoTecnico": "912345678", "jefeProyecto": "Jefe",
+        "fonoJefeProyecto": "912345678", "proyecto": "Proyecto", "pepGasto": "PEP-1",
+        "proveedor": "Proveedor", "actividad": "Alta", "tipoDireccion": "MULTI",
+        "conceptoOtrosCostos": "N/A", "monedaOtrosCostos": "CLP", "montoOtrosCostos": "0",
+        "monedaInstalacion": "CLP", "costoInstalacion": "150000", "monedaRenta": "UF",
+        "valorRenta": "12.5", "plazoMeses": "24", "solicitudNro": next(_numeros),
+        "direcciones": [
+            {"numero": 1, "direccion": "Av. Siempre Viva 100", "servicio": "Internet", "capacidad": "1 Giga"},
+        ],
+    }
+    datos.update(cambios)
+    return datos
+
+
+@pytest.fixture
+def guardar(cliente):
+    """Guarda una solicitud nueva y retorna su sqlite_id."""
+    def _guardar(**cambios):
+        respuesta = cliente.post('/guardarsolicitud', json=payload_solicitud(**cambios))
+        assert respuesta.status_code == 201, respuesta.get_json()
+        return respuesta.get_json()['sqlite_id']
+    return _guardar
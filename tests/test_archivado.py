@@ -0,0 +1,115 @@
+import os
+import sqlite3
+import time
+
+import pytest
+
+from archivado import Archivador
+
+
+@pytest.fixture
+def archivador(fa, tmp_path):
+    """Archivador de la app sin período de retención (mismo directorio y BD).
+
+    Su reloj va un minuto adelantado: lo recién guardado ya cuenta como antiguo.
+    """
+    return Archivador(fa.get_db, fa.ARCHIVO_DIR, lock_path=str(tmp_path / 'archivado.lock'),
+                      dias_retencion=0, pausa_lote=0, reloj=lambda: time.time() + 60)
+
+
+@pytest.fixture
+def sincronizada(fa, cliente, guardar):
+    """Guarda una solicitud y la marca SINCRONIZADA."""
+    def _sincronizada():
+        solicitud_id = guardar()
+        assert cliente.post('/api/marcar_sincronizado', json={"solicitud_id": solicitud_id}).status_code == 200
+        return solicitud_id
+    return _sincronizada
+
+
+def en_bd_viva(fa, solicitud_id):
+    db = fa.get_db()
+    try:
+        return {tabla: db.execute(f"SELECT COUNT(*) FROM {tabla} WHERE {columna} = ?", (solicitud_id,)).fetchone()[0]
+                for tabla, columna in (('solicitud', 'id'), ('direccion', 'solicitudid'),
+                                       ('sync_estado', 'solicitud_id'))}
+    finally:
+        db.close()
+
+
+def en_archivo(archivador, solicitud_id):
+    for nombre in os.listdir(archivador.directorio):
+        conn = sqlite3.connect(os.path.join(archivador.directorio, nombre))
+        try:
+            if conn.execute("SELECT 1 FROM solicitud WHERE id = ?", (solicitud_id,)).fetchone():
+                return True
+        finally:
+            conn.close()
+    return False
+
+
+def test_mueve_al_archivo_y_se_sigue_leyendo(fa, cliente, archivador, sincronizada):
+    solicitud_id = sincronizada()
+    assert archivador.archivar_pendientes() >= 1
+
+    assert en_bd_viva(fa, solicitud_id) == {'solicitud': 0, 'direccion': 0, 'sync_estado': 0}
+    archivada = archivador.leer_solicitud(solicitud_id)
+    assert archivada['archivada'] is True
+    assert archivada['sync_estado']['estado_sync'] == 'SINCRONIZADO'
+    assert [d['direccion'] for d in archivada['direcciones']] == ['Av. Siempre Viva 100']
+
+    respuesta = cliente.get(f'/api/obtener_solicitud/{solicitud_id}')
+    assert respuesta.status_code == 200
+    assert respuesta.get_json()['id'] == solicitud_id
+    assert respuesta.get_json()['archivada'] is True
+    assert cliente.get(f'/api/obtener_solicitud/{solicitud_id}',
+                       headers={'If-None-Match': respuesta.headers['ETag']}).status_code == 304
+
+
+def test_caida_entre_copia_y_borrado(fa, archivador, sincronizada, monkeypatch):
+    solicitud_id = sincronizada()
+
+    def caida(*args):
+        raise RuntimeError("caída simulada")
+
+    with monkeypatch.context() as m:
+        m.setattr(archivador, '_borrar', caida)
+        with pytest.raises(RuntimeError):
+            archivador.archivar_lote()
+
+    # Copiada pero no borrada: un duplicado, nada perdido
+    assert en_bd_viva(fa, solicitud_id)['solicitud'] == 1
+    assert en_archivo(archivador, solicitud_id)
+
+    archivador.archivar_pendientes()
+    assert en_bd_viva(fa, solicitud_id)['solicitud'] == 0
+    assert archivador.leer_solicitud(solicitud_id)['id'] == solicitud_id
+
+
+def test_no_borra_la_que_volvio_a_pendiente(fa, archivador, sincronizada, monkeypatch):
+    solicitud_id = sincronizada()
+    copiar = archivador._copiar
+
+    def copiar_y_reabrir(db, archivo, ids):
+        copiar(db, archivo, ids)
+        db.execute("UPDATE sync_estado SET estado_sync = 'PENDIENTE' WHERE solicitud_id = ?", (solicitud_id,))
+        db.commit()
+
+    monkeypatch.setattr(archivador, '_copiar', copiar_y_reabrir)
+    archivador.archivar_lote()
+
+    assert en_bd_viva(fa, solicitud_id) == {'solicitud': 1, 'direccion': 1, 'sync_estado': 1}
+
+
+def test_respeta_la_retencion(fa, tmp_path, sincronizada):
+    solicitud_id = sincronizada()
+    dia = 24 * 3600
+
+    def archivador_en(dias):
+        return Archivador(fa.get_db, fa.ARCHIVO_DIR, lock_path=str(tmp_path / 'archivado.lock'),
+                          dias_retencion=90, pausa_lote=0, reloj=lambda: time.time() + dias * dia)
+
+    archivador_en(89).archivar_pendientes()
+    assert en_bd_viva(fa, solicitud_id)['solicitud'] == 1
+    archivador_en(91).archivar_pendientes()
+    assert en_bd_viva(fa, solicitud_id)['solicitud'] == 0
@@ -0,0 +1,51 @@
+import asyncio
+import time
+
+import httpx
+from flask import Flask, Response, request
+
+import asgi
+
+
+def pedir_a_la_vez(app, pedidos):
+    """Envía los pedidos (método, ruta, cuerpo) concurrentemente a ``WsgiEnPool(app)``."""
+    transporte = httpx.ASGITransport(app=asgi.WsgiEnPool(app, 4))
+
+    async def pedir():
+        async with httpx.AsyncClient(transport=transporte, base_url='http://prueba') as cliente:
+            return await asyncio.gather(*(cliente.request(metodo, ruta, content=cuerpo)
+                                          for metodo, ruta, cuerpo in pedidos))
+
+    return asyncio.run(pedir())
+
+
+def test_rutas_delegadas_corren_en_paralelo():
+    app = Flask('lenta')
+    cerradas = []
+
+    @app.route('/lenta')
+    def lenta():
+        time.sleep(0.5)
+        respuesta = Response('ok')
+        respuesta.call_on_close(lambda: cerradas.append(1))
+        return respuesta
+
+    inicio = time.perf_counter()
+    respuestas = pedir_a_la_vez(app, [('GET', '/lenta', None)] * 4)
+    # En un solo hilo serían 2 segundos
+    assert time.perf_counter() - inicio < 1.5
+    assert [r.text for r in respuestas] == ['ok'] * 4
+    assert len(cerradas) == 4
+
+
+def test_cuerpo_y_encabezados():
+    app = Flask('eco')
+
+    @app.route('/eco', methods=['POST'])
+    def eco():
+        return request.get_data()[::-1], 201, {'X-Largo': str(request.content_length)}
+
+    respuesta, = pedir_a_la_vez(app, [('POST', '/eco', b'abc' * 50000)])
+    assert respuesta.status_code == 201
+    assert respuesta.headers['X-Largo'] == '150000'
+    assert respuesta.content == b'cba' * 50000
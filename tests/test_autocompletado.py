@@ -0,0 +1,7 @@
+import pytest
+
+
+@pytest.mark.parametrize('limite', ["abc", "2.5", "0"])
+def test_limit_invalido(cliente, limite):
+    respuesta = cliente.get('/api/autocompletar_cliente', query_string={"q": "cliente", "limit": limite})
+    assert respuesta.status_code == 400
@@ -0,0 +1,18 @@
+import pytest
+
+
+@pytest.mark.parametrize('parametros', [{"before_id": "abc"}, {"limit": "abc"}, {"limit": "1.5"}, {"limit": 0}])
+def test_parametros_invalidos(cliente, parametros):
+    assert cliente.get('/api/buscar_solicitudes', query_string=parametros).status_code == 400
+
+
+def test_paginacion(cliente, guardar):
+    rut = "76.086.428-5"
+    ids = [guardar(rutCliente=rut) for _ in range(3)]
+
+    primera = cliente.get('/api/buscar_solicitudes', query_string={"rut": rut, "limit": 2}).get_json()
+    assert [s['id'] for s in primera['solicitudes']] == ids[:0:-1]
+    segunda = cliente.get('/api/buscar_solicitudes', query_string={
+        "rut": rut, "limit": 2, "before_id": primera['siguiente_before_id']}).get_json()
+    assert [s['id'] for s in segunda['solicitudes']] == ids[:1]
+    assert segunda['siguiente_before_id'] is None
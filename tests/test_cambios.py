@@ -0,0 +1,85 @@
+import threading
+
+import pytest
+
+
+def estados(fa, solicitud_id):
+    db = fa.get_db()
+    try:
+        cambios = [r[0] for r in db.execute(
+            "SELECT estado_sync FROM cambios WHERE solicitud_id = ? ORDER BY seq", (solicitud_id,))]
+        fila = db.execute("SELECT estado_sync, intentos FROM sync_estado WHERE solicitud_id = ?",
+                          (solicitud_id,)).fetchone()
+    finally:
+        db.close()
+    return cambios, tuple(fila)
+
+
+def ultimo_seq(fa):
+    db = fa.get_db()
+    try:
+        return db.execute("SELECT COALESCE(MAX(seq), 0) FROM cambios").fetchone()[0]
+    finally:
+        db.close()
+
+
+def registrar_falla(fa, solicitud_id, intentos):
+    db = fa.get_db()
+    try:
+        fa.sincronizador._registrar_fallas(db, [{'id': solicitud_id, 'intentos': intentos}],
+                                           Exception("sin conexión"))
+        db.commit()
+    finally:
+        db.close()
+
+
+def test_transiciones_dejan_un_cambio_por_estado(fa, cliente, guardar):
+    solicitud_id = guardar()
+    assert estados(fa, solicitud_id) == (['PENDIENTE'], ('PENDIENTE', 0))
+
+    # ERROR → ERROR actualiza intentos sin repetir el cambio
+    registrar_falla(fa, solicitud_id, 0)
+    registrar_falla(fa, solicitud_id, 1)
+    assert estados(fa, solicitud_id) == (['PENDIENTE', 'ERROR'], ('ERROR', 2))
+
+    # Las tres formas de marcar, repetidas, dejan un solo SINCRONIZADO
+    for cuerpo in ({"solicitud_id": solicitud_id}, {"solicitud_ids": [solicitud_id]},
+                   {"desde_id": solicitud_id, "hasta_id": solicitud_id}, {"solicitud_id": solicitud_id}):
+        assert cliente.post('/api/marcar_sincronizado', json=cuerpo).status_code == 200
+    assert estados(fa, solicitud_id) == (['PENDIENTE', 'ERROR', 'SINCRONIZADO'], ('SINCRONIZADO', 0))
+
+
+def test_sincronizador_envia_pendientes(fa, guardar):
+    solicitud_id = guardar()
+    while fa.sincronizador.procesar_lote():
+        pass
+    assert estados(fa, solicitud_id) == (['PENDIENTE', 'SINCRONIZADO'], ('SINCRONIZADO', 0))
+
+    db = fa.get_db()
+    try:
+        assert db.execute("SELECT COUNT(*) FROM sync_mapa WHERE solicitud_id = ?",
+                          (solicitud_id,)).fetchone()[0] == 1
+    finally:
+        db.close()
+
+
+def test_feed_entrega_estado_actual(fa, cliente, guardar):
+    cursor = ultimo_seq(fa)
+    solicitud_id = guardar()
+    cliente.post('/api/marcar_sincronizado', json={"solicitud_id": solicitud_id})
+
+    datos = cliente.get('/api/cambios', query_string={"cursor": cursor, "espera": 0}).get_json()
+    assert [(c['id'], c['estado_sync']) for c in datos['cambios']] == [(solicitud_id, 'SINCRONIZADO')]
+    assert datos['cursor'] == datos['cambios'][0]['seq']
+
+
+@pytest.mark.parametrize('ruta', ['/api/cambios', '/api/cambios/stream'])
+def test_esperas_acotadas(fa, cliente, monkeypatch, ruta):
+    cupos = threading.BoundedSemaphore(1)
+    cupos.acquire()
+    monkeypatch.setattr(fa, 'cupos_espera_cambios', cupos)
+    cursor = ultimo_seq(fa)
+
+    respuesta = cliente.get(ruta, query_string={"cursor": cursor, "espera": 1})
+    assert respuesta.status_code == 503
+    assert respuesta.headers['Retry-After'] == '5'
@@ -0,0 +1,45 @@
+import asyncio
+
+import httpx
+import pytest
+
+from benchmarks.carga import servir_directorio
+from directorio_clientes import DirectorioClientes
+
+
+@pytest.fixture
+def url_clientes(tmp_path):
+    (tmp_path / 'clientes.csv').write_text("RUT;Nombre\n76.086.428-5;Cliente Uno SpA\n96.652.220-7;Otro Cliente\n",
+                                           encoding='utf-8')
+    servidor = servir_directorio(str(tmp_path))
+    yield f"http://127.0.0.1:{servidor.server_port}/clientes.csv"
+    servidor.shutdown()
+
+
+def test_carga_sincrona_arranca_el_hilo(url_clientes):
+    directorio = DirectorioClientes(url_clientes, ttl=60)
+    try:
+        assert directorio.buscar('760864285') == 'Cliente Uno SpA'
+        assert directorio._hilo is not None and directorio._hilo.is_alive()
+    finally:
+        directorio.detener()
+
+
+def test_con_refresco_async_no_arranca_el_hilo(url_clientes):
+    directorio = DirectorioClientes(url_clientes, ttl=60)
+
+    async def modo_asgi():
+        async with httpx.AsyncClient() as cliente_http:
+            tarea = asyncio.create_task(directorio.bucle_refresco_async(cliente_http))
+            await asyncio.sleep(0)
+            # /api/autocompletar_cliente se delega a Flask y carga por la vía síncrona
+            loop = asyncio.get_running_loop()
+            sugerencias = await loop.run_in_executor(None, directorio.autocompletar, "otro", 5)
+            tarea.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await tarea
+            return sugerencias
+
+    assert [s['cliente'] for s in asyncio.run(modo_asgi())] == ['Otro Cliente']
+    assert directorio._hilo is None
+    assert not directorio._refresco_async
@@ -0,0 +1,37 @@
+import json
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+HOY = datetime.now(timezone.utc).date()
+
+
+def exportadas(cliente, **parametros):
+    respuesta = cliente.get('/api/exportar', query_string=dict(parametros, formato='ndjson'))
+    assert respuesta.status_code == 200
+    return [json.loads(linea)['id'] for linea in respuesta.get_data(as_text=True).splitlines()]
+
+
+def buscadas(cliente, **parametros):
+    respuesta = cliente.get('/api/buscar_solicitudes', query_string=dict(parametros, limit=500))
+    assert respuesta.status_code == 200
+    return sorted(s['id'] for s in respuesta.get_json()['solicitudes'])
+
+
+def test_rango_de_fechas_igual_que_la_busqueda(cliente, guardar):
+    rut = "96.652.220-7"
+    ids = [guardar(rutCliente=rut) for _ in range(2)]
+    manana = (HOY + timedelta(days=1)).isoformat()
+
+    for desde, hasta, esperado in ((HOY.isoformat(), HOY.isoformat(), ids), (manana, None, []),
+                                   (None, (HOY - timedelta(days=1)).isoformat(), [])):
+        filtros = {k: v for k, v in (("desde", desde), ("hasta", hasta)) if v}
+        assert [i for i in exportadas(cliente, **filtros) if i in ids] == esperado
+        assert buscadas(cliente, rut=rut, **filtros) == esperado
+
+
+@pytest.mark.parametrize('ruta', ['/api/exportar', '/api/buscar_solicitudes'])
+def test_fecha_invalida(cliente, ruta):
+    respuesta = cliente.get(ruta, query_string={"desde": "01-06-2024"})
+    assert respuesta.status_code == 400
+    assert respuesta.get_json()['mensaje'] == "desde debe tener formato AAAA-MM-DD"
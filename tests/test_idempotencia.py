@@ -0,0 +1,42 @@
+from conftest import payload_solicitud
+
+
+def contar_solicitudes(fa, numero):
+    db = fa.get_db()
+    try:
+        return db.execute("SELECT COUNT(*) FROM solicitud WHERE nrosolicitud = ?", (numero,)).fetchone()[0]
+    finally:
+        db.close()
+
+
+def test_mismo_contenido_retorna_la_original(fa, cliente):
+    payload = payload_solicitud()
+    primera = cliente.post('/guardarsolicitud', json=payload)
+    repetida = cliente.post('/guardarsolicitud', json=payload)
+
+    assert primera.status_code == 201
+    assert repetida.status_code == 200
+    assert repetida.headers['Idempotent-Replayed'] == 'true'
+    assert repetida.get_json() == {"status": "OK", "sqlite_id": primera.get_json()['sqlite_id'],
+                                   "solicitudNro": payload['solicitudNro'], "repetida": True}
+    assert contar_solicitudes(fa, payload['solicitudNro']) == 1
+
+
+def test_misma_clave_retorna_la_original(cliente):
+    payload = payload_solicitud()
+    encabezados = {'Idempotency-Key': f"prueba-{payload['solicitudNro']}"}
+    primera = cliente.post('/guardarsolicitud', json=payload, headers=encabezados)
+    repetida = cliente.post('/guardarsolicitud', json=payload, headers=encabezados)
+
+    assert (primera.status_code, repetida.status_code) == (201, 200)
+    assert repetida.get_json()['sqlite_id'] == primera.get_json()['sqlite_id']
+
+
+def test_clave_reutilizada_con_otro_contenido(fa, cliente):
+    encabezados = {'Idempotency-Key': 'prueba-reutilizada'}
+    assert cliente.post('/guardarsolicitud', json=payload_solicitud(), headers=encabezados).status_code == 201
+
+    otra = payload_solicitud()
+    respuesta = cliente.post('/guardarsolicitud', json=otra, headers=encabezados)
+    assert respuesta.status_code == 422
+    assert contar_solicitudes(fa, otra['solicitudNro']) == 0
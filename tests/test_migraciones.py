@@ -0,0 +1,129 @@
+import sqlite3
+
+import pytest
+
+from migraciones import MIGRACIONES, migrar, version_esquema
+
+# Esquema que creaba init_db antes de versionar (user_version 0)
+ESQUEMA_V0 = """
+CREATE TABLE solicitud (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  fechaingreso TEXT NOT NULL, rutcliente TEXT NOT NULL, cliente TEXT NOT NULL, nrosam TEXT NOT NULL,
+  razonsocial TEXT NOT NULL, ejecutivocomercial TEXT NOT NULL, fonoejecutivo TEXT NOT NULL,
+  contactocliente TEXT NOT NULL, fonocontactocliente TEXT NOT NULL, contactotecnico TEXT NOT NULL,
+  fonocontactotecnico TEXT NOT NULL, jefeproyecto TEXT NOT NULL, fonojefeproyecto TEXT NOT NULL,
+  proyecto TEXT NOT NULL, pepgasto TEXT NOT NULL, proveedor TEXT NOT NULL, actividad TEXT NOT NULL,
+  tipodireccion TEXT NOT NULL, conceptootroscostos TEXT NOT NULL, monedaotros_costos TEXT NOT NULL,
+  montootros_costos REAL DEFAULT 0, monedainstalacion TEXT NOT NULL, costoinstalacion REAL DEFAULT 0,
+  monedarenta TEXT NOT NULL, valorrenta REAL DEFAULT 0, plazomeses INTEGER NOT NULL,
+  fecha_creacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP, estado TEXT DEFAULT 'PENDIENTE'
+);
+CREATE TABLE direccion (
+  id INTEGER PRIMARY KEY AUTOINCREMENT, solicitudid INTEGER NOT NULL, numero INTEGER NOT NULL,
+  direccion TEXT NOT NULL, servicio TEXT NOT NULL, capacidad TEXT NOT NULL,
+  FOREIGN KEY(solicitudid) REFERENCES solicitud(id)
+);
+CREATE TABLE sync_estado (
+  solicitud_id INTEGER PRIMARY KEY, estado_sync TEXT NOT NULL,
+  fecha_sync TIMESTAMP DEFAULT CURRENT_TIMESTAMP, FOREIGN KEY(solicitud_id) REFERENCES solicitud(id)
+);
+CREATE TABLE error_log (
+  id INTEGER PRIMARY KEY AUTOINCREMENT, solicitud_id INTEGER, tipo_error TEXT NOT NULL,
+  mensaje_error TEXT NOT NULL, detalle TEXT, fecha_error TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  FOREIGN KEY(solicitud_id) REFERENCES solicitud(id)
+);
+CREATE INDEX idx_solicitud_rut ON solicitud(rutcliente);
+CREATE INDEX idx_sync_estado ON sync_estado(estado_sync);
+CREATE INDEX idx_direccion_solicitud ON direccion(solicitudid);
+"""
+
+INSERT_V0 = """
+INSERT INTO solicitud (fechaingreso, rutcliente, cliente, nrosam, razonsocial, ejecutivocomercial,
+  fonoejecutivo, contactocliente, fonocontactocliente, contactotecnico, fonocontactotecnico, jefeproyecto,
+  fonojefeproyecto, proyecto, pepgasto, proveedor, actividad, tipodireccion, conceptootroscostos,
+  monedaotros_costos, monedainstalacion, monedarenta, plazomeses, valorrenta)
+VALUES ('01-06-2024', '111111111', 'Cliente', '1', 'RS', 'Ejecutivo', 'f', 'c', 'f', 't', 'f', 'j', 'f',
+  'p', 'g', 'Proveedor', 'a', 'MULTI', 'n', 'CLP', 'CLP', 'UF', 12, ?)
+"""
+
+
+def esquema(db_path):
+    """Columnas por tabla, índices y triggers (sin el texto SQL, que difiere tras ALTER TABLE)."""
+    conn = sqlite3.connect(db_path)
+    try:
+        objetos = conn.execute(
+            "SELECT type, name, tbl_name FROM sqlite_master WHERE name NOT LIKE 'sqlite_%'").fetchall()
+        columnas = {tabla: sorted(r[1] for r in conn.execute(f"PRAGMA table_info({tabla})"))
+                    for tipo, tabla, _ in objetos if tipo == 'table'}
+        return set(objetos), columnas
+    finally:
+        conn.close()
+
+
+def test_bd_nueva(tmp_path):
+    db_path = str(tmp_path / 'alta.db')
+    assert migrar(db_path, db_path + '.lock') == len(MIGRACIONES)
+
+    conn = sqlite3.connect(db_path)
+    try:
+        assert version_esquema(conn) == len(MIGRACIONES)
+        tablas = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    finally:
+        conn.close()
+    assert {'solicitud', 'direccion', 'sync_estado', 'sync_mapa', 'cambios', 'idempotencia'} <= tablas
+
+    # Ya al día: no vuelve a aplicar nada
+    assert migrar(db_path, db_path + '.lock') == len(MIGRACIONES)
+
+
+def test_actualiza_bd_sin_versionar(tmp_path):
+    db_path = str(tmp_path / 'alta.db')
+    conn = sqlite3.connect(db_path)
+    conn.executescript(ESQUEMA_V0)
+    conn.execute(INSERT_V0, (10.0,))
+    conn.execute(INSERT_V0, (20.0,))
+    conn.commit()
+    conn.close()
+
+    assert migrar(db_path, db_path + '.lock') == len(MIGRACIONES)
+
+    nueva = str(tmp_path / 'nueva.db')
+    migrar(nueva, nueva + '.lock')
+    assert esquema(db_path) == esquema(nueva)
+
+    conn = sqlite3.connect(db_path)
+    try:
+        # Las solicitudes previas al outbox quedan PENDIENTES y en el feed y el resumen
+        assert conn.execute("SELECT solicitud_id, estado_sync FROM sync_estado ORDER BY 1").fetchall() == [
+            (1, 'PENDIENTE'), (2, 'PENDIENTE')]
+        assert conn.execute("SELECT COUNT(*) FROM cambios").fetchone()[0] == 2
+        assert conn.execute("SELECT ultimo FROM secuencia WHERE nombre = 'solicitud'").fetchone()[0] == 2
+    finally:
+        conn.close()
+
+
+def test_v2_deja_nrosolicitud_unico(tmp_path):
+    db_path = str(tmp_path / 'alta.db')
+    conn = sqlite3.connect(db_path)
+    cur = conn.cursor()
+    cur.execute("BEGIN")
+    MIGRACIONES[0](cur)
+    cur.execute("PRAGMA user_version = 1")
+    conn.commit()
+    for _ in range(3):
+        conn.execute(INSERT_V0, (1.0,))
+    conn.execute("UPDATE solicitud SET nrosolicitud = 50")
+    conn.commit()
+    conn.close()
+
+    assert migrar(db_path, db_path + '.lock') == len(MIGRACIONES)
+
+    conn = sqlite3.connect(db_path)
+    try:
+        assert conn.execute("SELECT id, nrosolicitud FROM solicitud ORDER BY id").fetchall() == [
+            (1, 50), (2, None), (3, None)]
+        assert conn.execute("SELECT ultimo FROM secuencia WHERE nombre = 'solicitud'").fetchone()[0] == 50
+        with pytest.raises(sqlite3.IntegrityError):
+            conn.execute("UPDATE solicitud SET nrosolicitud = 50 WHERE id = 2")
+    finally:
+        conn.close()
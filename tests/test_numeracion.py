@@ -0,0 +1,65 @@
+import threading
+
+from conftest import payload_solicitud
+
+
+def test_numero_usado_con_otro_contenido(cliente):
+    payload = payload_solicitud()
+    assert cliente.post('/guardarsolicitud', json=payload).status_code == 201
+
+    respuesta = cliente.post('/guardarsolicitud', json=dict(payload, cliente="Otro Cliente"))
+    assert respuesta.status_code == 409
+
+
+def test_lote_descarta_numeros_usados(cliente):
+    usada = payload_solicitud()
+    assert cliente.post('/guardarsolicitud', json=usada).status_code == 201
+
+    nueva = payload_solicitud()
+    lote = [dict(usada, cliente="Otro Cliente"), nueva, dict(nueva, cliente="Otro Cliente")]
+    datos = cliente.post('/api/guardar_lote', json=lote).get_json()
+
+    assert (datos['status'], datos['guardadas'], datos['errores']) == ('PARCIAL', 1, 2)
+    assert [r['status'] for r in datos['resultados']] == ['ERROR', 'OK', 'ERROR']
+    assert datos['resultados'][1]['solicitudNro'] == nueva['solicitudNro']
+
+
+def test_lote_solo_con_numeros_usados(cliente):
+    usada = payload_solicitud()
+    assert cliente.post('/guardarsolicitud', json=usada).status_code == 201
+
+    respuesta = cliente.post('/api/guardar_lote', json=[dict(usada, cliente="Otro Cliente")])
+    assert respuesta.status_code == 400
+    assert respuesta.get_json()['guardadas'] == 0
+
+
+def test_envio_repetido_concurrente_no_es_duplicado(fa, monkeypatch):
+    # Ambos requests pasan la búsqueda de idempotencia antes de que el otro confirme
+    barrera = threading.Barrier(2, timeout=5)
+    local = threading.local()
+    buscar = fa.idempotencia.buscar
+
+    def buscar_a_la_vez(*args):
+        previo = buscar(*args)
+        if not getattr(local, 'buscado', False):
+            local.buscado = True
+            barrera.wait()
+        return previo
+
+    monkeypatch.setattr(fa.idempotencia, 'buscar', buscar_a_la_vez)
+    payload = payload_solicitud()
+    respuestas = []
+
+    def enviar():
+        respuesta = fa.app.test_client().post('/guardarsolicitud', json=payload,
+                                              headers={'Idempotency-Key': f"doble-{payload['solicitudNro']}"})
+        respuestas.append((respuesta.status_code, respuesta.get_json()['sqlite_id']))
+
+    hilos = [threading.Thread(target=enviar) for _ in range(2)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+
+    assert sorted(status for status, _ in respuestas) == [200, 201]
+    assert respuestas[0][1] == respuestas[1][1]
@@ -0,0 +1,74 @@
+import sqlite3
+
+import pytest
+
+from conexion_sqlite import GestorSQLite
+from conftest import payload_solicitud
+from esquema_solicitud import SQL_INSERT_SOLICITUD, convertir_solicitud
+from migraciones import migrar
+from pool_sqlserver import PoolSQLServer
+from reconciliacion import Reconciliador
+from sincronizacion import SincronizadorSQLServer
+
+
+@pytest.fixture
+def entorno(tmp_path):
+    """BD local con 25 solicitudes ya sincronizadas a un SQL Server simulado propio (sql_id = id)."""
+    db_path = str(tmp_path / 'alta.db')
+    remota = str(tmp_path / 'sqlserver.db')
+    migrar(db_path, db_path + '.lock')
+    get_db = GestorSQLite(db_path).conexion
+    pool = PoolSQLServer(f"DATABASE={remota}")
+
+    db = get_db()
+    for i in range(25):
+        fila, _, _ = convertir_solicitud(payload_solicitud(cliente=f"Cliente {i}"))
+        solicitud_id = db.execute(SQL_INSERT_SOLICITUD, fila).lastrowid
+        db.execute("INSERT INTO sync_estado (solicitud_id, estado_sync) VALUES (?, 'PENDIENTE')", (solicitud_id,))
+    db.commit()
+    sincronizador = SincronizadorSQLServer(get_db, pool, lock_path=str(tmp_path / 'sync.lock'))
+    while sincronizador.procesar_lote():
+        pass
+
+    reconciliador = Reconciliador(get_db, pool, lock_path=str(tmp_path / 'reconciliacion.lock'), tamano_bucket=10)
+    return get_db, remota, sincronizador, reconciliador
+
+
+def estado_sync(get_db, solicitud_id):
+    return get_db().execute("SELECT estado_sync FROM sync_estado WHERE solicitud_id = ?",
+                            (solicitud_id,)).fetchone()[0]
+
+
+def test_buckets_iguales(entorno):
+    _, _, _, reconciliador = entorno
+    informe = reconciliador.reconciliar()
+    assert (informe["buckets"], informe["buckets_distintos"]) == (3, 0)
+
+
+def test_repara_buckets_distintos(entorno):
+    get_db, remota, sincronizador, reconciliador = entorno
+    conn = sqlite3.connect(remota)
+    conn.execute("UPDATE solicitud SET cliente = 'Modificado' WHERE id = 12")  # bucket 1: contenido distinto
+    conn.execute("DELETE FROM solicitud WHERE id = 22")                       # bucket 2: falta en SQL Server
+    conn.commit()
+    conn.close()
+    # Bucket 2: confirmada en SQL Server pero el worker cayó antes de marcarla
+    db = get_db()
+    db.execute("DELETE FROM sync_mapa WHERE solicitud_id = 24")
+    db.execute("UPDATE sync_estado SET estado_sync = 'ERROR' WHERE solicitud_id = 24")
+    db.commit()
+
+    informe = reconciliador.reconciliar()
+    assert informe["buckets_distintos"] == 2
+    assert informe["diferentes"] == [12]
+    assert informe["reenviadas"] == 1
+    assert (informe["mapeadas"], informe["marcadas_sincronizadas"]) == (1, 1)
+    assert informe["huerfanas_sql_id"] == []
+    assert estado_sync(get_db, 22) == 'PENDIENTE'
+    assert estado_sync(get_db, 24) == 'SINCRONIZADO'
+
+    # Reenviada la faltante, solo queda el contenido distinto (que se informa, no se repara)
+    assert sincronizador.procesar_lote() == 1
+    informe = reconciliador.reconciliar()
+    assert informe["buckets_distintos"] == 1
+    assert informe["diferentes"] == [12]
@@ -0,0 +1,47 @@
+import time
+
+from archivado import Archivador
+from conftest import payload_solicitud
+
+
+def test_resumen_coincide_con_el_recalculo(fa, cliente, guardar, tmp_path):
+    guardar()
+    guardar(valorRenta="7.25", monedaRenta="CLP", proveedor="Otro")
+    lote = [payload_solicitud(costoInstalacion=str(1000 * i)) for i in range(5)]
+    assert cliente.post('/api/guardar_lote', json=lote).status_code == 201
+    assert fa.resumen_montos.verificar() == []
+
+    # Lo archivado sigue contando, también mientras está copiado y aún no borrado
+    ultima = guardar()
+    cliente.post('/api/marcar_sincronizado', json={"desde_id": 1, "hasta_id": ultima})
+    # Reloj adelantado: lo recién guardado ya cuenta como antiguo
+    archivador = Archivador(fa.get_db, fa.ARCHIVO_DIR, lock_path=str(tmp_path / 'archivado.lock'),
+                            dias_retencion=0, pausa_lote=0, reloj=lambda: time.time() + 60)
+    assert archivador.archivar_pendientes() >= 1
+    assert fa.resumen_montos.verificar() == []
+
+    copiada = guardar()
+    cliente.post('/api/marcar_sincronizado', json={"solicitud_id": copiada})
+    db = fa.get_db()
+    try:
+        archivador._copiar(db, f"alta_{time.strftime('%Y_%m', time.gmtime())}.db", [copiada])
+    finally:
+        db.close()
+    assert fa.resumen_montos.verificar() == []
+
+
+def test_verificar_detecta_y_reconstruir_corrige(fa, guardar):
+    guardar()
+    db = fa.get_db()
+    try:
+        db.execute("""
+            UPDATE resumen_montos SET total = total + 1
+            WHERE ejecutivo = 'Ejecutivo' AND proveedor = 'Proveedor' AND concepto = 'renta' AND moneda = 'UF'
+        """)
+        db.commit()
+    finally:
+        db.close()
+
+    assert len(fa.resumen_montos.verificar()) == 1
+    fa.resumen_montos.reconstruir()
+    assert fa.resumen_montos.verificar() == []
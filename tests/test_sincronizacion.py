@@ -0,0 +1,56 @@
+import pytest
+
+from benchmarks import pyodbc_simulado
+from pool_sqlserver import PoolSQLServer
+from sincronizacion import SincronizadorSQLServer
+
+
+@pytest.fixture
+def sincronizador(tmp_path):
+    pool = PoolSQLServer(f"DATABASE={tmp_path / 'sqlserver.db'}")
+    return SincronizadorSQLServer(None, pool, lock_path=str(tmp_path / 'sync.lock'))
+
+
+def insertar_con_fallas(monkeypatch, fallas):
+    """Reemplaza _insertar: cada llamada consume el siguiente error de ``fallas`` (None = OK)."""
+    llamadas = iter(fallas)
+
+    def insertar(conn_sql, solicitudes, direcciones):
+        error = next(llamadas)
+        if error is not None:
+            raise error
+        return [(sol['id'], sol['id'] + 100) for sol in solicitudes]
+
+    monkeypatch.setattr(SincronizadorSQLServer, '_insertar', staticmethod(insertar))
+
+
+def test_error_de_fila_se_aisla(sincronizador, monkeypatch):
+    datos = pyodbc_simulado.Error('23000', 'dato inválido')
+    insertar_con_fallas(monkeypatch, [datos, None, datos, None])
+
+    ok, fallidas = sincronizador._enviar([{'id': 1}, {'id': 2}, {'id': 3}], {})
+    assert ok == [(1, 101), (3, 103)]
+    assert [(sol['id'], e) for sol, e in fallidas] == [(2, datos)]
+    # La conexión sigue sana y vuelve al pool
+    assert sincronizador.pool._libres.qsize() == 1
+
+
+def test_conexion_perdida_en_reintento(sincronizador, monkeypatch):
+    perdida = pyodbc_simulado.Error('08S01', 'enlace de comunicación')
+    insertar_con_fallas(monkeypatch, [pyodbc_simulado.Error('23000', 'dato inválido'), None, perdida])
+
+    ok, fallidas = sincronizador._enviar([{'id': 1}, {'id': 2}, {'id': 3}], {})
+    assert ok == [(1, 101)]
+    assert [(sol['id'], e) for sol, e in fallidas] == [(2, perdida), (3, perdida)]
+    # Marcada rota: se cerró en vez de volver al pool
+    assert sincronizador.pool._libres.qsize() == 0
+    assert not sincronizador.pool._rotas
+
+
+def test_conexion_perdida_en_lote(sincronizador, monkeypatch):
+    perdida = pyodbc_simulado.Error('HYT00', 'timeout')
+    insertar_con_fallas(monkeypatch, [perdida])
+
+    with pytest.raises(pyodbc_simulado.Error):
+        sincronizador._enviar([{'id': 1}, {'id': 2}], {})
+    assert sincronizador.pool._libres.qsize() == 0
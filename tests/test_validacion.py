@@ -0,0 +1,18 @@
+import pytest
+
+from conftest import payload_solicitud
+
+
+@pytest.mark.parametrize('cuerpo', [[1, 2], "texto", 5, None])
+def test_cuerpo_que_no_es_objeto(cliente, cuerpo):
+    respuesta = cliente.post('/guardarsolicitud', json=cuerpo)
+    assert respuesta.status_code == 400
+    assert respuesta.get_json()['status'] == 'ERROR'
+
+
+def test_informa_todos_los_errores(cliente):
+    payload = payload_solicitud(rutCliente="", direcciones=[])
+    del payload['cliente']
+    respuesta = cliente.post('/guardarsolicitud', json=payload)
+    assert respuesta.status_code == 400
+    assert len(respuesta.get_json()['errores']) >= 3